@@ -0,0 +1,121 @@
+from frames import HAS_FLOATS, HAS_RELAYS, RELAY_BITS
+
+# -------------------- Adaptive Polling --------------------
+#
+# Instead of GET_RELAYS every second and GET_SENSORS every minute, each
+# channel has an interval that moves between a fast and a slow bound:
+#
+#   - a reading that moved past its deadband (or a relay that switched)
+#     drops the channel to its fast interval;
+#   - every unchanged reading backs it off by `backoff`, up to slow;
+#   - when a pump, sensor pump or the drain switches, sensors are polled fast
+#     for `boost_seconds`, since that is when water readings move.
+#
+# Any frame carrying a channel's data counts as a poll of it, including
+# the STATE frames the sketch sends every 10 s and after every command, so
+# a channel is only requested once its data is actually stale.
+#
+# Every request costs roughly `cost` bytes on the wire (command, reply and
+# the STATE frame the sketch sends after each command). If the channels'
+# combined rate would exceed `budget` bytes per second, all intervals are
+# stretched by the same factor.
+
+# How far a reading has to move to count as a change
+SENSOR_DEADBANDS = {
+    "air_temp": 0.5,
+    "humidity": 2.0,
+    "water_temp1": 0.2,
+    "water_temp2": 0.2,
+}
+
+# Relays whose switching makes sensor readings move
+WATER_RELAYS = (
+    RELAY_BITS["pump_top"] | RELAY_BITS["pump_bottom"]
+    | RELAY_BITS["sensor_pump_top"] | RELAY_BITS["sensor_pump_bottom"] | RELAY_BITS["drain"]
+)
+
+
+class PollChannel:
+    def __init__(self, command, fast, slow, cost, backoff=1.5):
+        self.command = command
+        self.fast = fast
+        self.slow = slow
+        self.cost = cost
+        self.backoff = backoff
+        self.interval = fast  # Start fast so the first readings arrive promptly
+        self.last_data = 0.0
+        self.last_sent = 0.0
+        self.boost_until = 0.0
+
+    def current_interval(self, now):
+        return self.fast if now < self.boost_until else self.interval
+
+    def due(self, now, scale=1.0):
+        return max(self.last_data, self.last_sent) + self.current_interval(now) * scale
+
+    def update(self, now, changed):
+        self.last_data = now
+        if changed:
+            self.interval = self.fast
+        else:
+            self.interval = min(self.interval * self.backoff, self.slow)
+
+
+class AdaptivePoller:
+    def __init__(self, relay_interval=1.0, sensor_interval=60.0, budget=150.0, boost_seconds=120.0):
+        # Relays back off to 10 s, where the sketch's own periodic STATE frame takes over
+        self.relays = PollChannel("GET_RELAYS", relay_interval, max(10.0, relay_interval), cost=125)
+        self.sensors = PollChannel("GET_SENSORS", min(5.0, sensor_interval), sensor_interval, cost=145)
+        self.channels = (self.relays, self.sensors)
+        self.budget = budget
+        self.boost_seconds = boost_seconds
+        self._relays = None
+        self._readings = None
+
+    def push_mode(self, heartbeat):
+        """The sketch pushes changes now; only poll if it stays quiet for two heartbeats."""
+        for channel in self.channels:
+            channel.fast = channel.slow = channel.interval = 2 * heartbeat
+
+    # ---- observing ----
+
+    def observe(self, frame, now):
+        """Feed a decoded frame; returns True if any channel should now be polled sooner."""
+        sooner = False
+        if frame.valid & HAS_RELAYS:
+            changed = self._relays is not None and frame.relays != self._relays
+            if changed and (frame.relays ^ self._relays) & WATER_RELAYS:
+                self.sensors.boost_until = now + self.boost_seconds
+                sooner = True
+            self._relays = frame.relays
+            sooner |= changed and self.relays.interval > self.relays.fast
+            self.relays.update(now, changed)
+        if frame.valid & HAS_FLOATS:
+            readings = (frame.float_top, frame.float_bottom) + tuple(getattr(frame, name) for name in SENSOR_DEADBANDS)
+            changed = self._readings is not None and self._sensors_changed(readings)
+            self._readings = readings
+            sooner |= changed and self.sensors.interval > self.sensors.fast
+            self.sensors.update(now, changed)
+        return sooner
+
+    def _sensors_changed(self, readings):
+        old = self._readings
+        if readings[:2] != old[:2]:
+            return True  # A float switch flipped
+        return any(abs(new - previous) > deadband
+                   for new, previous, deadband in zip(readings[2:], old[2:], SENSOR_DEADBANDS.values()))
+
+    # ---- scheduling ----
+
+    def scale(self, now):
+        """Factor (>= 1) that stretches every interval to keep the link within budget."""
+        load = sum(channel.cost / channel.current_interval(now) for channel in self.channels)
+        return max(1.0, load / self.budget)
+
+    def next_poll(self, now):
+        """Return (channel, due time) for the channel that is due first."""
+        scale = self.scale(now)
+        return min(((channel, channel.due(now, scale)) for channel in self.channels), key=lambda item: item[1])
+
+    def sent(self, channel, now):
+        channel.last_sent = now
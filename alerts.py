@@ -0,0 +1,405 @@
+import heapq
+import importlib
+import json
+import os
+import queue
+import threading
+from collections import deque, namedtuple
+from datetime import datetime
+
+from frames import AIR_OK, HAS_FLOATS, HAS_PH_EC, SENSOR_ERROR, WATER1_OK, WATER2_OK
+from helpers import LOG_DIR, log_error
+
+# -------------------- Alert Rules --------------------
+#
+# Rules over the sensor channels, one per line in alerts.txt:
+#
+#   # name          channel       kind   arguments   [options]
+#   ph_top          ph_top        range  5.5 6.5     hysteresis=0.05 for=120
+#   water_top_low   float_top     range  1 -         for=30 severity=critical
+#   air_temp_jump   air_temp      rate   5 600
+#   air_sensor      air_temp      stale  300
+#
+#   range LOW HIGH        alert while the reading is outside [LOW, HIGH];
+#                         "-" leaves that side open (floats read 1 = HIGH)
+#   rate CHANGE SECONDS   alert while the reading moved more than CHANGE
+#                         within the last SECONDS
+#   stale SECONDS         alert when there has been no valid reading for
+#                         SECONDS (a failed DHT sends -1, which is not one)
+#
+#   for=SECONDS           the condition must hold this long before the alert
+#                         is raised (debounce)
+#   hysteresis=H          a raised range/rate alert clears only once the
+#                         reading is H back inside the limit
+#   severity=LEVEL        info, warning (default) or critical
+#
+# and notifier lines, which receive every raised and cleared alert:
+#
+#   notify webhook http://pi.local:9000/hook    (POSTs the alert as JSON)
+#   notify plugin my_notifiers:send_sms         (calls send_sms(event))
+#
+# Every alert also goes to logs/alerts.csv and the console. Notifiers run
+# on their own thread, so a slow webhook never stalls the controller.
+#
+# Evaluation is incremental. Rules are indexed by channel, and a frame
+# only evaluates the rules of channels whose reading changed. Debounce
+# timers, stale checks and rate windows that expire with no new reading
+# sit in a heap and are handled by tick(). The cost per frame follows the
+# rules a frame touches, not the number of rules, channels or rigs.
+#
+# Range rules also give the GUI its out-of-range colours (display_range).
+
+ALERTS_FILE = "alerts.txt"
+ALERT_LOG_FILE = os.path.join(LOG_DIR, "alerts.csv")
+ALERT_LOG_HEADER = "Timestamp,Rig,Rule,Channel,Severity,State,Value,Message\n"
+SEVERITIES = ("info", "warning", "critical")
+
+DEFAULT_RULES = """
+ph_top           ph_top        range  5.5 6.5  hysteresis=0.05 for=120
+ph_bottom        ph_bottom     range  5.5 6.5  hysteresis=0.05 for=120
+ec_top           ec_top        range  1.0 2.5  hysteresis=0.05 for=120
+ec_bottom        ec_bottom     range  1.0 2.5  hysteresis=0.05 for=120
+water_top_low    float_top     range  1 -      for=30 severity=critical
+water_bottom_low float_bottom  range  1 -      for=30 severity=critical
+air_sensor       air_temp      stale  300
+water1_sensor    water_temp1   stale  300
+water2_sensor    water_temp2   stale  300
+""".splitlines()
+
+# Which validity flag (frames.py) says a frame carries a real reading of each channel
+CHANNEL_FLAGS = {
+    "air_temp": AIR_OK, "humidity": AIR_OK,
+    "water_temp1": WATER1_OK, "water_temp2": WATER2_OK,
+    "float_top": HAS_FLOATS, "float_bottom": HAS_FLOATS,
+    "ph_top": HAS_PH_EC, "ec_top": HAS_PH_EC, "ph_bottom": HAS_PH_EC, "ec_bottom": HAS_PH_EC,
+}
+PROBE_CHANNELS = ("ph_top", "ec_top", "ph_bottom", "ec_bottom")  # Negative until the sketch measures them
+
+RuleSpec = namedtuple("RuleSpec", "name channel kind args delay hysteresis severity")
+AlertEvent = namedtuple("AlertEvent", "time rig rule channel severity state value message")
+
+
+class AlertConfigError(ValueError):
+    pass
+
+
+def reading(frame, channel):
+    """The frame's value for channel, or None if it carries no valid reading of it."""
+    if not frame.valid & CHANNEL_FLAGS[channel]:
+        return None
+    value = getattr(frame, channel)
+    if value == SENSOR_ERROR or (channel in PROBE_CHANNELS and value < 0):
+        return None
+    return float(value)
+
+
+# ---- configuration ----
+
+def _number(text, number, what):
+    if text == "-":
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        raise AlertConfigError(f"Line {number}: {what} must be a number or -, not {text!r}") from None
+
+
+def parse_alerts(lines):
+    """Parse alerts.txt lines into ([RuleSpec], [(notifier kind, argument)])."""
+    rules, notifiers = [], []
+    for number, line in enumerate(lines, start=1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        parts = line.split()
+        if parts[0] == "notify":
+            if len(parts) != 3 or parts[1] not in ("webhook", "plugin"):
+                raise AlertConfigError(f"Line {number}: expected 'notify webhook URL' or 'notify plugin module:function'")
+            notifiers.append((parts[1], parts[2]))
+            continue
+        if len(parts) < 4:
+            raise AlertConfigError(f"Line {number}: expected NAME CHANNEL KIND ARGUMENTS [OPTIONS]")
+        name, channel, kind = parts[:3]
+        if channel not in CHANNEL_FLAGS:
+            raise AlertConfigError(f"Line {number}: unknown channel {channel!r}")
+        if any(rule.name == name for rule in rules):
+            raise AlertConfigError(f"Line {number}: rule {name!r} is defined twice")
+        args = [part for part in parts[3:] if "=" not in part]
+        options = dict(part.split("=", 1) for part in parts[3:] if "=" in part)
+        expected = {"range": 2, "rate": 2, "stale": 1}.get(kind)
+        if expected is None:
+            raise AlertConfigError(f"Line {number}: kind must be range, rate or stale, not {kind!r}")
+        if len(args) != expected:
+            raise AlertConfigError(f"Line {number}: {kind} takes {expected} arguments")
+        args = tuple(_number(arg, number, "argument") for arg in args)
+        if kind != "range" and None in args or kind == "range" and args == (None, None):
+            raise AlertConfigError(f"Line {number}: {kind} needs numeric limits")
+        severity = options.pop("severity", "warning")
+        if severity not in SEVERITIES:
+            raise AlertConfigError(f"Line {number}: severity must be one of {', '.join(SEVERITIES)}")
+        delay = _number(options.pop("for", "0"), number, "for")
+        hysteresis = _number(options.pop("hysteresis", "0"), number, "hysteresis")
+        if options:
+            raise AlertConfigError(f"Line {number}: unknown options {', '.join(options)}")
+        rules.append(RuleSpec(name, channel, kind, args, delay, hysteresis, severity))
+    return rules, notifiers
+
+
+_configs = {}  # path -> (rules, notifiers)
+_ranges = None
+
+
+def load_alerts(path=ALERTS_FILE):
+    """Rules and notifiers from alerts.txt (DEFAULT_RULES without one); read once per process."""
+    if path not in _configs:
+        try:
+            with open(path) as f:
+                _configs[path] = parse_alerts(f)
+        except FileNotFoundError:
+            _configs[path] = parse_alerts(DEFAULT_RULES)
+        except AlertConfigError as e:
+            log_error(f"{path}: {e}; using the default alert rules")
+            print(f"⚠ {path}: {e}; using the default alert rules")
+            _configs[path] = parse_alerts(DEFAULT_RULES)
+    return _configs[path]
+
+
+def display_range(channel):
+    """(low, high) of the first range rule on channel, for colouring readings; (None, None) if none."""
+    global _ranges
+    if _ranges is None:
+        _ranges = {}
+        for rule in load_alerts()[0]:
+            if rule.kind == "range":
+                _ranges.setdefault(rule.channel, rule.args)
+    return _ranges.get(channel, (None, None))
+
+
+# ---- evaluation ----
+
+class Rule:
+    """One rule's live state in one AlertEngine."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.active = False
+        self.pending_since = None  # When the condition started holding, while debouncing
+        self.samples = deque() if spec.kind == "rate" else None  # (time, value) within the window
+
+    def condition(self, value, now, last_seen):
+        """True while the rule's alert condition holds (with hysteresis once active)."""
+        spec = self.spec
+        margin = spec.hysteresis if self.active else 0.0
+        if spec.kind == "stale":
+            # >=, not >: the re-check is scheduled at exactly last_seen + SECONDS
+            return now - last_seen >= spec.args[0]
+        if value is None:
+            return self.active  # No reading to judge: leave the alert as it is
+        if spec.kind == "range":
+            low, high = spec.args
+            return (low is not None and value < low + margin) or (high is not None and value > high - margin)
+        change, window = spec.args
+        samples = self.samples
+        # Keep the sample in effect at the start of the window as the baseline
+        while len(samples) > 1 and samples[1][0] <= now - window:
+            samples.popleft()
+        return bool(samples) and abs(value - samples[0][1]) > change - margin
+
+    def describe(self, value):
+        spec = self.spec
+        if spec.kind == "stale":
+            return f"No valid {spec.channel} reading for {spec.args[0]:g} s"
+        if spec.kind == "range":
+            low, high = ("-inf" if spec.args[0] is None else f"{spec.args[0]:g}",
+                         "inf" if spec.args[1] is None else f"{spec.args[1]:g}")
+            return f"{spec.channel} = {value:g}, outside {low}..{high}"
+        return f"{spec.channel} moved more than {spec.args[0]:g} within {spec.args[1]:g} s (now {value:g})"
+
+
+class AlertEngine:
+    def __init__(self, specs, rig="main"):
+        self.rig = rig
+        self.rules = [Rule(spec) for spec in specs]
+        self.by_channel = {}  # channel -> [Rule], range and rate rules
+        self.stale_by_channel = {}  # channel -> [Rule]
+        for rule in self.rules:
+            index = self.stale_by_channel if rule.spec.kind == "stale" else self.by_channel
+            index.setdefault(rule.spec.channel, []).append(rule)
+        self.watched = [(channel, CHANNEL_FLAGS[channel]) for channel in CHANNEL_FLAGS
+                        if channel in self.by_channel or channel in self.stale_by_channel]
+        self.values = {}  # channel -> newest valid reading
+        self.seen = {}  # channel -> time of the newest valid reading
+        self.started = None
+        self._deadlines = []  # heap of (time, sequence, Rule) to re-check
+        self._sequence = 0
+        self.raised = {}  # rule name -> AlertEvent, for alerts raised and not yet cleared
+        self._listeners = []
+
+    @classmethod
+    def from_config(cls, rig="main", path=ALERTS_FILE, alert_log=ALERT_LOG_FILE, notify=True):
+        """Rules from alerts.txt; notify=False logs and prints alerts but skips its webhooks and plugins."""
+        rules, notifiers = load_alerts(path)
+        engine = cls(rules, rig)
+        engine.add_listener(shared_dispatcher(notifiers if notify else (), alert_log).notify)
+        return engine
+
+    def add_listener(self, callback):
+        """Call callback(AlertEvent) whenever an alert is raised or cleared."""
+        self._listeners.append(callback)
+        return callback
+
+    def start(self, now):
+        """Begin the stale timers; until a first reading they count from now."""
+        self.started = now
+        for rules in self.stale_by_channel.values():
+            for rule in rules:
+                self._schedule(now + rule.spec.args[0], rule)
+
+    def observe(self, frame, now):
+        """Feed one decoded frame; evaluates only the rules of channels whose reading changed."""
+        for channel, flag in self.watched:
+            if not frame.valid & flag:
+                continue
+            value = reading(frame, channel)
+            if value is None:
+                continue  # A failed sensor: stale rules will notice if it stays that way
+            self.seen[channel] = now
+            for rule in self.stale_by_channel.get(channel, ()):
+                if rule.active or rule.pending_since is not None:
+                    self._evaluate(rule, now)
+            if self.values.get(channel) == value:
+                continue
+            self.values[channel] = value
+            for rule in self.by_channel.get(channel, ()):
+                if rule.samples is not None:
+                    rule.samples.append((now, value))
+                self._evaluate(rule, now)
+
+    def next_deadline(self):
+        return self._deadlines[0][0] if self._deadlines else None
+
+    def tick(self, now):
+        """Re-check the rules whose debounce, stale or rate timers have run out."""
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, rule = heapq.heappop(self._deadlines)
+            self._evaluate(rule, now)
+
+    def _schedule(self, when, rule):
+        self._sequence += 1
+        heapq.heappush(self._deadlines, (when, self._sequence, rule))
+
+    def _evaluate(self, rule, now):
+        spec = rule.spec
+        value = self.values.get(spec.channel)
+        last_seen = self.seen.get(spec.channel, self.started if self.started is not None else now)
+        if rule.condition(value, now, last_seen):
+            if rule.active:
+                pass
+            elif rule.pending_since is None and spec.delay:
+                rule.pending_since = now
+                self._schedule(now + spec.delay, rule)
+            elif rule.pending_since is None or now - rule.pending_since >= spec.delay:
+                rule.pending_since = None
+                rule.active = True
+                self._notify(rule, "raised", value, now)
+        else:
+            rule.pending_since = None
+            if rule.active:
+                rule.active = False
+                self._notify(rule, "cleared", value, now)
+        if spec.kind == "stale" and not rule.active and rule.pending_since is None:
+            self._schedule(last_seen + spec.args[0], rule)  # When it would go stale from here
+        elif spec.kind == "rate" and len(rule.samples) > 1 and (rule.active or rule.pending_since is not None):
+            # The baseline moving forward can clear the alert without a new reading
+            self._schedule(rule.samples[1][0] + spec.args[1], rule)
+
+    def _notify(self, rule, state, value, now):
+        spec = rule.spec
+        message = rule.describe(value) if state == "raised" else f"{spec.name} back to normal"
+        event = AlertEvent(now, self.rig, spec.name, spec.channel, spec.severity, state, value, message)
+        if state == "raised":
+            self.raised[spec.name] = event
+        else:
+            self.raised.pop(spec.name, None)
+        for callback in list(self._listeners):
+            try:
+                callback(event)
+            except Exception as e:
+                log_error(f"Alert listener failed on {spec.name}: {e}")
+
+
+# ---- notifiers ----
+
+class AlertLog:
+    """Appends every alert to logs/alerts.csv."""
+
+    def __init__(self, path=ALERT_LOG_FILE):
+        self.path = path
+
+    def __call__(self, event):
+        new_file = not os.path.exists(self.path)
+        with open(self.path, "a") as f:
+            if new_file:
+                f.write(ALERT_LOG_HEADER)
+            value = "" if event.value is None else f"{event.value:g}"
+            message = event.message.replace('"', "'")
+            f.write(f'{datetime.fromtimestamp(event.time).strftime("%Y-%m-%d %H:%M:%S")},{event.rig},{event.rule},'
+                    f'{event.channel},{event.severity},{event.state},{value},"{message}"\n')
+
+
+def print_alert(event):
+    icon = "✅" if event.state == "cleared" else {"info": "ℹ", "warning": "⚠", "critical": "🚨"}[event.severity]
+    print(f"{icon} [{event.rig}] {event.message}")
+
+
+def webhook(url, timeout=10):
+    def post(event):
+        from urllib.request import Request, urlopen
+        body = json.dumps(event._asdict()).encode()
+        urlopen(Request(url, data=body, headers={"Content-Type": "application/json"}), timeout=timeout).close()
+    return post
+
+
+def load_plugin(target):
+    """'module:function' -> the function; it is called with each AlertEvent."""
+    module_name, _, function = target.partition(":")
+    return getattr(importlib.import_module(module_name), function)
+
+
+class AlertDispatcher:
+    """Hands alerts to the notifiers on a worker thread, in order."""
+
+    def __init__(self, notifiers):
+        self.notifiers = list(notifiers)
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name="alerts", daemon=True).start()
+
+    def notify(self, event):
+        self._queue.put(event)
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            for notifier in self.notifiers:
+                try:
+                    notifier(event)
+                except Exception as e:
+                    log_error(f"Alert notifier {getattr(notifier, '__name__', notifier)} failed: {e}")
+
+
+_dispatchers = {}  # alert log path -> AlertDispatcher
+
+
+def shared_dispatcher(notifier_specs=(), alert_log=ALERT_LOG_FILE):
+    """One dispatcher for every rig in the process that writes to alert_log."""
+    dispatcher = _dispatchers.get(alert_log)
+    if dispatcher is None:
+        os.makedirs(os.path.dirname(alert_log) or ".", exist_ok=True)
+        notifiers = [AlertLog(alert_log), print_alert]
+        for kind, argument in notifier_specs:
+            try:
+                notifiers.append(webhook(argument) if kind == "webhook" else load_plugin(argument))
+            except (ImportError, AttributeError) as e:
+                log_error(f"Alert notifier {argument} not loaded: {e}")
+        dispatcher = _dispatchers[alert_log] = AlertDispatcher(notifiers)
+    return dispatcher
@@ -23,6 +23,8 @@
 #include <OneWire.h>
 #include <DallasTemperature.h>
 
+#include <EEPROM.h>
+
 // Define DHT Sensor Type
 #define DHTTYPE DHT11
 DHT dht(DHTPIN, DHTTYPE);
@@ -44,6 +46,58 @@ unsigned long overrideEndTime = 0;  // Overrides expire after 10 minutes
 int lastMeasuredPh = -1;
 int lastMeasuredEc = -1;
 
+// Binary data frames (negotiated by the Pi with PROTO:BIN, see frames.py):
+// 0xA5 | length | type | payload | CRC-16/CCITT-FALSE over type+payload (little-endian)
+#define BINARY_SYNC 0xA5
+#define BINARY_STATE 0x01
+#define BINARY_RELAYS 0x02
+#define BINARY_SENSORS 0x03
+bool binaryMode = false;
+
+// Schedule uploaded by the Pi (schedule_compiler.py):
+// version | count | count x [device, on minute, off minute] | CRC-16, little-endian.
+// It arrives in parts small enough for the 64-byte serial receive buffer:
+// "SCHED_BEGIN:<length>", then "SCHED_PART:<n>:<hex>" lines of up to
+// SCHEDULE_PART_BYTES bytes, then "SCHED_END:<crc>"; each one is answered
+// before the Pi sends the next.
+// Kept in EEPROM (length byte, then the table) so it survives a reset; the
+// built-in schedule in runSchedule() only runs until a table is uploaded.
+#define SCHEDULE_VERSION 1
+#define MAX_SCHEDULE_ENTRIES 32
+#define SCHEDULE_TABLE_MAX (4 + MAX_SCHEDULE_ENTRIES * 5)
+#define SCHEDULE_PART_BYTES 16
+#define SCHEDULE_EEPROM_ADDR 0
+struct ScheduleEntry {
+    uint8_t device;      // 0 = LT, 1 = LB, 2 = PT, 3 = PB
+    uint16_t onMinute;   // minutes after midnight, inclusive
+    uint16_t offMinute;  // exclusive, up to 1440
+};
+ScheduleEntry scheduleEntries[MAX_SCHEDULE_ENTRIES];
+uint8_t scheduleCount = 0;
+bool scheduleLoaded = false;
+uint8_t scheduleUpload[SCHEDULE_TABLE_MAX];  // Table being received part by part
+int scheduleUploadLength = -1;               // -1: no upload in progress
+int scheduleUploadReceived = 0;
+const uint8_t scheduleRelayPins[4] = { RELAY_LIGHTS_TOP, RELAY_LIGHTS_BOTTOM, RELAY_PUMP_TOP, RELAY_PUMP_BOTTOM };
+
+// Push telemetry (see frames.py): after SUB:<mask>,<air x10>,<humidity x10>,<water x100>,<heartbeat s>
+// only changed values go out as DELTA lines, plus a full STATE every heartbeat.
+#define SUB_RELAYS 0x01
+#define SUB_FLOATS 0x02
+#define SUB_AIR 0x04
+#define SUB_WATER 0x08
+#define SUB_SAMPLE_INTERVAL 5000  // Sensor reads block, so sample them at most this often
+uint8_t subMask = 0;
+int subAirDeadband = 5;      // 0.5 °C
+int subHumidDeadband = 20;   // 2 %
+int subWaterDeadband = 20;   // 0.2 °C
+unsigned long subHeartbeat = 60000;
+unsigned long lastFullState = 0;
+unsigned long lastSubSample = 0;
+// Values the Pi last received, fixed-point like the binary frames
+uint8_t sentRelays = 0, sentFloats = 0;
+int sentTemp = 0, sentHumid = 0, sentWater1 = 0, sentWater2 = 0;
+
 int lastMeasuredPhTop = -1;
 int lastMeasuredEcTop = 100;
 int lastMeasuredPhBottom = -2;
@@ -74,23 +128,28 @@ void setup() {
       Serial.println("Error: Water Temp Sensor 2 not found.");
     }
 
+    loadScheduleFromEeprom();
+
     Serial.println("Arduino is ready. Default time: 00:00. Running schedule.");
 }
 
 void loop() {
     unsigned long currentMillis = millis();
 
-    // Increment time every second
+    // Increment time every second. Advancing lastMillis by exactly 1000 (not
+    // to currentMillis) keeps loop latency from adding up to clock drift.
     if (currentMillis - lastMillis >= 1000) {
-        lastMillis = currentMillis;
+        lastMillis += 1000;
         incrementTime();
         if (!overrideActive) {
             runSchedule();
         }
     }
 
-    // Send relay state every 10 seconds
-    if (currentMillis - lastStateUpdate >= 10000) {
+    // Send relay state every 10 seconds (when subscribed, send changes and heartbeats instead)
+    if (subMask) {
+        pushTelemetry(currentMillis);
+    } else if (currentMillis - lastStateUpdate >= 10000) {
         lastStateUpdate = currentMillis;
         sendRelayState();
     }
@@ -107,7 +166,10 @@ void loop() {
         String command = Serial.readStringUntil('\n');
         command.trim();
         handleCommand(command);
-        sendRelayState();  // Send updated state immediately after a change
+        // Upload parts come back to back; reading every sensor after each would hold up the next
+        if (!command.startsWith("SCHED_BEGIN") && !command.startsWith("SCHED_PART")) {
+            sendRelayState();  // Send updated state immediately after a change
+        }
     }
 }
 
@@ -136,6 +198,25 @@ void sendRelayState() {
         humid = -1;
     }
 
+    rememberSent(floatTop | (floatBottom << 1), temp * 10, humid * 10,
+                 (int)round(waterTemp1 * 100), (int)round(waterTemp2 * 100));
+
+    if (binaryMode) {
+        uint8_t payload[18];
+        payload[0] = relayBits();
+        payload[1] = floatTop | (floatBottom << 1);
+        putInt16(payload + 2, temp * 10);
+        putInt16(payload + 4, humid * 10);
+        putInt16(payload + 6, (int)round(waterTemp1 * 100));
+        putInt16(payload + 8, (int)round(waterTemp2 * 100));
+        putInt16(payload + 10, phTop);
+        putInt16(payload + 12, ecTop);
+        putInt16(payload + 14, phBottom);
+        putInt16(payload + 16, ecBottom);
+        sendBinaryFrame(BINARY_STATE, payload, sizeof(payload));
+        return;
+    }
+
     Serial.print("STATE:");
     Serial.print(digitalRead(RELAY_LIGHTS_TOP));
     Serial.print(",");
@@ -172,6 +253,137 @@ void sendRelayState() {
     Serial.println(ecBottom);
 }
 
+// Record what a full STATE frame told the Pi, as the baseline for DELTA lines
+void rememberSent(uint8_t floats, int temp, int humid, int water1, int water2) {
+    sentRelays = relayBits();
+    sentFloats = floats;
+    sentTemp = temp;
+    sentHumid = humid;
+    sentWater1 = water1;
+    sentWater2 = water2;
+    lastFullState = millis();
+}
+
+// Send a DELTA line with whatever moved past its deadband since the Pi last heard
+void pushTelemetry(unsigned long now) {
+    if (now - lastFullState >= subHeartbeat) {
+        sendRelayState();  // Heartbeat: a full frame also repairs the Pi's copy after a lost delta
+        return;
+    }
+    String delta = "";
+    uint8_t relays = relayBits();
+    if ((subMask & SUB_RELAYS) && relays != sentRelays) {
+        delta += ",R=" + String(relays);
+        sentRelays = relays;
+    }
+    uint8_t floats = digitalRead(FLOAT_TOP_PIN) | (digitalRead(FLOAT_BOTTOM_PIN) << 1);
+    if ((subMask & SUB_FLOATS) && floats != sentFloats) {
+        delta += ",F=" + String(floats);
+        sentFloats = floats;
+    }
+    if ((subMask & (SUB_AIR | SUB_WATER)) && now - lastSubSample >= SUB_SAMPLE_INTERVAL) {
+        lastSubSample = now;
+        if (subMask & SUB_AIR) {
+            float t = dht.readTemperature();
+            float h = dht.readHumidity();
+            int temp = isnan(t) ? -1 : (int)t;
+            int humid = isnan(h) ? -1 : (int)h;
+            if (abs(temp * 10 - sentTemp) >= subAirDeadband) {
+                delta += ",T=" + String(temp);
+                sentTemp = temp * 10;
+            }
+            if (abs(humid * 10 - sentHumid) >= subHumidDeadband) {
+                delta += ",H=" + String(humid);
+                sentHumid = humid * 10;
+            }
+        }
+        if (subMask & SUB_WATER) {
+            waterSensors.requestTemperatures();
+            float water1 = waterSensors.getTempC(tempSensor1);
+            float water2 = waterSensors.getTempC(tempSensor2);
+            if (water1 == -127.0) water1 = -1;
+            if (water2 == -127.0) water2 = -1;
+            if (abs((int)round(water1 * 100) - sentWater1) >= subWaterDeadband) {
+                delta += ",W1=" + String(water1);
+                sentWater1 = (int)round(water1 * 100);
+            }
+            if (abs((int)round(water2 * 100) - sentWater2) >= subWaterDeadband) {
+                delta += ",W2=" + String(water2);
+                sentWater2 = (int)round(water2 * 100);
+            }
+        }
+    }
+    if (delta.length() > 0) {
+        Serial.print("DELTA:");
+        Serial.println(delta.substring(1));
+    }
+}
+
+// "SUB:<mask>,<air x10>,<humidity x10>,<water x100>,<heartbeat s>" or "SUB:OFF"
+void handleSubscribe(String args) {
+    if (args == "OFF") {
+        subMask = 0;
+        Serial.println("SUB_OK:OFF");
+        return;
+    }
+    int values[5];
+    int start = 0;
+    for (int i = 0; i < 5; i++) {
+        int comma = args.indexOf(',', start);
+        if ((comma < 0) != (i == 4)) {
+            Serial.println("Invalid subscription: " + args);
+            return;
+        }
+        values[i] = args.substring(start, comma < 0 ? args.length() : comma).toInt();
+        start = comma + 1;
+    }
+    subMask = values[0] & (SUB_RELAYS | SUB_FLOATS | SUB_AIR | SUB_WATER);
+    subAirDeadband = values[1];
+    subHumidDeadband = values[2];
+    subWaterDeadband = values[3];
+    subHeartbeat = (unsigned long)max(values[4], 5) * 1000;
+    Serial.println("SUB_OK");
+    // The loop sends a full STATE right after every command: that is the Pi's baseline
+}
+
+// Relay states as a bitmask, bit 0 = lights top (same order as the text frames)
+uint8_t relayBits() {
+    return digitalRead(RELAY_LIGHTS_TOP)
+        | digitalRead(RELAY_LIGHTS_BOTTOM) << 1
+        | digitalRead(RELAY_PUMP_TOP) << 2
+        | digitalRead(RELAY_PUMP_BOTTOM) << 3
+        | digitalRead(RELAY_SENSOR_PUMP_TOP) << 4
+        | digitalRead(RELAY_SENSOR_PUMP_BOTTOM) << 5
+        | digitalRead(RELAY_DRAIN_ACTUATOR) << 6;
+}
+
+void putInt16(uint8_t *buffer, int value) {
+    buffer[0] = value & 0xFF;
+    buffer[1] = (value >> 8) & 0xFF;
+}
+
+// CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF), matches frames.crc16 on the Pi
+uint16_t crc16Update(uint16_t crc, uint8_t data) {
+    crc ^= (uint16_t)data << 8;
+    for (uint8_t i = 0; i < 8; i++) {
+        crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+    return crc;
+}
+
+void sendBinaryFrame(uint8_t type, const uint8_t *payload, uint8_t length) {
+    uint16_t crc = crc16Update(0xFFFF, type);
+    for (uint8_t i = 0; i < length; i++) {
+        crc = crc16Update(crc, payload[i]);
+    }
+    Serial.write(BINARY_SYNC);
+    Serial.write(length);
+    Serial.write(type);
+    Serial.write(payload, length);
+    Serial.write(crc & 0xFF);
+    Serial.write(crc >> 8);
+}
+
 // Function to read and send temperature & humidity
 void sendSensorData() {
     float humidity = dht.readHumidity();
@@ -193,9 +405,24 @@ void handleCommand(String command) {
     if (command == "PING") {
         Serial.println("PING_OK");
     } else if (command.startsWith("SET_TIME:")) {
-        setTimeFromPi(command.substring(9));
+        setTimeFromPi(command.substring(9), true);
         Serial.println("SET_TIME OK");
         sendRelayState();
+    } else if (command.startsWith("SYNC_TIME:")) {
+        // Drift correction from clock_sync.py: same as SET_TIME but keeps manual overrides
+        setTimeFromPi(command.substring(10), false);
+        Serial.println("SYNC_TIME OK");
+    } else if (command == "GET_TIME") {
+        // A slow loop (sensor reads) can leave whole seconds not yet counted;
+        // count them now so the milliseconds field is below 1000 and the time is current
+        unsigned long now = millis();
+        while (now - lastMillis >= 1000) {
+            lastMillis += 1000;
+            incrementTime();
+        }
+        char reply[20];
+        sprintf(reply, "TIME:%02d:%02d:%02d.%03u", hours, minutes, seconds, (unsigned int)(now - lastMillis));
+        Serial.println(reply);
     } else if (command == "RESET_SCHEDULE") {  
         Serial.println("Schedule reset. Resuming automatic control.");
         overrideActive = false;  
@@ -206,6 +433,25 @@ void handleCommand(String command) {
         overrideDevice(command);
     //} else if (command.startsWith("ST:") || command.startsWith("SB:") || command.startsWith("DR:")) {
     //    overrideDevice(command);
+    } else if (command.startsWith("SCHED_BEGIN:")) {
+        handleScheduleBegin(command.substring(12));
+    } else if (command.startsWith("SCHED_PART:")) {
+        handleSchedulePart(command.substring(11));
+    } else if (command.startsWith("SCHED_END:")) {
+        handleScheduleEnd(command.substring(10));
+    } else if (command == "SCHED_CLEAR") {
+        scheduleLoaded = false;
+        EEPROM.update(SCHEDULE_EEPROM_ADDR, 0xFF);
+        Serial.println("SCHED_OK:BUILTIN");
+        runSchedule();
+    } else if (command.startsWith("SUB:")) {
+        handleSubscribe(command.substring(4));
+    } else if (command == "PROTO:BIN") {
+        Serial.println("PROTO_OK:BIN");
+        binaryMode = true;
+    } else if (command == "PROTO:TEXT") {
+        binaryMode = false;
+        Serial.println("PROTO_OK:TEXT");
     } else if (command == "GET_RELAYS") {
         sendRelayStatusOnly();
     } else if (command == "GET_SENSORS") {
@@ -264,15 +510,18 @@ void overrideDevice(String command) {
     sendRelayState();
 }
 
-// Function to set time from the Raspberry Pi
-void setTimeFromPi(String timeString) {
+// Function to set time from the Raspberry Pi: "HH:MM:SS" or "HH:MM:SS.mmm"
+void setTimeFromPi(String timeString, bool resumeSchedule) {
     int firstColon = timeString.indexOf(':');
     int secondColon = timeString.lastIndexOf(':');
+    int dot = timeString.indexOf('.');
 
     if (firstColon > 0 && secondColon > firstColon) {
         hours = timeString.substring(0, firstColon).toInt();
         minutes = timeString.substring(firstColon + 1, secondColon).toInt();
         seconds = timeString.substring(secondColon + 1).toInt();
+        // Milliseconds into the current second: start the next tick that much sooner
+        lastMillis = millis() - (dot > secondColon ? timeString.substring(dot + 1).toInt() : 0);
         Serial.print("Time set to: ");
         Serial.print(hours);
         Serial.print(":");
@@ -281,7 +530,9 @@ void setTimeFromPi(String timeString) {
         Serial.println(seconds);
 
         // Resume schedule after time update
-        overrideActive = false;
+        if (resumeSchedule) {
+            overrideActive = false;
+        }
         runSchedule();
     } else {
         Serial.println("Invalid time format!");
@@ -304,9 +555,142 @@ void incrementTime() {
     }
 }
 
+int hexDigit(char c) {
+    if (c >= '0' && c <= '9') return c - '0';
+    if (c >= 'A' && c <= 'F') return c - 'A' + 10;
+    if (c >= 'a' && c <= 'f') return c - 'a' + 10;
+    return -1;
+}
+
+// Check a schedule table and make it the active schedule; false if it is corrupt
+bool loadScheduleTable(const uint8_t *table, int length) {
+    if (length < 4 || table[0] != SCHEDULE_VERSION || table[1] > MAX_SCHEDULE_ENTRIES
+            || length != 4 + table[1] * 5) {
+        return false;
+    }
+    uint16_t crc = 0xFFFF;
+    for (int i = 0; i < length - 2; i++) {
+        crc = crc16Update(crc, table[i]);
+    }
+    if (crc != (table[length - 2] | table[length - 1] << 8)) {
+        return false;
+    }
+    scheduleCount = table[1];
+    for (uint8_t i = 0; i < scheduleCount; i++) {
+        const uint8_t *entry = table + 2 + i * 5;
+        scheduleEntries[i].device = entry[0] & 0x03;
+        scheduleEntries[i].onMinute = entry[1] | entry[2] << 8;
+        scheduleEntries[i].offMinute = entry[3] | entry[4] << 8;
+    }
+    scheduleLoaded = true;
+    return true;
+}
+
+void loadScheduleFromEeprom() {
+    uint8_t length = EEPROM.read(SCHEDULE_EEPROM_ADDR);
+    if (length < 4 || length > SCHEDULE_TABLE_MAX) return;  // Nothing stored (0xFF after SCHED_CLEAR)
+    uint8_t table[SCHEDULE_TABLE_MAX];
+    for (uint8_t i = 0; i < length; i++) {
+        table[i] = EEPROM.read(SCHEDULE_EEPROM_ADDR + 1 + i);
+    }
+    if (loadScheduleTable(table, length)) {
+        Serial.println("Loaded uploaded schedule from EEPROM.");
+    }
+}
+
+// "SCHED_BEGIN:<length>": start receiving a table of that many bytes
+void handleScheduleBegin(String arg) {
+    int length = arg.toInt();
+    if (length < 4 || length > SCHEDULE_TABLE_MAX) {
+        scheduleUploadLength = -1;
+        Serial.println("SCHED_ERR:LENGTH");
+        return;
+    }
+    scheduleUploadLength = length;
+    scheduleUploadReceived = 0;
+    Serial.print("SCHED_READY:");
+    Serial.println(length);
+}
+
+// "SCHED_PART:<n>:<hex>": bytes from n * SCHEDULE_PART_BYTES on. Parts come in
+// order; a part sent again because its answer was lost is accepted again.
+void handleSchedulePart(String args) {
+    int colon = args.indexOf(':');
+    if (scheduleUploadLength < 0 || colon < 1) {
+        Serial.println("SCHED_ERR:SEQUENCE");
+        return;
+    }
+    int part = args.substring(0, colon).toInt();
+    String hex = args.substring(colon + 1);
+    int offset = part * SCHEDULE_PART_BYTES;
+    int count = hex.length() / 2;
+    if (part < 0 || hex.length() % 2 != 0 || count == 0 || count > SCHEDULE_PART_BYTES
+            || offset + count > scheduleUploadLength) {
+        Serial.println("SCHED_ERR:LENGTH");
+        return;
+    }
+    if (offset > scheduleUploadReceived) {
+        Serial.println("SCHED_ERR:SEQUENCE");  // A part went missing
+        return;
+    }
+    for (int i = 0; i < count; i++) {
+        int high = hexDigit(hex.charAt(2 * i));
+        int low = hexDigit(hex.charAt(2 * i + 1));
+        if (high < 0 || low < 0) {
+            Serial.println("SCHED_ERR:HEX");
+            return;
+        }
+        scheduleUpload[offset + i] = high << 4 | low;
+    }
+    scheduleUploadReceived = max(scheduleUploadReceived, offset + count);
+    Serial.print("SCHED_PART_OK:");
+    Serial.println(part);
+}
+
+// "SCHED_END:<crc>": verify, store and switch to the uploaded schedule
+void handleScheduleEnd(String crc) {
+    int length = scheduleUploadLength;
+    scheduleUploadLength = -1;
+    if (length < 0 || scheduleUploadReceived != length) {
+        Serial.println("SCHED_ERR:SEQUENCE");
+        return;
+    }
+    char reply[5];
+    sprintf(reply, "%02X%02X", scheduleUpload[length - 1], scheduleUpload[length - 2]);
+    if (!crc.equalsIgnoreCase(reply) || !loadScheduleTable(scheduleUpload, length)) {
+        Serial.println("SCHED_ERR:CRC");
+        return;
+    }
+    // update() skips unchanged bytes, so re-uploading the same schedule costs no EEPROM wear
+    EEPROM.update(SCHEDULE_EEPROM_ADDR, length);
+    for (int i = 0; i < length; i++) {
+        EEPROM.update(SCHEDULE_EEPROM_ADDR + 1 + i, scheduleUpload[i]);
+    }
+    Serial.print("SCHED_OK:");
+    Serial.println(reply);
+    runSchedule();
+}
+
+void runUploadedSchedule() {
+    uint16_t minuteOfDay = hours * 60 + minutes;
+    bool on[4] = { false, false, false, false };
+    for (uint8_t i = 0; i < scheduleCount; i++) {
+        if (minuteOfDay >= scheduleEntries[i].onMinute && minuteOfDay < scheduleEntries[i].offMinute) {
+            on[scheduleEntries[i].device] = true;
+        }
+    }
+    for (uint8_t device = 0; device < 4; device++) {
+        digitalWrite(scheduleRelayPins[device], on[device] ? HIGH : LOW);
+    }
+}
+
 // Function to run the schedule
 void runSchedule() {
     if (overrideActive) return;
+    if (scheduleLoaded) {
+        runUploadedSchedule();
+        return;
+    }
 
     // Lights on from 7:00 AM to 7:00 PM
     bool lightsOn = (hours >= 7 && hours < 19);
@@ -419,6 +803,12 @@ void measureAndStoreAnalogSensors(bool isTopSystem) {
 */
 
 void sendRelayStatusOnly() {
+    if (binaryMode) {
+        uint8_t payload[1] = { relayBits() };
+        sendBinaryFrame(BINARY_RELAYS, payload, sizeof(payload));
+        return;
+    }
+
     Serial.print("RELAYS:");
     Serial.print(digitalRead(RELAY_LIGHTS_TOP));
     Serial.print(",");
@@ -452,6 +842,17 @@ void sendSensorStatusOnly() {
     int floatTop = digitalRead(FLOAT_TOP_PIN);
     int floatBottom = digitalRead(FLOAT_BOTTOM_PIN);
 
+    if (binaryMode) {
+        uint8_t payload[9];
+        payload[0] = floatTop | (floatBottom << 1);
+        putInt16(payload + 1, temp * 10);
+        putInt16(payload + 3, humid * 10);
+        putInt16(payload + 5, (int)round(waterTemp1 * 100));
+        putInt16(payload + 7, (int)round(waterTemp2 * 100));
+        sendBinaryFrame(BINARY_SENSORS, payload, sizeof(payload));
+        return;
+    }
+
     Serial.print("SENSORS:");
     Serial.print(temp);
     Serial.print(",");
@@ -0,0 +1,51 @@
+"""Micro-benchmark for frames.decode_frame.
+
+Run from the repo root:  python benchmarks/bench_frames.py [iterations]
+
+Prints the per-frame cost of decoding each frame type, next to the old
+split-and-float() validation it replaced, so regressions in the parse path
+show up before they show up on the Pi.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frames import decode_frame  # noqa: E402
+
+SAMPLES = {
+    "STATE": "STATE:1,1,0,0,0,0,0,1,0,23,61,19.50,19.75,612,1450,598,1380",
+    "RELAYS": "RELAYS:1,1,0,0,0,0,0",
+    "SENSORS": "SENSORS:23,61,19.50,19.75,1,0",
+}
+
+
+def legacy_state(message):
+    """The pre-decoder STATE path: split, float() to validate, keep the strings."""
+    parts = message[len("STATE:"):].split(",")
+    if len(parts) != 17:
+        return None
+    for index in (9, 10, 13, 14, 15, 16):
+        float(parts[index])
+    states = [parts[i] == "1" for i in range(7)]
+    return states, parts[7:]
+
+
+def per_frame_us(statement, iterations):
+    best = min(timeit.repeat(statement, number=iterations, repeat=5))
+    return best / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f"{'frame':<10}{'decode_frame':>16}")
+    for kind, line in SAMPLES.items():
+        cost = per_frame_us(lambda line=line: decode_frame(line), iterations)
+        print(f"{kind:<10}{cost:>13.2f} µs")
+    legacy = per_frame_us(lambda: legacy_state(SAMPLES["STATE"]), iterations)
+    print(f"{'legacy':<10}{legacy:>13.2f} µs  (old STATE split/validate only)")
+
+
+if __name__ == "__main__":
+    main()
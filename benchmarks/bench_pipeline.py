@@ -0,0 +1,334 @@
+"""Throughput and latency benchmark for the host pipeline.
+
+Run from the repo root:
+
+    python benchmarks/bench_pipeline.py [--frames N] [--replay capture.txt] [--json out.json]
+    python benchmarks/bench_pipeline.py --compare before.json after.json
+
+Replays a synthetic (or recorded, one line per frame) stream of STATE /
+RELAYS / SENSORS lines through every stage a frame passes on the Pi:
+
+    feed    SerialReactor.feed: bytes -> lines
+    decode  frames.decode_frame: parse and validate
+    state   TelemetryState.update: merge and change detection
+    log     SensorLogWriter append plus its batched CSV/history flush
+    render  apply_frame into the ViewModel, flush, Tk idle redraw
+
+Each stage is timed per frame and reported as latency percentiles; the
+sum gives end-to-end frames per second. A second pass runs each stage under
+tracemalloc to report its allocation peak. Results (with RSS and the git
+commit) can be saved as JSON, and two saved runs compared.
+
+Rendering uses the real HydroponicsGUI when Tk can open a display
+(e.g. under xvfb-run), and recording stand-in widgets otherwise.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frames import RELAY_COUNT, SensorFrame, decode_frame, frame_to_line  # noqa: E402
+from helpers import TelemetryState, apply_frame  # noqa: E402
+from history_store import HistoryStore  # noqa: E402
+from sensor_log import SensorLogWriter  # noqa: E402
+from serial_reactor import SerialReactor  # noqa: E402
+from view_model import ViewModel  # noqa: E402
+
+STAGES = ("feed", "decode", "state", "log", "render")
+# Roughly what the poller produces: mostly relay polls, a STATE every few, SENSORS now and then
+DEFAULT_MIX = {"RELAYS": 0.7, "STATE": 0.2, "SENSORS": 0.1}
+
+
+# ---- input streams ----
+
+def synthetic_stream(count, seed=0, mix=DEFAULT_MIX):
+    """Lines from a random walk over every reading, with occasional relay switches."""
+    rng = random.Random(seed)
+    state = SensorFrame("STATE", 0b0000011, True, True, 23.0, 60.0, 19.5, 19.75, -1, 100, -2, 200)
+    kinds, weights = zip(*mix.items())
+    lines = []
+    for _ in range(count):
+        if rng.random() < 0.05:
+            state.relays ^= 1 << rng.randrange(RELAY_COUNT)
+        state.air_temp = float(int(state.air_temp + rng.choice((-1, 0, 0, 0, 1))))
+        state.humidity = float(int(state.humidity + rng.choice((-1, 0, 0, 1))))
+        state.water_temp1 = round(state.water_temp1 + rng.choice((-0.0625, 0, 0, 0.0625)), 2)
+        state.water_temp2 = round(state.water_temp2 + rng.choice((-0.0625, 0, 0, 0.0625)), 2)
+        state.kind = rng.choices(kinds, weights)[0]
+        lines.append(frame_to_line(state))
+    return lines
+
+
+def replay_stream(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+# ---- render targets ----
+
+class RecordingWidget:
+    """Stand-in for a Tk widget/canvas: keeps the options it is given."""
+
+    def __init__(self):
+        self.options = {}
+
+    def config(self, **options):
+        self.options.update(options)
+
+    def itemconfig(self, item, **options):
+        self.options.update(options)
+
+
+def mock_gui():
+    labels = ("temperature_label", "humidity_label", "ph_label", "ec_label", "water_temp1_label",
+              "water_temp2_label", "water_level_top_label", "water_level_bottom_label")
+    gui = SimpleNamespace(view=ViewModel(), **{name: RecordingWidget() for name in labels})
+    gui.states = {
+        key: {"state": False, "button": RecordingWidget(), "light": RecordingWidget()}
+        for key in ("lights_top", "lights_bottom", "pump_top", "pump_bottom")
+    }
+    return gui, None
+
+
+class _IdleController:
+    def add_listener(self, callback):
+        pass
+
+
+def tk_gui():
+    """The real GUI on a real (possibly virtual) display; None if Tk has no display."""
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception:
+        return None
+    from hydroponics_gui import HydroponicsGUI
+    root.withdraw()
+    gui = HydroponicsGUI(root, _IdleController())
+    gui.bridge.stop()
+    return gui, root
+
+
+# ---- measurement ----
+
+def build_stages(gui, root, log_dir):
+    reactor = SerialReactor(None)
+    lines = []
+    reactor.subscribe(lines.append)
+    telemetry = TelemetryState()
+    writer = SensorLogWriter(directory=log_dir, history=HistoryStore(os.path.join(log_dir, "history")))
+    flush_every = writer.flush_lines
+
+    def feed(raw):
+        reactor.feed(raw)
+        return lines.pop()
+
+    def log(frame):
+        if frame.kind == "STATE":
+            writer.append(frame)
+            if len(writer._buffer) >= flush_every:
+                writer.flush()  # The writer thread's share, charged to the frame that fills a batch
+
+    def render(frame):
+        apply_frame(gui, frame)
+        gui.view.flush()
+        if root is not None:
+            root.update_idletasks()
+
+    return {
+        "feed": feed,
+        "decode": decode_frame,
+        "state": telemetry.update,
+        "log": log,
+        "render": render,
+    }, writer
+
+
+def run_pipeline(stages, lines):
+    """Push every line through all stages; returns {stage: [ns per frame]} and frames processed."""
+    timings = {name: [] for name in STAGES}
+    clock = time.perf_counter_ns
+    feed, decode, update, log, render = (stages[name] for name in STAGES)
+    frames = 0
+    for line in lines:
+        raw = (line + "\n").encode()
+        t0 = clock()
+        text = feed(raw)
+        t1 = clock()
+        frame = decode(text)
+        t2 = clock()
+        if frame is None:
+            continue
+        update(frame)
+        t3 = clock()
+        log(frame)
+        t4 = clock()
+        render(frame)
+        t5 = clock()
+        frames += 1
+        for name, start, end in zip(STAGES, (t0, t1, t2, t3, t4), (t1, t2, t3, t4, t5)):
+            timings[name].append(end - start)
+    return timings, frames
+
+
+def allocation_peaks(gui, root, lines, log_dir):
+    """Peak traced allocation (bytes) of each stage run over the whole stream on its own."""
+    stages, writer = build_stages(gui, root, log_dir)
+    texts = [stages["feed"]((line + "\n").encode()) for line in lines]
+    frames = [frame for frame in map(decode_frame, texts) if frame is not None]
+    inputs = {
+        "feed": [(line + "\n").encode() for line in lines],
+        "decode": texts,
+        "state": frames, "log": frames, "render": frames,
+    }
+    peaks = {}
+    for name in STAGES:
+        stage = stages[name]
+        tracemalloc.start()
+        for item in inputs[name]:
+            stage(item)
+        _, peaks[name] = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    writer.close()
+    return peaks
+
+
+def percentiles(samples_ns):
+    ordered = sorted(samples_ns)
+    if not ordered:
+        return {}
+
+    def at(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] / 1000
+
+    return {
+        "mean_us": sum(ordered) / len(ordered) / 1000,
+        "p50_us": at(0.50),
+        "p95_us": at(0.95),
+        "p99_us": at(0.99),
+        "max_us": ordered[-1] / 1000,
+    }
+
+
+def current_rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        return None
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(lines, use_tk=True, warmup=200):
+    target = tk_gui() if use_tk else None
+    renderer = "tk" if target else "mock"
+    gui, root = target or mock_gui()
+    with tempfile.TemporaryDirectory() as log_dir:
+        stages, writer = build_stages(gui, root, log_dir)
+        run_pipeline(stages, lines[:warmup])
+        started = time.perf_counter()
+        timings, frames = run_pipeline(stages, lines)
+        wall = time.perf_counter() - started
+        writer.close()
+        peaks = allocation_peaks(gui, root, lines, log_dir)
+    if root is not None:
+        root.destroy()
+
+    total = [sum(parts) for parts in zip(*timings.values())]
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "renderer": renderer,
+            "lines": len(lines),
+            "frames": frames,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "fps": frames / wall if wall else None,
+        "stages": {
+            name: dict(percentiles(timings[name]), alloc_peak_kb=peaks[name] / 1024) for name in STAGES
+        },
+        "total": percentiles(total),
+        "memory": {
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "rss_kb": current_rss_kb(),
+        },
+    }
+
+
+# ---- reporting ----
+
+def print_report(result):
+    meta = result["meta"]
+    print(f"{meta['frames']} frames ({meta['renderer']} renderer, commit {meta['commit'] or '?'}): "
+          f"{result['fps']:.0f} frames/s")
+    print(f"{'stage':<8}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>10}{'alloc peak':>13}")
+    rows = list(result["stages"].items()) + [("total", result["total"])]
+    for name, stats in rows:
+        alloc = f"{stats['alloc_peak_kb']:.1f} KB" if "alloc_peak_kb" in stats else ""
+        print(f"{name:<8}" + "".join(f"{stats[key]:>9.1f}" for key in ("mean_us", "p50_us", "p95_us", "p99_us"))
+              + f"{stats['max_us']:>10.1f}{alloc:>13}")
+    print("(µs per frame)")
+    memory = result["memory"]
+    print(f"RSS {memory['rss_kb']} KB, peak {memory['max_rss_kb']} KB")
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before['meta']['commit']} -> {after['meta']['commit']}")
+    print(f"fps    {before['fps']:>10.0f} -> {after['fps']:>10.0f}  ({after['fps'] / before['fps'] - 1:+.1%})")
+    for name in list(STAGES) + ["total"]:
+        old = before["stages"][name] if name in STAGES else before["total"]
+        new = after["stages"][name] if name in STAGES else after["total"]
+        change = new["p50_us"] / old["p50_us"] - 1 if old["p50_us"] else 0.0
+        print(f"{name:<7}p50 {old['p50_us']:>8.1f} -> {new['p50_us']:>8.1f} µs ({change:+.1%})"
+              f"   p99 {old['p99_us']:>8.1f} -> {new['p99_us']:>8.1f} µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parse -> validate -> log -> render per frame")
+    parser.add_argument("--frames", type=int, default=20000, help="Synthetic frames to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replay", help="File of recorded frame lines to replay instead")
+    parser.add_argument("--no-tk", action="store_true", help="Always render into stand-in widgets")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two saved results")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    lines = replay_stream(args.replay) if args.replay else synthetic_stream(args.frames, args.seed)
+    result = benchmark(lines, use_tk=not args.no_tk)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved {args.json}")
+
+
+if __name__ == "__main__":
+    main()
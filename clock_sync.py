@@ -0,0 +1,118 @@
+import asyncio
+import time
+from datetime import datetime
+
+from helpers import log_error
+from schedule_engine import SECONDS_PER_DAY, seconds_of_day
+from serial_reactor import CommandRejected
+
+# -------------------- Clock Sync --------------------
+#
+# The sketch keeps time by counting millis() from the last SET_TIME, so its
+# clock wanders by seconds a day. ClockSync measures it with GET_TIME,
+# which answers "TIME:HH:MM:SS.mmm". Each measurement takes a few samples
+# and keeps the one with the shortest round trip. Its offset is the sketch's
+# time minus the Pi's time at the midpoint of the round trip, like NTP. The
+# sketch's clock is only corrected (SYNC_TIME, which unlike SET_TIME leaves
+# manual overrides alone) once the offset passes the threshold.
+#
+# The drift rate is the offset gained since the last correction divided by
+# the time since then. It decides when to measure next: a clock that drifts
+# slowly is checked rarely, so the link only carries a few bytes an hour.
+# Older sketches reject GET_TIME; for them the startup SET_TIME is all we do.
+
+TIME_REPLY = "TIME:"
+
+
+def parse_time_reply(reply):
+    """Seconds after midnight from 'TIME:HH:MM:SS.mmm'."""
+    hours, minutes, seconds = reply[len(TIME_REPLY):].strip().split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def wrap_offset(offset):
+    """Fold an offset into [-12 h, 12 h) so a clock just past midnight is not a day off."""
+    return (offset + SECONDS_PER_DAY / 2) % SECONDS_PER_DAY - SECONDS_PER_DAY / 2
+
+
+def time_command(name, timestamp):
+    """'NAME:HH:MM:SS.mmm' for the given epoch time."""
+    return f"{name}:{datetime.fromtimestamp(timestamp).strftime('%H:%M:%S.%f')[:-3]}"
+
+
+class ClockSync:
+    def __init__(self, controller, threshold=0.5, samples=3, min_interval=300.0, max_interval=6 * 3600.0):
+        self.controller = controller
+        self.threshold = threshold
+        self.samples = samples
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.supported = True
+        self.offset = None      # sketch minus Pi, seconds, at the last measurement
+        self.rtt = None         # round trip of the sample that measurement used
+        self.drift_ppm = None   # microseconds gained or lost per second
+        self.corrections = 0
+        self.last_measured = None
+        self._corrected_at = None  # Pi time of the last SET_TIME / SYNC_TIME
+
+    def status(self):
+        return {
+            "offset": self.offset,
+            "rtt": self.rtt,
+            "drift_ppm": self.drift_ppm,
+            "corrections": self.corrections,
+            "last_measured": self.last_measured,
+        }
+
+    async def set_time(self, command="SET_TIME"):
+        """Send the Pi's time, advanced by half the last round trip so it is right on arrival."""
+        latency = self.rtt / 2 if self.rtt is not None else 0.0
+        await self.controller.request(time_command(command, time.time() + latency))
+        self._corrected_at = time.time()
+
+    async def measure(self):
+        """Return (offset, rtt) from the lowest-latency of several GET_TIME samples."""
+        best = None
+        for _ in range(self.samples):
+            sent = time.time()
+            reply = await self.controller.request("GET_TIME")
+            received = time.time()
+            rtt = received - sent
+            if best is None or rtt < best[1]:
+                midpoint = seconds_of_day((sent + received) / 2)
+                best = (wrap_offset(parse_time_reply(reply) - midpoint), rtt)
+        return best
+
+    async def check(self):
+        """Measure once and correct the sketch's clock if it is off by more than the threshold."""
+        self.offset, self.rtt = await self.measure()
+        self.last_measured = time.time()
+        if self._corrected_at is not None:
+            elapsed = self.last_measured - self._corrected_at
+            if elapsed > 60:
+                self.drift_ppm = self.offset / elapsed * 1e6
+        if abs(self.offset) > self.threshold:
+            print(f"🕒 Arduino clock is {self.offset:+.2f} s off; correcting.")
+            await self.set_time("SYNC_TIME")
+            self.corrections += 1
+
+    def next_interval(self):
+        """Seconds until the drift would eat half the threshold, within [min_interval, max_interval]."""
+        if not self.drift_ppm:
+            return self.min_interval
+        interval = self.threshold / 2 / (abs(self.drift_ppm) / 1e6)
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    async def run(self, emit):
+        """Periodic measurement loop; emit(status) after every check."""
+        while self.supported:
+            await asyncio.sleep(self.next_interval())
+            try:
+                await self.check()
+            except CommandRejected:
+                print("ℹ Arduino sketch has no GET_TIME; clock drift is not corrected.")
+                self.supported = False
+            except Exception as e:
+                log_error(f"Clock sync failed: {e}")
+                continue
+            emit(self.status())
@@ -0,0 +1,185 @@
+import asyncio
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import serial
+
+import metrics
+from helpers import log_error
+
+# -------------------- Connection Manager --------------------
+#
+# Finding the Arduino used to mean opening up to four fixed ports one after
+# another and sleeping 2 s on each. Now:
+#
+#   - candidate ports come from the USB VID/PID the OS reports (genuine
+#     boards first), falling back to the usual /dev/ttyACM*/ttyUSB* names;
+#   - all candidates are probed at once, each with a PING handshake that
+#     returns as soon as the sketch answers instead of after a fixed sleep;
+#   - DTR is held low while opening where the platform allows it, so a
+#     reconnect does not reset the board (and wait for its boot delay).
+#     The sketch then answers within one loop(), about 1 s; where the open
+#     does reset the board it takes about 2.5 s (bootloader plus setup()'s
+#     2 s delay) before the sketch says it is ready;
+#   - after a disconnect, reconnect() retries with exponential backoff and
+#     cuts the wait short as soon as a serial port appears or disappears,
+#     so replugging the cable reconnects at once.
+#
+# The controller re-sends the time, protocol options and schedule after
+# every reconnect (HydroController._connection_task).
+
+# USB vendor IDs of boards and USB-serial chips found on Arduinos
+ARDUINO_USB_VIDS = {
+    0x2341: "Arduino",
+    0x2A03: "Arduino (arduino.org)",
+    0x1A86: "CH340 (clone)",
+    0x0403: "FTDI",
+    0x10C4: "CP210x",
+}
+FALLBACK_PORTS = ("/dev/ttyACM*", "/dev/ttyUSB*")
+
+HANDSHAKE_INTERVAL = 0.25  # Read timeout while waiting for the sketch
+PING_RETRY = 1.5  # Seconds to wait for PING_OK before asking again; one loop() can take ~1 s
+BOOT_LINE = b"Arduino is ready"
+
+
+def candidate_ports(port=None):
+    """Devices worth probing, most likely first."""
+    if port:
+        return [port]
+    from serial.tools import list_ports
+    ports = [info for info in list_ports.comports() if info.vid in ARDUINO_USB_VIDS]
+    # Genuine boards first, then the USB-serial chips clones use
+    ports.sort(key=lambda info: list(ARDUINO_USB_VIDS).index(info.vid))
+    devices = [info.device for info in ports]
+    if not devices:
+        devices = sorted(device for pattern in FALLBACK_PORTS for device in glob.glob(pattern))
+    return devices
+
+
+def port_signature():
+    """Set of serial devices currently present (cheap; used to notice hot-plug)."""
+    from serial.tools import list_ports
+    return frozenset(info.device for info in list_ports.comports())
+
+
+def board_id(arduino):
+    """Identifies the board behind an open link: its USB serial number where the
+    chip reports one, else VID:PID and device; the port name for anything else."""
+    port = getattr(arduino, "port", None)
+    if not port or "://" in port:
+        return port  # sim://arduino, socket:// and other URL handlers
+    from serial.tools import list_ports
+    device = os.path.realpath(port)  # /dev/serial/by-id/... links to the ttyACM device
+    for info in list_ports.comports():
+        if info.device not in (port, device):
+            continue
+        if info.serial_number:
+            return f"usb:{info.serial_number}"
+        if info.vid is not None:
+            return f"usb:{info.vid:04x}:{info.pid:04x}@{info.device}"
+    return port
+
+
+def open_port(device, baudrate=9600):
+    arduino = serial.Serial()
+    arduino.port = device
+    arduino.baudrate = baudrate
+    arduino.timeout = HANDSHAKE_INTERVAL
+    arduino.dtr = False  # Avoid the auto-reset on open where the driver honours it
+    arduino.open()
+    return arduino
+
+
+def handshake(arduino, timeout=4.0):
+    """PING until the sketch answers PING_OK, or prints its boot line after a reset;
+    False if it stays silent for timeout seconds."""
+    deadline = time.monotonic() + timeout
+    arduino.reset_input_buffer()
+    buffer = b""
+    sent_at = None
+    while time.monotonic() < deadline:
+        # One PING at a time: the sketch reads one command per loop(), so PINGs sent
+        # faster would queue up ahead of the controller's first commands
+        if sent_at is None or time.monotonic() - sent_at >= PING_RETRY:
+            arduino.write(b"PING\n")
+            sent_at = time.monotonic()
+        buffer += arduino.read(max(1, arduino.in_waiting))
+        if b"PING_OK" in buffer or BOOT_LINE in buffer:
+            return True
+        buffer = buffer[-64:]
+    return False
+
+
+def probe(device, baudrate=9600, timeout=4.0):
+    """Open device and return it if an Arduino sketch answers there, else None."""
+    try:
+        arduino = open_port(device, baudrate)
+    except (OSError, serial.SerialException):
+        return None
+    try:
+        if handshake(arduino, timeout):
+            return arduino
+    except (OSError, serial.SerialException):
+        pass
+    arduino.close()
+    return None
+
+
+def discover(port=None, baudrate=9600, timeout=4.0):
+    """Probe every candidate port in parallel and return the first that answers, or None."""
+    devices = candidate_ports(port)
+    if not devices:
+        return None
+    found = None
+    with ThreadPoolExecutor(max_workers=len(devices), thread_name_prefix="probe") as pool:
+        futures = {pool.submit(probe, device, baudrate, timeout): device for device in devices}
+        for future in as_completed(futures):
+            arduino = future.result()
+            if arduino is None:
+                continue
+            if found is None:
+                found = arduino
+                print(f"✅ Connected to Arduino on {futures[future]}")
+            else:
+                arduino.close()  # A second board answered; keep the first
+    return found
+
+
+class ConnectionManager:
+    def __init__(self, port=None, baudrate=9600, handshake_timeout=4.0, min_backoff=0.25, max_backoff=8.0):
+        self.port = port
+        self.baudrate = baudrate
+        self.handshake_timeout = handshake_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.reconnects = 0
+
+    def connect(self):
+        """One discovery pass (blocking); returns an open serial.Serial or None."""
+        try:
+            return discover(self.port, self.baudrate, self.handshake_timeout)
+        except Exception as e:
+            log_error(f"Arduino discovery failed: {e}")
+            return None
+
+    async def reconnect(self):
+        """Retry discovery with exponential backoff until an Arduino answers."""
+        loop = asyncio.get_running_loop()
+        backoff = self.min_backoff
+        while True:
+            ports = await loop.run_in_executor(None, port_signature)
+            arduino = await loop.run_in_executor(None, self.connect)
+            if arduino:
+                self.reconnects += 1
+                metrics.RECONNECTS.inc()
+                return arduino
+            # Wait out the backoff, but go again at once if a port is plugged in or removed
+            deadline = time.monotonic() + backoff
+            while time.monotonic() < deadline:
+                await asyncio.sleep(min(0.5, max(deadline - time.monotonic(), 0)))
+                if await loop.run_in_executor(None, port_signature) != ports:
+                    break
+            backoff = min(backoff * 2, self.max_backoff)
@@ -0,0 +1,263 @@
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future
+
+from helpers import log_error
+
+# -------------------- Controller Link --------------------
+#
+# Front ends attach to the headless controller over a local Unix socket.
+# Messages are newline-delimited JSON in both directions:
+#
+#   controller -> client  {"simulated": false}                              (first, once)
+#                         {"rig": "rack1", "event": "frame", "value": "STATE:..."}
+#                         {"id": 3, "reply": "PING_OK"} / {"id": 3, "error": "..."}
+#   client -> controller  {"command": "LT:ON", "rig": "rack1"}               (fire-and-forget)
+#                         {"request": "GET_RELAYS", "rig": "rack1", "id": 3}  (answered by id)
+#
+# "rig" picks one of the daemon's rigs (see rigs.py); without it, commands
+# go to the first rig. A new client first receives every rig's snapshot so
+# it can paint immediately instead of waiting for the next poll.
+#
+# Only ControlServer needs asyncio and imports it where it is used, so a
+# GUI that attaches as a client starts without loading it.
+
+DEFAULT_SOCKET_PATH = os.environ.get("HYDRO_SOCKET", "/tmp/hydroponics.sock")
+
+# Drop clients that stop reading instead of buffering for them forever
+MAX_CLIENT_BUFFER = 256 * 1024
+
+
+def encode_message(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+class ControlServer:
+    def __init__(self, rigs, path=DEFAULT_SOCKET_PATH):
+        self.rigs = rigs  # rigs.RigRegistry
+        self.path = path
+        self.server = None
+        self.clients = set()
+
+    async def start(self):
+        import asyncio
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Stale socket from a previous run
+        self.server = await asyncio.start_unix_server(self._handle_client, path=self.path)
+        self.rigs.add_listener(self._broadcast)
+        print(f"🔌 Controller listening on {self.path}")
+        return self
+
+    async def close(self):
+        self.rigs.remove_listener(self._broadcast)
+        for writer in list(self.clients):
+            writer.close()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _broadcast(self, rig, event, value):
+        line = encode_message({"rig": rig, "event": event, "value": value})
+        for writer in list(self.clients):
+            self._write(writer, line)
+
+    def _write(self, writer, line):
+        if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            log_error("Dropping controller client that stopped reading")
+            self.clients.discard(writer)
+            writer.close()
+            return
+        writer.write(line)
+
+    async def _handle_client(self, reader, writer):
+        import asyncio
+        self.clients.add(writer)
+        self._write(writer, encode_message({"simulated": self.rigs.simulated}))
+        for rig, event, value in self.rigs.snapshot():
+            self._write(writer, encode_message({"rig": rig, "event": event, "value": value}))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    log_error(f"Bad message from controller client: {line!r}")
+                    continue
+                if "command" in message:
+                    try:
+                        self.rigs.send(message["command"], message.get("rig"))
+                    except ValueError as e:
+                        log_error(f"Controller client command failed: {e}")
+                elif "request" in message:
+                    asyncio.create_task(self._answer(writer, message))
+        except (ConnectionError, EOFError):  # EOFError covers asyncio.IncompleteReadError
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    async def _answer(self, writer, message):
+        try:
+            reply = {"id": message.get("id"), "reply": await self.rigs.request(
+                message["request"], message.get("timeout"), message.get("rig"))}
+        except Exception as e:
+            reply = {"id": message.get("id"), "error": f"{type(e).__name__}: {e}"}
+        if writer in self.clients:
+            self._write(writer, encode_message(reply))
+
+
+class ControllerClient:
+    """Talks to a running controller daemon with the same calls the GUI uses on rigs.RigRegistry."""
+
+    def __init__(self, path=DEFAULT_SOCKET_PATH, retry_interval=2.0):
+        self.path = path
+        self.retry_interval = retry_interval
+        self.connected = {}  # rig -> Arduino connected
+        self.simulated = False  # The daemon runs simulated rigs (their data lives under rigs.SIMULATION_DIR)
+
+        self._listeners = []
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._requests = {}
+        self._next_id = 0
+        self._running = False
+        self._thread = None
+
+    @classmethod
+    def try_connect(cls, path=DEFAULT_SOCKET_PATH):
+        """Return a connected client, or None if no daemon is listening."""
+        client = cls(path)
+        return client if client._connect() else None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            return False
+        self._sock = sock
+        return True
+
+    # ---- listeners ----
+
+    @property
+    def ids(self):
+        """Rigs the daemon has reported so far."""
+        return list(self.connected)
+
+    def add_listener(self, callback):
+        """Call callback(rig, event, value) on the client thread for every controller event."""
+        self._listeners.append(callback)
+        return callback
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _emit(self, rig, event, value):
+        for callback in list(self._listeners):
+            try:
+                callback(rig, event, value)
+            except Exception as e:
+                log_error(f"Controller client listener failed on {event}: {e}")
+
+    # ---- lifecycle ----
+
+    def start_in_thread(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="controller-client", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._sock:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+
+    def _run(self):
+        while self._running:
+            if self._sock is None and not self._connect():
+                time.sleep(self.retry_interval)
+                continue
+            try:
+                for line in self._sock.makefile("rb"):
+                    self._handle_line(line)
+            except OSError:
+                pass
+            self._sock.close()
+            self._sock = None
+            self._fail_requests()
+            if self._running:
+                print("⚠ Lost connection to controller daemon, retrying...")
+                for rig in self.connected:
+                    self.connected[rig] = False
+                    self._emit(rig, "connection", False)
+                time.sleep(self.retry_interval)
+
+    def _handle_line(self, line):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return
+        if "event" in message:
+            rig = message.get("rig")
+            if message["event"] == "connection":
+                self.connected[rig] = message["value"]
+            self._emit(rig, message["event"], message["value"])
+            return
+        if "simulated" in message:
+            self.simulated = message["simulated"]
+            return
+        future = self._requests.pop(message.get("id"), None)
+        if future:
+            if "error" in message:
+                future.set_exception(RuntimeError(message["error"]))
+            else:
+                future.set_result(message["reply"])
+
+    def _fail_requests(self):
+        requests, self._requests = self._requests, {}
+        for future in requests.values():
+            future.set_exception(ConnectionError("Controller daemon went away"))
+
+    # ---- commands ----
+
+    def _write(self, message):
+        with self._send_lock:
+            if not self._sock:
+                return False
+            try:
+                self._sock.sendall(encode_message(message))
+                return True
+            except OSError:
+                return False
+
+    def send(self, command, rig=None):
+        """Fire-and-forget command to one rig (the daemon's first if None); safe to call from any thread."""
+        if self._write({"command": command.strip(), "rig": rig}):
+            print(f"📤 Sent command: {command.strip()}")
+
+    def request(self, command, timeout=None, rig=None):
+        """Send a command through the daemon; returns a Future for the reply frame."""
+        future = Future()
+        with self._send_lock:
+            self._next_id += 1
+            request_id = self._next_id
+            self._requests[request_id] = future
+        if not self._write({"request": command.strip(), "rig": rig, "id": request_id, "timeout": timeout}):
+            self._requests.pop(request_id, None)
+            future.set_exception(ConnectionError("Not attached to the controller daemon"))
+        return future
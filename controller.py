@@ -0,0 +1,583 @@
+import asyncio
+import threading
+import time
+
+import metrics
+from adaptive_poll import SENSOR_DEADBANDS, AdaptivePoller
+from alerts import AlertEngine
+from clock_sync import ClockSync
+from frames import DELTA_PREFIX, SUB_ALL, FrameError, decode_frame, frame_to_line
+from helpers import TelemetryState, log_error
+from history_store import HistoryStore
+from schedule_compiler import check_reply, compile_schedule, upload_steps
+from schedule_engine import ScheduleEngine
+from sensor_log import SensorLogWriter
+from serial_reactor import CommandRejected, SerialReactor
+from state_snapshot import StateSnapshot
+
+# -------------------- Controller Core --------------------
+#
+# One asyncio loop runs everything that is not painting: relay/sensor
+# polling (paced by adaptive_poll.AdaptivePoller), the connection watchdog,
+# clock ticks, the initial time sync, the latest-state cache and CSV logging
+# (batched by sensor_log.SensorLogWriter).
+# Nothing here needs a display, so the same controller runs headless in
+# hydro_daemon.py or embedded in the GUI.
+# The serial port itself stays with the SerialReactor (pyserial only offers
+# blocking I/O); its frames are moved onto the loop with
+# call_soon_threadsafe and its request futures are awaited via wrap_future.
+# Given a ConnectionManager, the controller finds the Arduino itself and
+# reopens the link whenever the port fails or stops answering PINGs, then
+# repeats the startup handshake (time, protocol options, schedule).
+#
+# With push_telemetry the sketch is asked to send only changes (DELTA lines,
+# see frames.apply_delta); they are rebuilt into full STATE frames here, so
+# listeners and the log see the same frames either way.
+#
+# Front ends register a listener and receive (event, value) pairs:
+#   "frame"      -> raw frame text from the Arduino, only when it changed
+#                   the state (identical readings are not re-sent)
+#   "connection" -> True/False whenever the link state changes
+#   "clock"      -> display string, once per minute
+#   "schedule"   -> {device code: {"on", "next", "description"}} from
+#                   schedule.txt, whenever an edge fires or the file changes
+#   "clock_sync" -> ClockSync.status() after every drift measurement
+#   "alert"      -> alerts.AlertEvent as a dict, when a rule in alerts.txt
+#                   raises or clears
+# Listeners run on the controller loop, so a GUI must hand them to its own
+# thread (see tk_bridge.TkBridge).
+#
+# The last known frames and manual overrides are kept in a StateSnapshot
+# (state_snapshot.py), saved a few seconds after they change. A restarted
+# controller paints those frames at once. Its startup sets the sketch's
+# clock with SYNC_TIME, which leaves running overrides alone. It then reads
+# the relays back and re-sends any override that has not expired but that
+# the sketch no longer holds (it was reset). Restarting the controller
+# never switches a relay by itself. The snapshot records which board it
+# came from (connection_manager.board_id); overrides saved for another
+# board, or by a version that did not record one, are dropped, not sent.
+#
+# Several controllers can share one loop (rigs.RigRegistry). Each caps the
+# frames it accepts from its reactor with a FrameBudget, so a rig flooding
+# the link costs the others bounded CPU. Replies still reach their requests:
+# the reactor matches them before subscribers see any frame. A shed DELTA
+# line leaves the merged state wrong, so the controller then reads relays
+# and sensors in full (GET_RELAYS, GET_SENSORS) instead of waiting for the
+# next heartbeat.
+
+
+OVERRIDE_SECONDS = 600  # The sketch's manual overrides expire after 10 minutes
+OVERRIDE_RELAYS = {"LT": "lights_top", "LB": "lights_bottom", "PT": "pump_top", "PB": "pump_bottom"}
+
+
+class FrameBudget:
+    """Token bucket: on average `rate` frames per second, in bursts of up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class HydroController:
+    def __init__(self, arduino, relay_interval=1.0, sensor_interval=60.0, ping_interval=3.0, binary_frames=False,
+                 log_writer=None, schedule=None, upload_schedule=True, poll_budget=150.0,
+                 push_telemetry=False, push_heartbeat=60, connection=None, max_frame_rate=20.0,
+                 state=None, save_interval=5.0, alerts=None):
+        self.reactor = SerialReactor(arduino) if arduino else None
+        self.connection = connection
+        self.log_writer = log_writer or SensorLogWriter(history=HistoryStore())
+        self.schedule = schedule or ScheduleEngine()
+        self.upload_schedule = upload_schedule  # Cleared if the sketch has no SCHED command
+        self.clock_sync = ClockSync(self)
+        self.binary_frames = binary_frames
+        self.push_telemetry = push_telemetry
+        self.push_heartbeat = push_heartbeat
+        self.telemetry = TelemetryState()
+        # relay_interval / sensor_interval are the fastest / slowest poll rates; see AdaptivePoller
+        self.poller = AdaptivePoller(relay_interval, sensor_interval, budget=poll_budget)
+        self.ping_interval = ping_interval
+        self.frame_budget = FrameBudget(max_frame_rate, 2 * max_frame_rate)
+        self.frames_shed = 0  # Frames dropped for exceeding the budget
+        self._refresh_pending = False  # A DELTA was shed; set on the reactor thread, cleared on the loop
+        self._refresh_task = None
+        self.connected = False
+        self.loop = None
+        self.latest = {}  # frame kind (STATE/RELAYS/SENSORS) -> newest frame
+        self.clock_text = ""
+        self.schedule_status = {}
+        self.overrides = {}  # device code -> True/False, as last sent to the sketch
+        self.override_until = 0.0  # Wall-clock expiry; the sketch has one timer for all overrides
+        self.board = None  # connection_manager.board_id of the connected board
+        self.override_board = None  # The board the overrides were sent to
+        self.state = state or StateSnapshot()
+        self.alerts = alerts or AlertEngine.from_config()
+        self.alerts.add_listener(lambda event: self._emit("alert", event._asdict()))
+        self.save_interval = save_interval
+
+        self._listeners = []
+        self._stopped = None
+        self._state_changed = None
+        self._poll_wakeup = None
+        self._link_lost = None
+        self._link_free = None  # Cleared while a schedule upload owns the link
+        self._ready = threading.Event()
+        self._thread = None
+        self._restore(self.state.load())
+
+    # ---- listeners ----
+
+    def add_listener(self, callback):
+        """Call callback(event, value) on the controller loop for every event."""
+        self._listeners.append(callback)
+        return callback
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def snapshot(self):
+        """Return the (event, value) pairs a newly attached front end needs to catch up."""
+        events = [("connection", self.connected)]
+        if self.clock_text:
+            events.append(("clock", self.clock_text))
+        if self.schedule_status:
+            events.append(("schedule", self.schedule_status))
+        if self.clock_sync.last_measured:
+            events.append(("clock_sync", self.clock_sync.status()))
+        events.extend(("frame", frame) for frame in self.latest.values())
+        events.extend(("alert", event._asdict()) for event in self.alerts.raised.values())
+        return events
+
+    def _emit(self, event, value):
+        for callback in list(self._listeners):
+            try:
+                callback(event, value)
+            except Exception as e:
+                log_error(f"Controller listener failed on {event}: {e}")
+
+    # ---- lifecycle ----
+
+    def start_in_thread(self):
+        """Run the controller loop on a daemon thread (for use next to a GUI)."""
+        self._thread = threading.Thread(target=asyncio.run, args=(self.run(),), name="controller", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+        return self
+
+    def stop(self):
+        """Stop the loop from any thread and wait for it to finish."""
+        if self.loop and self._stopped:
+            self.loop.call_soon_threadsafe(self._stopped.set)
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._poll_wakeup = asyncio.Event()
+        self._link_lost = asyncio.Event()
+        self._link_free = asyncio.Event()
+        self._link_free.set()
+        self._state_changed = asyncio.Event()
+        self.log_writer.start()
+        self._bind_metrics()
+        self.alerts.start(time.time())
+        for frame in self.latest.values():
+            self._emit("frame", frame)  # Last known readings, until the Arduino sends fresh ones
+        if self.reactor:
+            self._start_reactor()
+        tasks = [asyncio.create_task(coro) for coro in self._task_coroutines()]
+        self._ready.set()
+        try:
+            await self._stopped.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.reactor:
+                self.reactor.close()
+            self.log_writer.close()
+            self._save_state(self._state_to_save())
+
+    def _task_coroutines(self):
+        return [
+            self._connection_task() if self.connection else self._startup(),
+            self._clock_task(),
+            self._schedule_task(),
+            self._clock_sync_task(),
+            self._watchdog_task(),
+            self._poll_task(),
+            self._save_task(),
+            self._alert_task(),
+        ]
+
+    def _bind_metrics(self):
+        # Read at scrape time only; a missing reactor just leaves the gauge out
+        metrics.SERIAL_WRITE_QUEUE.bind(lambda: self.reactor.queued_count())
+        metrics.PENDING_REQUESTS.bind(lambda: self.reactor.pending_count())
+        metrics.LOG_BUFFER_ROWS.bind(self.log_writer.pending_rows)
+        metrics.LOG_ROWS_DROPPED.bind(lambda: self.log_writer.dropped)
+
+    # ---- serial access ----
+
+    def _start_reactor(self):
+        self.reactor.subscribe(self._frame_from_reactor)
+        # Reactor thread -> loop; only a ConnectionManager acts on it
+        self.reactor.on_disconnect(lambda: self.loop.call_soon_threadsafe(self._link_lost.set))
+        self.reactor.start()
+
+    def _set_connected(self, connected):
+        if connected != self.connected:
+            self.connected = connected
+            self._emit("connection", connected)
+
+    def _frame_from_reactor(self, frame):
+        # Reactor reader thread -> controller loop, within this rig's frame budget
+        if not self.frame_budget.take(time.monotonic()):
+            self.frames_shed += 1
+            if self.frames_shed % 1000 == 1:
+                log_error(f"Arduino is sending frames faster than {self.frame_budget.rate:g}/s; dropping some")
+            if frame.startswith(DELTA_PREFIX) and not self._refresh_pending:
+                self._refresh_pending = True
+                self.loop.call_soon_threadsafe(self._start_refresh)
+            return
+        self.loop.call_soon_threadsafe(self._handle_frame, frame)
+
+    def _start_refresh(self):
+        self._refresh_task = asyncio.ensure_future(self._refresh_state())
+
+    async def _refresh_state(self):
+        """Read the full state again after a shed DELTA left the merged one behind."""
+        try:
+            await asyncio.sleep(1.0)  # Let the burst pass, so one refresh covers every DELTA shed in it
+            await self._link_free.wait()
+            for command in ("GET_RELAYS", "GET_SENSORS"):
+                # Handled here as well: under the same load the reply's own frame may be shed too.
+                # A reply that does get through is then a duplicate, which the telemetry state ignores.
+                self._handle_frame(await self.request(command))
+        except Exception as e:
+            log_error(f"Could not re-read the state after dropping a DELTA: {e}")
+        finally:
+            self._refresh_pending = False
+
+    def _handle_frame(self, frame):
+        started = time.perf_counter() if metrics.enabled else 0.0
+        try:
+            if frame.startswith(DELTA_PREFIX):
+                decoded = self.telemetry.apply_delta(frame)
+                if decoded is None:
+                    return  # No full state to apply it to yet; the next heartbeat STATE brings one
+                frame = frame_to_line(decoded)
+            else:
+                decoded = decode_frame(frame)
+        except FrameError as e:
+            if metrics.enabled:
+                metrics.FRAMES_REJECTED.inc()
+            log_error(f"{e}: {frame}")
+            return
+        if metrics.enabled and decoded:
+            metrics.PARSE_SECONDS.observe(time.perf_counter() - started)
+            metrics.FRAMES.inc(label=decoded.kind)
+        if decoded:
+            self.latest[decoded.kind] = frame
+            if self.poller.observe(decoded, time.monotonic()):
+                self._poll_wakeup.set()
+            if decoded.kind == "STATE":
+                self.log_writer.append(decoded)
+            self.alerts.observe(decoded, time.time())  # Also for unchanged frames: they keep stale rules quiet
+            if not self.telemetry.update(decoded):
+                return  # Same readings as before: nothing for front ends to repaint
+            self._state_changed.set()
+        self._emit("frame", frame)
+
+    def send(self, command):
+        """Fire-and-forget command; safe to call from any thread."""
+        if self.reactor:
+            self.reactor.send(command)
+            print(f"📤 Sent command: {command.strip()}")
+            if self.loop:
+                self.loop.call_soon_threadsafe(self._track_override, command.strip())
+
+    def _track_override(self, command):
+        """Mirror the sketch's override state for commands sent to it."""
+        code, _, value = command.partition(":")
+        if command == "RESET_SCHEDULE":
+            self.overrides.clear()
+        elif code in OVERRIDE_RELAYS and value in ("ON", "OFF"):
+            if time.time() >= self.override_until:
+                self.overrides.clear()  # Earlier overrides have already expired on the sketch
+            self.overrides[code] = value == "ON"
+            self.override_until = time.time() + OVERRIDE_SECONDS
+            self.override_board = self.board
+        else:
+            return
+        self._state_changed.set()
+
+    async def request(self, command, timeout=None):
+        """Send a command and await its reply frame."""
+        if not self.reactor:
+            raise ConnectionError("Arduino is not connected")
+        return await asyncio.wrap_future(self.reactor.request(command, timeout))
+
+    # ---- tasks ----
+
+    async def _connection_task(self):
+        """Keep a link open: (re)discover the Arduino whenever it is missing or fails."""
+        if not self.reactor:
+            print("🔍 Looking for the Arduino...")
+            self._link_lost.set()
+        else:
+            await self._startup()
+        while True:
+            await self._link_lost.wait()
+            self._set_connected(False)
+            started = time.monotonic()
+            if self.reactor:
+                print("🔌 Arduino link lost; reconnecting...")
+                await self.loop.run_in_executor(None, self.reactor.close)
+                self.reactor = None
+            arduino = await self.connection.reconnect()
+            self._link_lost.clear()
+            self.reactor = SerialReactor(arduino)
+            self._start_reactor()
+            self._set_connected(True)
+            print(f"🔌 Arduino connected after {time.monotonic() - started:.1f} s")
+            await self._startup()
+
+    async def _startup(self):
+        if not self.reactor:
+            return
+        from connection_manager import board_id
+        self.board = board_id(self.reactor.arduino)
+        try:
+            # SYNC_TIME keeps any manual override running; SET_TIME would cancel it
+            await self.clock_sync.set_time("SYNC_TIME")
+        except CommandRejected:
+            await self._set_time_fallback()
+        except Exception as e:
+            log_error(f"Initial time sync failed: {e}")
+        if self.binary_frames:
+            await self._negotiate_binary()
+        if self.push_telemetry:
+            await self._subscribe()
+        await self._upload_schedule()
+        await self._restore_overrides()
+
+    async def _set_time_fallback(self):
+        """Sketches without SYNC_TIME only have SET_TIME, which also resumes the schedule."""
+        try:
+            await self.clock_sync.set_time()
+        except Exception as e:
+            log_error(f"Initial time sync failed: {e}")
+
+    async def _restore_overrides(self):
+        """Re-send unexpired overrides the sketch has lost, e.g. because it was reset."""
+        if not self.overrides:
+            return
+        if time.time() >= self.override_until:
+            self.overrides.clear()
+            self._state_changed.set()
+            return
+        if self.override_board != self.board:
+            # Never switch relays on one board because of overrides sent to another
+            print(f"⚠️ Dropping manual overrides sent to board {self.override_board or 'unknown'}, "
+                  f"connected to {self.board}")
+            self.overrides.clear()
+            self._state_changed.set()
+            return
+        try:
+            relays = decode_frame(await self.request("GET_RELAYS"))
+        except Exception as e:
+            log_error(f"Could not read relays to restore overrides: {e}")
+            return
+        lost = [code for code, on in self.overrides.items() if relays.relay_on(OVERRIDE_RELAYS[code]) != on]
+        if lost:
+            # The sketch restarts its 10 minute timer, so these run a little past their original expiry
+            print(f"↩ Restoring manual overrides: {', '.join(lost)}")
+            for code in lost:
+                self.send(f"{code}:{'ON' if self.overrides[code] else 'OFF'}")
+
+    async def _negotiate_binary(self):
+        """Ask the sketch for binary data frames; older sketches reject PROTO and stay on text."""
+        try:
+            await self.request("PROTO:BIN")
+            print("📦 Arduino is sending binary frames.")
+        except CommandRejected:
+            print("ℹ Arduino sketch has no binary protocol; staying on text frames.")
+        except Exception as e:
+            log_error(f"Binary protocol negotiation failed: {e}")
+
+    async def _subscribe(self):
+        """Ask the sketch to push changes instead of being polled; older sketches stay polled."""
+        command = (
+            f"SUB:{SUB_ALL},{round(SENSOR_DEADBANDS['air_temp'] * 10)},{round(SENSOR_DEADBANDS['humidity'] * 10)},"
+            f"{round(SENSOR_DEADBANDS['water_temp1'] * 100)},{self.push_heartbeat}"
+        )
+        try:
+            await self.request(command)
+            self.poller.push_mode(self.push_heartbeat)
+            print("📡 Arduino is pushing telemetry changes.")
+        except CommandRejected:
+            print("ℹ Arduino sketch has no push telemetry; polling instead.")
+        except Exception as e:
+            log_error(f"Telemetry subscription failed: {e}")
+
+    async def _upload_schedule(self, retries=3):
+        """Compile schedule.txt and hand it to the sketch, which then switches the relays on its own."""
+        if not self.reactor or not self.upload_schedule or not self.schedule.timelines:
+            return
+        try:
+            table = compile_schedule(self.schedule)
+        except ValueError as e:
+            log_error(f"Schedule not uploaded: {e}")
+            return
+        steps = upload_steps(table)
+        # Polls and PINGs wait, so each part has the sketch's receive buffer to itself
+        self._link_free.clear()
+        try:
+            for attempt in range(1, retries + 1):
+                try:
+                    for command, expected in steps:
+                        check_reply(await self.request(command), expected)
+                    # SCHED_OK carries the CRC of what the sketch stored, so every part arrived intact
+                    print(f"📅 Schedule uploaded to the Arduino ({len(table)} bytes in {len(steps) - 2} parts).")
+                    return
+                except CommandRejected:
+                    print("ℹ Arduino sketch has no schedule upload; it keeps its built-in schedule.")
+                    self.upload_schedule = False
+                    return
+                except Exception as e:
+                    log_error(f"Schedule upload attempt {attempt} failed: {e}")
+            print("⚠ Could not upload the schedule; the Arduino keeps its previous one.")
+        finally:
+            self._link_free.set()
+
+    async def _alert_task(self):
+        # Timers only (debounce, stale, rate windows); frames evaluate their rules as they arrive
+        while True:
+            now = time.time()
+            self.alerts.tick(now)
+            deadline = self.alerts.next_deadline()
+            await asyncio.sleep(1.0 if deadline is None else min(max(deadline - now, 0.0), 1.0))
+
+    async def _save_task(self):
+        # At most one write per save_interval, however fast readings change
+        while True:
+            await self._state_changed.wait()
+            self._state_changed.clear()
+            await self.loop.run_in_executor(None, self._save_state, self._state_to_save())
+            await asyncio.sleep(self.save_interval)
+
+    def _state_to_save(self):
+        frame = self.telemetry.frame
+        return {
+            "state": frame_to_line(frame) if frame else None,  # Every frame kind merged into one STATE
+            "overrides": dict(self.overrides),
+            "override_until": self.override_until,
+            "board": self.override_board,
+        }
+
+    def _save_state(self, state):
+        try:
+            self.state.save(state)
+        except OSError as e:
+            log_error(f"Could not save state snapshot: {e}")
+
+    def _restore(self, state):
+        """Take the last known state and overrides from a saved snapshot."""
+        try:
+            decoded = decode_frame(state.get("state") or "")
+        except FrameError:
+            decoded = None
+        if decoded is not None and decoded.kind == "STATE":
+            self.latest["STATE"] = state["state"]
+            self.telemetry.update(decoded)
+        if state.get("override_until", 0) > time.time():
+            self.overrides = {
+                code: bool(on) for code, on in state.get("overrides", {}).items() if code in OVERRIDE_RELAYS
+            }
+            self.override_until = state["override_until"]
+            self.override_board = state.get("board")
+
+    async def _clock_task(self):
+        # The clock only shows minutes, so wake on minute boundaries
+        while True:
+            self.clock_text = time.strftime("%b %d %H:%M")
+            self._emit("clock", self.clock_text)
+            await asyncio.sleep(60 - time.time() % 60)
+
+    async def _clock_sync_task(self):
+        if self.reactor or self.connection:
+            await self.clock_sync.run(lambda status: self._emit("clock_sync", status))
+
+    async def _schedule_task(self):
+        # Sleep until the next schedule edge, waking early only to notice file edits
+        self._emit_schedule()
+        while True:
+            deadline = self.schedule.next_deadline()
+            delay = self.schedule.reload_interval
+            if deadline is not None:
+                delay = min(max(deadline - time.time(), 0), delay)
+            await asyncio.sleep(delay)
+            if self.schedule.reload_if_changed():
+                self._emit_schedule()
+                await self._upload_schedule()
+            elif self.schedule.pop_due():
+                self._emit_schedule()
+
+    def _emit_schedule(self):
+        self.schedule_status = self.schedule.status()
+        self._emit("schedule", self.schedule_status)
+
+    async def _watchdog_task(self, max_failures=3):
+        self._emit("connection", self.connected)
+        failures = 0
+        while True:
+            await self._link_free.wait()  # A schedule upload's acks show the link is alive
+            try:
+                await self.request("PING")
+                failures = 0
+                self._set_connected(True)
+            except Exception:
+                failures += 1
+                self._set_connected(False)
+                if self.connection and self.reactor and failures >= max_failures:
+                    # The port is open but nothing answers (e.g. a wedged USB adapter): reopen it
+                    self._link_lost.set()
+                    failures = 0
+            await asyncio.sleep(self.ping_interval)
+
+    async def _poll_task(self):
+        if not self.reactor and not self.connection:
+            return
+        while True:
+            now = time.monotonic()
+            channel, due = self.poller.next_poll(now)
+            if due > now:
+                # Sleep until the channel goes stale, or until a frame makes polling more urgent
+                self._poll_wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._poll_wakeup.wait(), due - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if not self._link_free.is_set():
+                await self._link_free.wait()
+                continue  # Polls wait out a schedule upload, then see what is due
+            self.poller.sent(channel, now)
+            if self.reactor and self.reactor.is_open:
+                try:
+                    # The reply also reaches listeners as a "frame" event
+                    await self.request(channel.command)
+                except Exception as e:
+                    print(f"Failed to request {channel.command}: {e}")
@@ -0,0 +1,314 @@
+import binascii
+import struct
+
+# -------------------- Frame Decoder --------------------
+#
+# One decoder for every data line the sketch sends:
+#
+#   STATE:<7 relays>,<float_top>,<float_bottom>,<air_temp>,<humidity>,
+#         <water_temp1>,<water_temp2>,<ph_top>,<ec_top>,<ph_bottom>,<ec_bottom>
+#   RELAYS:<7 relays>
+#   SENSORS:<air_temp>,<humidity>,<water_temp1>,<water_temp2>,<float_top>,<float_bottom>
+#
+# Each line becomes a fixed-layout SensorFrame (__slots__, no per-instance
+# dict) holding typed values, a relay bitmask and validity flags. A line is
+# split once and each number converted once; nothing downstream re-parses
+# or re-validates text. See benchmarks/bench_frames.py for the per-frame cost.
+
+RELAY_NAMES = (
+    "lights_top", "lights_bottom",
+    "pump_top", "pump_bottom",
+    "sensor_pump_top", "sensor_pump_bottom",
+    "drain",
+)
+RELAY_BITS = {name: 1 << index for index, name in enumerate(RELAY_NAMES)}
+RELAY_COUNT = len(RELAY_NAMES)
+
+# Validity flags: which groups of fields were present and not an error value
+HAS_RELAYS = 0x01
+HAS_FLOATS = 0x02
+AIR_OK = 0x04        # DHT read succeeded (sketch sends -1 on failure)
+WATER1_OK = 0x08     # DS18B20 #1 present (sketch sends -1 on failure)
+WATER2_OK = 0x10     # DS18B20 #2 present
+HAS_PH_EC = 0x20
+
+STATE_FIELDS = 17
+SENSORS_FIELDS = 6
+SENSOR_ERROR = -1.0
+
+# Relay part of the line is "d,d,d,d,d,d,d": 13 characters with commas at odd offsets
+_RELAY_TEXT_LENGTH = 2 * RELAY_COUNT - 1
+_RELAY_COMMAS = "," * (RELAY_COUNT - 1)
+
+
+class FrameError(ValueError):
+    pass
+
+
+class SensorFrame:
+    __slots__ = (
+        "kind", "relays", "float_top", "float_bottom",
+        "air_temp", "humidity", "water_temp1", "water_temp2",
+        "ph_top", "ec_top", "ph_bottom", "ec_bottom",
+        "valid",
+    )
+
+    def __init__(self, kind, relays=0, float_top=False, float_bottom=False,
+                 air_temp=SENSOR_ERROR, humidity=SENSOR_ERROR,
+                 water_temp1=SENSOR_ERROR, water_temp2=SENSOR_ERROR,
+                 ph_top=SENSOR_ERROR, ec_top=SENSOR_ERROR,
+                 ph_bottom=SENSOR_ERROR, ec_bottom=SENSOR_ERROR, valid=0):
+        self.kind = kind
+        self.relays = relays
+        self.float_top = float_top
+        self.float_bottom = float_bottom
+        self.air_temp = air_temp
+        self.humidity = humidity
+        self.water_temp1 = water_temp1
+        self.water_temp2 = water_temp2
+        self.ph_top = ph_top
+        self.ec_top = ec_top
+        self.ph_bottom = ph_bottom
+        self.ec_bottom = ec_bottom
+        self.valid = valid
+
+    def relay_on(self, name):
+        return bool(self.relays & RELAY_BITS[name])
+
+    def has(self, flags):
+        return self.valid & flags == flags
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"SensorFrame({values})"
+
+
+def _relay_mask(text):
+    """Turn '1,0,1,0,0,0,0' into a bitmask (bit 0 = first relay)."""
+    if len(text) == _RELAY_TEXT_LENGTH and text[1::2] == _RELAY_COMMAS:
+        digits = text[::2]
+        if digits.strip("01") == "":
+            # Reverse so the first relay lands in bit 0
+            return int(digits[::-1], 2)
+    raise FrameError(f"Bad relay field: {text!r}")
+
+
+def _ok(value):
+    # value == value is False for NaN, which Serial.print() sends as "nan" for a failed float read
+    return value != SENSOR_ERROR and value == value
+
+
+def _sensor_flags(frame):
+    flags = HAS_FLOATS
+    if _ok(frame.air_temp) and _ok(frame.humidity):
+        flags |= AIR_OK
+    if _ok(frame.water_temp1):
+        flags |= WATER1_OK
+    if _ok(frame.water_temp2):
+        flags |= WATER2_OK
+    return flags
+
+
+def decode_frame(line):
+    """Decode one data line into a SensorFrame.
+
+    Returns None for lines that are not data frames (PING_OK, status text);
+    raises FrameError for data frames that are truncated or corrupted.
+    """
+    if line.startswith("STATE:"):
+        parts = line[6:].split(",")
+        if len(parts) != STATE_FIELDS:
+            raise FrameError(f"Expected {STATE_FIELDS} values in STATE message, got {len(parts)}")
+        try:
+            air_temp, humidity, water_temp1, water_temp2, ph_top, ec_top, ph_bottom, ec_bottom = map(float, parts[9:])
+        except ValueError:
+            raise FrameError("Invalid numeric data in STATE message") from None
+        frame = SensorFrame(
+            "STATE", _relay_mask(line[6:6 + _RELAY_TEXT_LENGTH]), parts[7] == "1", parts[8] == "1",
+            air_temp, humidity, water_temp1, water_temp2, ph_top, ec_top, ph_bottom, ec_bottom,
+        )
+        frame.valid = HAS_RELAYS | HAS_PH_EC | _sensor_flags(frame)
+        return frame
+
+    if line.startswith("RELAYS:"):
+        return SensorFrame("RELAYS", _relay_mask(line[7:].strip()), valid=HAS_RELAYS)
+
+    if line.startswith("SENSORS:"):
+        parts = line[8:].split(",")
+        if len(parts) != SENSORS_FIELDS:
+            raise FrameError(f"Expected {SENSORS_FIELDS} values in SENSORS message, got {len(parts)}")
+        try:
+            air_temp, humidity, water_temp1, water_temp2 = map(float, parts[:4])
+        except ValueError:
+            raise FrameError("Invalid numeric data in SENSORS message") from None
+        frame = SensorFrame(
+            "SENSORS", 0, parts[4].strip() == "1", parts[5].strip() == "1",
+            air_temp, humidity, water_temp1, water_temp2,
+        )
+        frame.valid = _sensor_flags(frame)
+        return frame
+
+    return None
+
+
+def format_value(value):
+    """Display text for a reading: '21' rather than '21.0', '19.5' rather than '19.50'."""
+    return f"{value:g}"
+
+
+def frame_to_line(frame):
+    """Render a SensorFrame back into the sketch's text line format."""
+    relays = ",".join("1" if frame.relays >> bit & 1 else "0" for bit in range(RELAY_COUNT))
+    if frame.kind == "RELAYS":
+        return f"RELAYS:{relays}"
+    floats = f"{int(frame.float_top)},{int(frame.float_bottom)}"
+    air = f"{format_value(frame.air_temp)},{format_value(frame.humidity)}"
+    water = f"{format_value(frame.water_temp1)},{format_value(frame.water_temp2)}"
+    if frame.kind == "SENSORS":
+        return f"SENSORS:{air},{water},{floats}"
+    ph_ec = ",".join(format_value(v) for v in (frame.ph_top, frame.ec_top, frame.ph_bottom, frame.ec_bottom))
+    return f"STATE:{relays},{floats},{air},{water},{ph_ec}"
+
+
+# -------------------- Push Telemetry --------------------
+#
+# After "SUB:<mask>,<air x10>,<humidity x10>,<water x100>,<heartbeat s>" the
+# sketch stops its periodic STATE frames and only reports what changed:
+#
+#   DELTA:R=5,T=23,W1=19.75
+#
+# with R = relay bitmask, F = float bits (top = 1, bottom = 2), T/H = air
+# temperature/humidity, W1/W2 = water temperatures. A full STATE frame still
+# goes out every heartbeat, which also repairs the host's copy if a delta
+# was lost. apply_delta() rebuilds the full state from the last STATE.
+
+DELTA_PREFIX = "DELTA:"
+
+SUB_RELAYS = 0x01
+SUB_FLOATS = 0x02
+SUB_AIR = 0x04
+SUB_WATER = 0x08
+SUB_ALL = SUB_RELAYS | SUB_FLOATS | SUB_AIR | SUB_WATER
+
+_DELTA_FIELDS = {"T": "air_temp", "H": "humidity", "W1": "water_temp1", "W2": "water_temp2"}
+
+
+def apply_delta(base, line):
+    """Return a copy of STATE frame `base` with the fields of a DELTA line applied."""
+    frame = SensorFrame(*(getattr(base, name) for name in SensorFrame.__slots__))
+    body = line[len(DELTA_PREFIX):].strip()
+    for field in body.split(",") if body else ():
+        key, _, value = field.partition("=")
+        if key not in ("R", "F") and key not in _DELTA_FIELDS:
+            raise FrameError(f"Unknown field {key!r} in DELTA message")
+        try:
+            if key == "R":
+                frame.relays = int(value)
+            elif key == "F":
+                bits = int(value)
+                frame.float_top, frame.float_bottom = bool(bits & 1), bool(bits & 2)
+            else:
+                setattr(frame, _DELTA_FIELDS[key], float(value))
+        except ValueError:
+            raise FrameError(f"Invalid value in DELTA message: {field!r}") from None
+    frame.valid = HAS_RELAYS | HAS_PH_EC | _sensor_flags(frame)
+    return frame
+
+
+# -------------------- Binary Frames --------------------
+#
+# Optional compact encoding negotiated with "PROTO:BIN" (see the sketch's
+# sendBinaryFrame). Text replies such as PING_OK stay text; only the data
+# frames switch to:
+#
+#   0xA5 | length | type | payload (length bytes) | CRC-16 (little-endian)
+#
+# The CRC is CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) over type and
+# payload. 0xA5 never appears in the sketch's ASCII output, so text lines
+# and binary frames can share the stream. Readings are fixed-point:
+# air temperature and humidity x10, water temperatures x100, pH/EC raw.
+# A STATE frame is 23 bytes on the wire instead of ~60-100 characters.
+
+BINARY_SYNC = 0xA5
+BINARY_HEADER = 3     # sync, length, type
+BINARY_OVERHEAD = 5   # header + CRC
+
+BINARY_STATE = 0x01
+BINARY_RELAYS = 0x02
+BINARY_SENSORS = 0x03
+
+_STATE_STRUCT = struct.Struct("<BBhhhhhhhh")
+_RELAYS_STRUCT = struct.Struct("<B")
+_SENSORS_STRUCT = struct.Struct("<Bhhhh")
+
+# Payload length of each frame type; a header announcing anything else is not a frame
+BINARY_PAYLOAD_SIZES = {
+    BINARY_STATE: _STATE_STRUCT.size,
+    BINARY_RELAYS: _RELAYS_STRUCT.size,
+    BINARY_SENSORS: _SENSORS_STRUCT.size,
+}
+MAX_BINARY_PAYLOAD = max(BINARY_PAYLOAD_SIZES.values())
+
+
+def crc16(data):
+    """CRC-16/CCITT-FALSE, matching crc16() in the sketch."""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def encode_binary(frame):
+    """Encode a SensorFrame as a binary frame (the sketch does the same in C)."""
+    floats = int(frame.float_top) | int(frame.float_bottom) << 1
+    air = (round(frame.air_temp * 10), round(frame.humidity * 10))
+    water = (round(frame.water_temp1 * 100), round(frame.water_temp2 * 100))
+    if frame.kind == "STATE":
+        frame_type = BINARY_STATE
+        payload = _STATE_STRUCT.pack(
+            frame.relays, floats, *air, *water,
+            int(frame.ph_top), int(frame.ec_top), int(frame.ph_bottom), int(frame.ec_bottom),
+        )
+    elif frame.kind == "RELAYS":
+        frame_type = BINARY_RELAYS
+        payload = _RELAYS_STRUCT.pack(frame.relays)
+    else:
+        frame_type = BINARY_SENSORS
+        payload = _SENSORS_STRUCT.pack(floats, *air, *water)
+    body = bytes((frame_type,)) + payload
+    return bytes((BINARY_SYNC, len(payload))) + body + struct.pack("<H", crc16(body))
+
+
+def decode_binary(data):
+    """Decode one complete binary frame (sync byte through CRC) into a SensorFrame."""
+    length = data[1]
+    if len(data) != BINARY_OVERHEAD + length:
+        raise FrameError(f"Binary frame length mismatch: {len(data)} bytes for payload of {length}")
+    body = data[2:2 + 1 + length]
+    (expected,) = struct.unpack_from("<H", data, BINARY_HEADER + length)
+    if crc16(body) != expected:
+        raise FrameError("Binary frame failed CRC check")
+
+    frame_type = body[0]
+    try:
+        if frame_type == BINARY_STATE:
+            relays, floats, air_temp, humidity, water1, water2, ph_top, ec_top, ph_bottom, ec_bottom = \
+                _STATE_STRUCT.unpack_from(body, 1)
+            frame = SensorFrame(
+                "STATE", relays, bool(floats & 1), bool(floats & 2),
+                air_temp / 10, humidity / 10, water1 / 100, water2 / 100,
+                float(ph_top), float(ec_top), float(ph_bottom), float(ec_bottom),
+            )
+            frame.valid = HAS_RELAYS | HAS_PH_EC | _sensor_flags(frame)
+            return frame
+        if frame_type == BINARY_RELAYS:
+            (relays,) = _RELAYS_STRUCT.unpack_from(body, 1)
+            return SensorFrame("RELAYS", relays, valid=HAS_RELAYS)
+        if frame_type == BINARY_SENSORS:
+            floats, air_temp, humidity, water1, water2 = _SENSORS_STRUCT.unpack_from(body, 1)
+            frame = SensorFrame(
+                "SENSORS", 0, bool(floats & 1), bool(floats & 2),
+                air_temp / 10, humidity / 10, water1 / 100, water2 / 100,
+            )
+            frame.valid = _sensor_flags(frame)
+            return frame
+    except struct.error:
+        raise FrameError(f"Binary frame type {frame_type:#x} has the wrong payload size") from None
+    raise FrameError(f"Unknown binary frame type {frame_type:#x}")
@@ -1,69 +1,40 @@
 import os
-import tkinter as tk
-import threading
 import time
-import serial
 from datetime import datetime
 
+from frames import (
+    AIR_OK, HAS_FLOATS, HAS_PH_EC, HAS_RELAYS, SensorFrame, FrameError, apply_delta, decode_frame, format_value,
+)
+
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 ERROR_LOG_FILE = os.path.join(LOG_DIR, "error_log.txt")
 
-SENSOR_LOG_FILE = os.path.join(LOG_DIR, f"sensor_log_{datetime.now().strftime('%Y-%m-%d')}.csv")
-
-
-# Initialize sensor log file if needed
-def init_sensor_log():
-    if not os.path.exists(SENSOR_LOG_FILE) or os.path.getsize(SENSOR_LOG_FILE) == 0:
-        with open(SENSOR_LOG_FILE, "w") as log:
-            log.write("timestamp,dht_temp,dht_humidity,water_temp1,water_temp2,ph_top,ec_top,ph_bottom,ec_bottom,float_top,float_bottom\n")
-
-init_sensor_log()
-
 def log_error(message):
     with open(ERROR_LOG_FILE, "a") as f:
         f.write(f"[{datetime.now()}] {message}\n")
 
 # -------------------- Arduino Communication --------------------
 
-def check_arduino_connection(arduino):
-    
-    """Check if the Arduino is still responding."""
-    if not arduino:
+def check_arduino_connection(arduino, timeout=1.0):
+    """Check if the Arduino is still responding to PING."""
+    if not arduino or not arduino.is_open:
         return False
     try:
-        arduino.write(b"PING\n")
-        time.sleep(0.1)
-        if arduino.in_waiting > 0:
-            response = arduino.readline().decode().strip()
-            return response == "PING_OK"
+        arduino.request("PING", timeout=timeout).result()
+        return True
     except Exception:
         return False
-    return False
 
 
 def connect_to_arduino(port=None, baudrate=9600):
-    if port:
-        try:
-            arduino = serial.Serial(port, baudrate, timeout=2)
-            time.sleep(2)
-            print(f"✅ Connected to Arduino on {port}")
-            return arduino
-        except Exception as e:
-            print(f"⚠ Failed to connect to Arduino on {port}: {e}")
-            return None
-    else:
-        POSSIBLE_PORTS = ["/dev/ttyACM0", "/dev/ttyACM1", "/dev/ttyUSB0", "/dev/ttyUSB1"]
-        for p in POSSIBLE_PORTS:
-            try:
-                arduino = serial.Serial(p, baudrate, timeout=2)
-                time.sleep(2)
-                print(f"✅ Connected to Arduino on {p}")
-                return arduino
-            except Exception:
-                continue
-        print("⚠ No Arduino found.")
-        return None
+    """Open the Arduino on port, or on whichever candidate port answers a PING first."""
+    # Imported here: connection_manager itself imports this module
+    from connection_manager import discover
+    arduino = discover(port, baudrate)
+    if arduino is None:
+        print(f"⚠ No Arduino found{f' on {port}' if port else ''}.")
+    return arduino
 
 def send_command_to_arduino(arduino, command):
     if arduino:
@@ -75,40 +46,89 @@ def send_command_to_arduino(arduino, command):
 
 
 def set_time_on_arduino(arduino):
+    """Send the current time and return a Future for the SET_TIME OK reply."""
     if arduino:
-        try:
-            current_time = datetime.now().strftime("%H:%M:%S")
-            send_command_to_arduino(arduino, f"SET_TIME:{current_time}\n")
-        except Exception as e:
-            print(f"⚠ Error sending time to Arduino: {e}")
-
-
-# def reset_to_arduino_schedule(arduino):
-#     if not arduino:
-#         print("⚠ Arduino is not connected. Cannot reset schedule.")
-#         return
-#     print("🔄 Resetting to Arduino schedule...")
-#     send_command_to_arduino(arduino, "RESET_SCHEDULE\n")
-#     time.sleep(1)
-#     send_command_to_arduino(arduino, "GET_STATE\n")
-
-# def start_relay_state_listener(gui):
-#     def listen_for_state():
-#         while True:
-#             try:
-#                 if gui.arduino and gui.arduino.in_waiting > 0:
-#                     response = gui.arduino.readline().decode().strip()
-#                     if response.startswith("STATE:"):
-#                         gui.update_relay_states(response)
-#             except Exception as e:
-#                 print(f"⚠ Error reading state update: {e}")
-#                 gui.arduino = None  # Mark as disconnected
-#                 break
-#     threading.Thread(target=listen_for_state, daemon=True).start()
+        current_time = datetime.now().strftime("%H:%M:%S")
+        print(f"📤 Sent command: SET_TIME:{current_time}")
+        return arduino.request(f"SET_TIME:{current_time}")
+
+
+def request_status(arduino):
+    """Pipeline GET_RELAYS and GET_SENSORS; returns (relays_future, sensors_future).
+
+    Both requests are on the wire before either reply arrives, so a full
+    refresh costs one round trip.
+    """
+    return arduino.request("GET_RELAYS"), arduino.request("GET_SENSORS")
+
+
+def reset_to_arduino_schedule(arduino):
+    """Hand control back to the Arduino's own schedule."""
+    if not arduino:
+        print("⚠ Arduino is not connected. Cannot reset schedule.")
+        return None
+    print("🔄 Resetting to Arduino schedule...")
+    # The sketch follows the reply with a fresh STATE frame
+    return arduino.request("RESET_SCHEDULE")
+
+
+# -------------------- Telemetry State --------------------
+
+_SENSOR_FIELDS = ("float_top", "float_bottom", "air_temp", "humidity", "water_temp1", "water_temp2")
+
+
+class TelemetryState:
+    """The full relay/sensor state, rebuilt from every frame kind and from push-mode DELTA lines.
+
+    update() reports whether a frame changed anything, so callers can skip
+    repainting and re-broadcasting identical readings.
+    """
+
+    def __init__(self):
+        self.frame = None  # Newest full state as a STATE SensorFrame
+
+    def update(self, decoded):
+        """Merge a decoded frame; returns True if the full state changed."""
+        if self.frame is None:
+            if decoded.kind != "STATE":
+                return True  # Nothing to merge into yet; pass it through
+            self.frame = decoded
+            return True
+        before = tuple(getattr(self.frame, name) for name in SensorFrame.__slots__[1:])
+        if decoded.kind == "STATE":
+            self.frame = decoded
+        else:
+            merged = SensorFrame(*(getattr(self.frame, name) for name in SensorFrame.__slots__))
+            if decoded.valid & HAS_RELAYS:
+                merged.relays = decoded.relays
+            if decoded.valid & HAS_FLOATS:
+                for name in _SENSOR_FIELDS:
+                    setattr(merged, name, getattr(decoded, name))
+                merged.valid = (merged.valid & (HAS_RELAYS | HAS_PH_EC)) | decoded.valid
+            self.frame = merged
+        return before != tuple(getattr(self.frame, name) for name in SensorFrame.__slots__[1:])
+
+    def apply_delta(self, line):
+        """Rebuild the full STATE from a DELTA line; None until a STATE frame has been seen."""
+        if self.frame is None:
+            return None
+        return apply_delta(self.frame, line)
+
 
 # -------------------- GUI Helpers --------------------
 
+INDICATOR_TAG = "dot"
+
+
+def create_indicator(canvas, color="red"):
+    """Draw the status dot once; later updates recolour it in place."""
+    canvas.create_oval(2, 2, 18, 18, fill=color, tags=INDICATOR_TAG)
+
+
 def create_switch(parent, gui, label_text, row, state_key, device_code):
+    # Imported here so the headless controller never has to load Tk
+    import tkinter as tk
+
     label = tk.Label(parent, text=label_text, font=("Helvetica", 16))
     button = tk.Button(
         parent,
@@ -120,152 +140,107 @@ def create_switch(parent, gui, label_text, row, state_key, device_code):
         command=lambda: gui.toggle_switch(state_key),
     )
     light = tk.Canvas(parent, width=20, height=20, highlightthickness=0)
-    # Place the widgets: light left, label center, button right
-    light.grid(row=row, column=0, padx=5, pady=5)
-    label.grid(row=row, column=1, padx=5, pady=5, sticky="w")
-    button.grid(row=row, column=2, padx=5, pady=5)
-    light.create_oval(2, 2, 18, 18, fill="red")
+    description = tk.Label(parent, text="", font=("Helvetica", 10), fg="gray", anchor="w")
+    # Place the widgets: light left, label center, button right, schedule note under the label
+    light.grid(row=2 * row, column=0, padx=5, pady=(5, 0))
+    label.grid(row=2 * row, column=1, padx=5, pady=(5, 0), sticky="w")
+    button.grid(row=2 * row, column=2, padx=5, pady=(5, 0))
+    description.grid(row=2 * row + 1, column=1, columnspan=2, padx=5, sticky="w")
+    create_indicator(light)
 
     gui.states[state_key]["button"] = button
     gui.states[state_key]["light"] = light
+    gui.states[state_key]["description_label"] = description
+
+def update_indicator(view, indicator, color):
+    view.set_item(indicator, INDICATOR_TAG, fill=color)
+
+def schedule_text(status):
+    """One-line summary of a device's schedule status, e.g. 'Schedule: ON until 21:00'."""
+    text = f"Schedule: {'ON' if status['on'] else 'OFF'}"
+    if status["next"] is not None:
+        text += f" until {time.strftime('%H:%M', time.localtime(status['next']))}"
+    return text
 
-def update_clock(gui):
-    def refresh_clock():
-        while True:
-            current_time = time.strftime("%b %d %H:%M")
-            gui.clock_label.config(text=current_time)
-            time.sleep(1)
-    threading.Thread(target=refresh_clock, daemon=True).start()
-
-def update_connection_status(gui):
-    def check_connection():
-        last_state_time = time.time()
-        while True:
-            if gui.arduino and gui.arduino.is_open:
-                try:
-                    if gui.arduino.in_waiting > 0:
-                        response = gui.arduino.readline().decode().strip()
-                        if response.startswith("STATE:"):
-                            gui.update_relay_states(response)
-                            last_state_time = time.time()
-                    if time.time() - last_state_time > 10:
-                        update_indicator(gui.connection_indicator, "red")
-                    else:
-                        # Before setting indicator to green, check actual connection
-                        if check_arduino_connection(gui.arduino):
-                            update_indicator(gui.connection_indicator, "green")
-                        else:
-                            update_indicator(gui.connection_indicator, "red")
-                except Exception:
-                    update_indicator(gui.connection_indicator, "red")
-                    gui.arduino = None
-            else:
-                update_indicator(gui.connection_indicator, "red")
-                gui.arduino = None
-            time.sleep(3)
-    threading.Thread(target=check_connection, daemon=True).start()
-
-def update_indicator(indicator, color):
-    indicator.delete("all")
-    indicator.create_oval(2, 2, 18, 18, fill=color)
-
-def color_for_value(value, low, high):
+def color_for_value(value, channel):
+    """Red outside the channel's alert range (alerts.txt), black inside it, gray without a reading."""
+    from alerts import display_range  # alerts imports this module
     try:
         val = float(value)
-        if val < low or val > high:
-            return "red"
-        return "black"
     except ValueError:
         return "gray"
+    low, high = display_range(channel)
+    if (low is not None and val < low) or (high is not None and val > high):
+        return "red"
+    return "black"
 
 def update_relay_states(self, message):
-    """Parse STATE message from Arduino and update GUI elements."""
-    if not message.startswith("STATE:"):
-        return
+    """Parse a STATE/RELAYS/SENSORS message from Arduino and update GUI elements.
 
+    Returns the decoded frame (None if the message was not a valid data frame).
+    """
     try:
-        parts = message[len("STATE:"):].split(",")
-        if len(parts) != 17:
-            log_error(f"Expected 17 values in STATE message, got {len(parts)}: {message}")
-            print(f"⚠ Expected 17 values in STATE message, got {len(parts)}: {message}")
-            return
-        try:
-            float(parts[9])   # Air temperature
-            float(parts[10])  # Humidity
-            float(parts[13])  # pH top
-            float(parts[14])  # EC top
-            float(parts[15])  # pH bottom
-            float(parts[16])  # EC bottom
-        except ValueError:
-            log_error(f"Invalid numeric data in STATE message: {message}")
-            print(f"⚠ Invalid numeric data in STATE message: {message}")
-            return
-
-        # Update relay indicator lights
-        relay_keys = [
-            "lights_top", "lights_bottom",
-            "pump_top", "pump_bottom",
-            "sensor_pump_top", "sensor_pump_bottom",
-            "drain"
-        ]
-        for i, key in enumerate(relay_keys):
-            state = parts[i] == "1"
-            self.states[key]["state"] = state
-            self.states[key]["button"].config(text="ON" if state else "OFF", bg="darkgreen" if state else "darkgrey")
-            self.states[key]["light"].delete("all")
-            self.states[key]["light"].create_oval(2, 2, 18, 18, fill="green" if state else "red")
-
-        # Float sensors
-        float_top = parts[7]
-        float_bottom = parts[8]
-        self.water_level_top_label.config(
-            text=f"Water Level (Top): {'HIGH' if float_top == '1' else 'LOW'}",
-            fg="black" if float_top == '1' else "red"
+        frame = decode_frame(message)
+    except FrameError as e:
+        log_error(f"{e}: {message}")
+        print(f"⚠ {e}: {message}")
+        return None
+    if frame:
+        apply_frame(self, frame)
+    return frame
+
+
+def paint_switch(view, info, state):
+    view.set(info["button"], text="ON" if state else "OFF", bg="darkgreen" if state else "darkgrey")
+    view.set_item(info["light"], INDICATOR_TAG, fill="green" if state else "red")
+
+
+def apply_frame(self, frame):
+    """Record every field group the decoded frame carries in the GUI's view model.
+
+    Nothing is drawn here; self.view.flush() pushes only what changed.
+    """
+    view = self.view
+    if frame.valid & HAS_RELAYS:
+        for key, info in self.states.items():
+            state = frame.relay_on(key)
+            info["state"] = state
+            paint_switch(view, info, state)
+
+    if frame.valid & HAS_FLOATS:
+        view.set(
+            self.water_level_top_label,
+            text=f"Water Level (Top): {'HIGH' if frame.float_top else 'LOW'}",
+            fg="black" if frame.float_top else "red"
         )
-        self.water_level_bottom_label.config(
-            text=f"Water Level (Bottom): {'HIGH' if float_bottom == '1' else 'LOW'}",
-            fg="black" if float_bottom == '1' else "red"
+        view.set(
+            self.water_level_bottom_label,
+            text=f"Water Level (Bottom): {'HIGH' if frame.float_bottom else 'LOW'}",
+            fg="black" if frame.float_bottom else "red"
         )
 
-        # Air temperature and humidity
-        dht_temp = parts[9]
-        dht_humidity = parts[10]
-        self.temperature_label.config(text=f"Temperature: {dht_temp} °C | Humidity: {dht_humidity} %")
+        # Air temperature and humidity (-1 means the DHT read failed)
+        air_color = "black" if frame.valid & AIR_OK else "red"
+        view.set(self.temperature_label, text=f"Temperature: {format_value(frame.air_temp)} °C", fg=air_color)
+        view.set(self.humidity_label, text=f"Humidity: {format_value(frame.humidity)} %", fg=air_color)
 
         # Water temperatures
-        water_temp1 = parts[11]
-        water_temp2 = parts[12]
-
-        # pH and EC (top and bottom)
-        ph_top = parts[13]
-        ec_top = parts[14]
-        ph_bottom = parts[15]
-        ec_bottom = parts[16]
-
-        ph_color_top = color_for_value(ph_top, 5.5, 6.5)
-        ph_color_bottom = color_for_value(ph_bottom, 5.5, 6.5)
-        self.ph_label.config(
-            text=f"pH (Top/Bottom): {ph_top} / {ph_bottom}",
+        view.set(self.water_temp1_label, text=f"Water Temp 1: {format_value(frame.water_temp1)} °C")
+        view.set(self.water_temp2_label, text=f"Water Temp 2: {format_value(frame.water_temp2)} °C")
+
+    if frame.valid & HAS_PH_EC:
+        ph_color_top = color_for_value(frame.ph_top, "ph_top")
+        ph_color_bottom = color_for_value(frame.ph_bottom, "ph_bottom")
+        view.set(
+            self.ph_label,
+            text=f"pH (Top/Bottom): {format_value(frame.ph_top)} / {format_value(frame.ph_bottom)}",
             fg=ph_color_top if ph_color_top != "black" or ph_color_bottom == "black" else ph_color_bottom
         )
 
-        ec_color_top = color_for_value(ec_top, 1.0, 2.5)
-        ec_color_bottom = color_for_value(ec_bottom, 1.0, 2.5)
-        self.ec_label.config(
-            text=f"EC (Top/Bottom): {ec_top} / {ec_bottom}",
+        ec_color_top = color_for_value(frame.ec_top, "ec_top")
+        ec_color_bottom = color_for_value(frame.ec_bottom, "ec_bottom")
+        view.set(
+            self.ec_label,
+            text=f"EC (Top/Bottom): {format_value(frame.ec_top)} / {format_value(frame.ec_bottom)}",
             fg=ec_color_top if ec_color_top != "black" or ec_color_bottom == "black" else ec_color_bottom
         )
-
-        # Optional: add water temp display to GUI if desired
-
-        # Rotate the sensor log file if it exceeds 5 MB
-        if os.path.getsize(SENSOR_LOG_FILE) > 5 * 1024 * 1024:  # 5 MB
-            rotated_file = SENSOR_LOG_FILE.replace(".csv", f"_{datetime.now().strftime('%H%M%S')}.csv")
-            os.rename(SENSOR_LOG_FILE, rotated_file)
-            init_sensor_log()
-        with open(SENSOR_LOG_FILE, "a") as log:
-            log.write(f"{datetime.now()},{dht_temp},{dht_humidity},{water_temp1},{water_temp2},{ph_top},{ec_top},{ph_bottom},{ec_bottom},{float_top},{float_bottom}\n")
-
-    except Exception as e:
-        log_error(f"Error parsing STATE message: {e}")
-        print(f"⚠ Error parsing STATE message: {e}")
\ No newline at end of file
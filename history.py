@@ -0,0 +1,205 @@
+import glob
+import os
+import threading
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from helpers import LOG_DIR, log_error
+from history_store import CHANNELS, CSV_COLUMNS, HistoryStore
+
+# -------------------- History Queries --------------------
+#
+#   buckets = history.query("ph_top", start, end, resolution=3600)
+#
+# returns numpy arrays with the min, mean and max of every resolution-second
+# bucket in [start, end), ready to hand to a chart. Days that are in the
+# HistoryStore are read from its columns; days that only exist as CSV logs
+# (not migrated yet) are read through a sparse time index: one
+# (timestamp, byte offset) mark every INDEX_STRIDE rows, so a query seeks
+# straight to the first mark before the window and parses only the rows it
+# needs instead of the whole file. Indexes are kept per file and extended
+# incrementally as the live log grows.
+
+INDEX_STRIDE = 256
+
+Buckets = namedtuple("Buckets", "time min mean max count")
+
+_default_store = None
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _to_epoch(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day).timestamp()
+    return float(value)
+
+
+def _parse_timestamp(text):
+    return datetime.fromisoformat(text.decode() if isinstance(text, bytes) else text).timestamp()
+
+
+class CsvTimeIndex:
+    """Sparse (timestamp, byte offset) index over one sensor CSV log."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.columns = []
+        self.times = []
+        self.offsets = []
+        self._indexed_size = 0
+        self._indexed_file = None
+        self._rows = 0
+
+    def refresh(self):
+        """Index rows appended since the last call (the live log keeps growing)."""
+        with self._lock:
+            stat = os.stat(self.path)
+            size, file_id = stat.st_size, (stat.st_dev, stat.st_ino)
+            if size < self._indexed_size or (self._indexed_file and file_id != self._indexed_file):
+                # File was replaced (rotation), possibly by one that has already grown
+                # past the old size; start over
+                self._reset()
+            self._indexed_file = file_id
+            if size == self._indexed_size:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self._indexed_size)
+                offset = self._indexed_size
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # Half-written row; pick it up next time
+                    if offset == 0:
+                        self.columns = line.decode().strip().split(",")
+                    else:
+                        if self._rows % INDEX_STRIDE == 0:
+                            try:
+                                self.times.append(_parse_timestamp(line[:line.index(b",")]))
+                                self.offsets.append(offset)
+                            except ValueError:
+                                pass  # Unreadable row: no mark here, the next one still works
+                        self._rows += 1
+                    offset += len(line)
+            self._indexed_size = offset
+
+    def read(self, channel, start, end):
+        """Return (timestamps, values) for rows with start <= timestamp < end."""
+        self.refresh()
+        column = self.columns.index(CSV_COLUMNS[channel]) if CSV_COLUMNS[channel] in self.columns else None
+        if column is None or not self.offsets:
+            return np.empty(0), np.empty(0)
+        # Last mark at or before start: every row before it is too early
+        mark = max(int(np.searchsorted(self.times, start, side="right")) - 1, 0)
+        times, values = [], []
+        with open(self.path, "rb") as f:
+            f.seek(self.offsets[mark])
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                fields = line.split(b",")
+                try:
+                    timestamp = _parse_timestamp(fields[0])
+                    value = float(fields[column])
+                except (ValueError, IndexError):
+                    continue
+                if timestamp >= end:
+                    break
+                if timestamp >= start:
+                    times.append(timestamp)
+                    values.append(value)
+        return np.array(times), np.array(values)
+
+
+def csv_index(path):
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = CsvTimeIndex(path)
+        return index
+
+
+def _csv_paths(log_dir, day):
+    # Rotated parts (_1, _2, ...) hold the older rows of the day
+    pattern = os.path.join(log_dir, f"sensor_log_{day.isoformat()}*.csv")
+    return sorted(glob.glob(pattern))
+
+
+def read_raw(channel, start, end, store=None, log_dir=LOG_DIR):
+    """Return every (timestamp, value) for channel in [start, end), from the store or the CSV logs."""
+    if channel not in CHANNELS:
+        raise ValueError(f"Unknown channel: {channel}")
+    store = store or default_store()
+    start, end = _to_epoch(start), _to_epoch(end)
+    stored_days = set(store.days())
+    chunks_t, chunks_v = [], []
+    day, last_day = date.fromtimestamp(start), date.fromtimestamp(end)
+    while day <= last_day:
+        day_start = max(start, _to_epoch(day))
+        day_end = min(end, _to_epoch(day + timedelta(days=1)))
+        if day in stored_days:
+            timestamps, values = store.read_range(channel, day_start, day_end)
+            chunks_t.append(timestamps)
+            chunks_v.append(values)
+        else:
+            for path in _csv_paths(log_dir, day):
+                try:
+                    timestamps, values = csv_index(path).read(channel, day_start, day_end)
+                except OSError as e:
+                    log_error(f"Could not read {path}: {e}")
+                    continue
+                chunks_t.append(timestamps)
+                chunks_v.append(values)
+        day += timedelta(days=1)
+    if not chunks_t:
+        return np.empty(0), np.empty(0)
+    timestamps = np.concatenate(chunks_t).astype(np.float64, copy=False)
+    values = np.concatenate(chunks_v).astype(np.float64, copy=False)
+    if len(chunks_t) > 1:
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, values = timestamps[order], values[order]
+    return timestamps, values
+
+
+def downsample(timestamps, values, start, end, resolution):
+    """Reduce sorted samples to min/mean/max per resolution-second bucket (NaN where no valid reading)."""
+    start, end = _to_epoch(start), _to_epoch(end)
+    edges = np.arange(start, end, resolution, dtype=np.float64)
+    bounds = np.searchsorted(timestamps, edges, side="left")
+    counts = np.diff(np.append(bounds, np.searchsorted(timestamps, end, side="left")))
+    mins = np.full(len(edges), np.nan)
+    maxs = np.full(len(edges), np.nan)
+    means = np.full(len(edges), np.nan)
+    filled = counts > 0
+    if filled.any():
+        # reduceat over the start of each non-empty bucket covers exactly that bucket
+        starts = bounds[filled]
+        window = values[:starts[-1] + counts[filled][-1]]
+        mins[filled] = np.fmin.reduceat(window, starts)
+        maxs[filled] = np.fmax.reduceat(window, starts)
+        # Failed readings are NaN: average the others instead of letting one spoil the bucket
+        valid = ~np.isnan(window)
+        sums = np.add.reduceat(np.where(valid, window, 0.0), starts)
+        readings = np.add.reduceat(valid, starts, dtype=np.int64)
+        means[filled] = np.divide(sums, readings, out=np.full(len(starts), np.nan), where=readings > 0)
+    return Buckets(edges, mins, means, maxs, counts)
+
+
+def query(channel, start, end, resolution=60, store=None, log_dir=LOG_DIR):
+    """min/mean/max of channel per resolution-second bucket over [start, end)."""
+    timestamps, values = read_raw(channel, start, end, store, log_dir)
+    return downsample(timestamps, values, start, end, resolution)
+
+
+def default_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = HistoryStore()
+    return _default_store
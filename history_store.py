@@ -0,0 +1,281 @@
+import argparse
+import csv
+import glob
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from helpers import LOG_DIR, log_error
+
+# -------------------- Sensor History Store --------------------
+#
+# Columnar storage for sensor readings, one segment per calendar day:
+#
+#   history/2026-10-17/timestamp.f64     open segment: raw little-endian
+#   history/2026-10-17/ph_top.f32        columns, appended in batches
+#   history/2026-10-16.npz               sealed segment: all columns,
+#                                        sorted, deduplicated, compressed
+#
+# Timestamps are epoch seconds (float64); every channel is float32, with the
+# float switches stored as 0/1. A day is sealed the first time a reading for
+# a later day arrives (or at startup / by the migrate command), so only
+# today's segment is ever written to. Range reads load whole columns with
+# numpy and binary-search the timestamps; nothing is parsed as text.
+#
+# Import the existing CSV logs with:  python history_store.py migrate
+
+HISTORY_DIR = "history"
+
+CHANNELS = (
+    "air_temp", "humidity", "water_temp1", "water_temp2",
+    "ph_top", "ec_top", "ph_bottom", "ec_bottom",
+    "float_top", "float_bottom",
+)
+
+# CSV column for each channel in logs/sensor_log_*.csv
+CSV_COLUMNS = {
+    "air_temp": "dht_temp",
+    "humidity": "dht_humidity",
+    "water_temp1": "water_temp1",
+    "water_temp2": "water_temp2",
+    "ph_top": "ph_top",
+    "ec_top": "ec_top",
+    "ph_bottom": "ph_bottom",
+    "ec_bottom": "ec_bottom",
+    "float_top": "float_top",
+    "float_bottom": "float_bottom",
+}
+
+TIMESTAMP_DTYPE = np.dtype("<f8")
+CHANNEL_DTYPE = np.dtype("<f4")
+
+
+def day_of(timestamp):
+    return date.fromtimestamp(timestamp)
+
+
+class HistoryStore:
+    def __init__(self, root=HISTORY_DIR, cache_size=64):
+        self.root = root
+        self.cache_size = cache_size
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._open_day = None
+        self._cache = OrderedDict()  # (day, column) -> array, sealed segments only
+
+    # ---- paths ----
+
+    def _segment_dir(self, day):
+        return os.path.join(self.root, day.isoformat())
+
+    def _sealed_path(self, day):
+        return os.path.join(self.root, f"{day.isoformat()}.npz")
+
+    def _column_path(self, day, column):
+        suffix = "f64" if column == "timestamp" else "f32"
+        return os.path.join(self._segment_dir(day), f"{column}.{suffix}")
+
+    def days(self):
+        """All days with data, sealed or open, in order."""
+        found = set()
+        for name in os.listdir(self.root):
+            stem = name[:-4] if name.endswith(".npz") else name
+            try:
+                found.add(date.fromisoformat(stem))
+            except ValueError:
+                continue
+        return sorted(found)
+
+    # ---- writing ----
+
+    def append_batch(self, timestamps, frames):
+        """Append readings (epoch seconds, decoded frames) in one write per column."""
+        if not timestamps:
+            return
+        with self._lock:
+            start = 0
+            # Split the batch at day boundaries so each day lands in its own segment
+            for index in range(1, len(timestamps) + 1):
+                if index == len(timestamps) or day_of(timestamps[index]) != day_of(timestamps[start]):
+                    self._append_day(day_of(timestamps[start]), timestamps[start:index], frames[start:index])
+                    start = index
+
+    def append_columns(self, day, columns):
+        """Append pre-built column arrays (used by the CSV migration)."""
+        with self._lock:
+            self._write_columns(day, columns)
+
+    def _append_day(self, day, timestamps, frames):
+        if self._open_day != day:
+            if self._open_day is not None and self._open_day < day:
+                self._seal(self._open_day)
+            self._open_day = day
+        columns = {"timestamp": np.asarray(timestamps, dtype=TIMESTAMP_DTYPE)}
+        for channel in CHANNELS:
+            columns[channel] = np.fromiter(
+                (getattr(frame, channel) for frame in frames), dtype=CHANNEL_DTYPE, count=len(frames)
+            )
+        self._write_columns(day, columns)
+
+    def _write_columns(self, day, columns):
+        if os.path.exists(self._sealed_path(day)):
+            self._unseal(day)
+        os.makedirs(self._segment_dir(day), exist_ok=True)
+        for column, values in columns.items():
+            with open(self._column_path(day, column), "ab") as f:
+                f.write(np.ascontiguousarray(values).tobytes())
+
+    # ---- sealing ----
+
+    def seal_before(self, day):
+        """Seal every open segment older than day."""
+        with self._lock:
+            for old_day in self.days():
+                if old_day < day and os.path.isdir(self._segment_dir(old_day)):
+                    self._seal(old_day)
+
+    def _seal(self, day):
+        columns = self._read_open(day)
+        if columns is None:
+            return
+        # Sort by time and drop repeated timestamps so re-imports are idempotent
+        order = np.argsort(columns["timestamp"], kind="stable")
+        timestamps = columns["timestamp"][order]
+        keep = np.ones(len(timestamps), dtype=bool)
+        keep[1:] = timestamps[1:] != timestamps[:-1]
+        sealed = {column: values[order][keep] for column, values in columns.items()}
+        temp_path = self._sealed_path(day) + ".tmp.npz"
+        np.savez_compressed(temp_path, **sealed)
+        os.replace(temp_path, self._sealed_path(day))
+        shutil.rmtree(self._segment_dir(day))
+        self._drop_cached(day)
+        print(f"🗜 Sealed history segment {day} ({int(keep.sum())} readings)")
+
+    def _unseal(self, day):
+        """Turn a sealed day back into an open segment so it can take more rows."""
+        with np.load(self._sealed_path(day)) as sealed:
+            columns = {column: sealed[column] for column in sealed.files}
+        os.makedirs(self._segment_dir(day), exist_ok=True)
+        for column, values in columns.items():
+            with open(self._column_path(day, column), "wb") as f:
+                f.write(values.tobytes())
+        os.remove(self._sealed_path(day))
+        self._drop_cached(day)
+
+    # ---- reading ----
+
+    def _read_open(self, day):
+        if not os.path.isdir(self._segment_dir(day)):
+            return None
+        columns = {}
+        for column in ("timestamp",) + CHANNELS:
+            path = self._column_path(day, column)
+            dtype = TIMESTAMP_DTYPE if column == "timestamp" else CHANNEL_DTYPE
+            columns[column] = np.fromfile(path, dtype=dtype) if os.path.exists(path) else np.empty(0, dtype)
+        # A crash mid-batch can leave columns of different lengths; trust the shortest
+        length = min(len(values) for values in columns.values())
+        return {column: values[:length] for column, values in columns.items()}
+
+    def _read_sealed(self, day, channel):
+        cached = []
+        with np.load(self._sealed_path(day)) as sealed:
+            for column in ("timestamp", channel):
+                key = (day, column)
+                if key not in self._cache:
+                    self._cache[key] = sealed[column]
+                    if len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+                self._cache.move_to_end(key)
+                cached.append(self._cache[key])
+        return cached
+
+    def _drop_cached(self, day):
+        for key in [key for key in self._cache if key[0] == day]:
+            del self._cache[key]
+
+    def read_day(self, day, channel):
+        """Return (timestamps, values) for one channel on one day, sorted by time."""
+        if channel not in CHANNELS:
+            raise ValueError(f"Unknown channel: {channel}")
+        with self._lock:
+            if os.path.exists(self._sealed_path(day)):
+                return self._read_sealed(day, channel)
+            columns = self._read_open(day)
+        if columns is None:
+            return np.empty(0, TIMESTAMP_DTYPE), np.empty(0, CHANNEL_DTYPE)
+        order = np.argsort(columns["timestamp"], kind="stable")
+        return columns["timestamp"][order], columns[channel][order]
+
+    def read_range(self, channel, start, end):
+        """Return (timestamps, values) with start <= timestamp < end (epoch seconds)."""
+        chunks_t, chunks_v = [], []
+        day, last_day = day_of(start), day_of(end)
+        while day <= last_day:
+            timestamps, values = self.read_day(day, channel)
+            if len(timestamps):
+                lo = np.searchsorted(timestamps, start, side="left")
+                hi = np.searchsorted(timestamps, end, side="left")
+                chunks_t.append(timestamps[lo:hi])
+                chunks_v.append(values[lo:hi])
+            day += timedelta(days=1)
+        if not chunks_t:
+            return np.empty(0, TIMESTAMP_DTYPE), np.empty(0, CHANNEL_DTYPE)
+        return np.concatenate(chunks_t), np.concatenate(chunks_v)
+
+
+# -------------------- CSV Migration --------------------
+
+def _parse_float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def migrate_csv_logs(store, pattern=os.path.join(LOG_DIR, "sensor_log_*.csv")):
+    """Import every matching CSV log into the store; returns the number of rows imported."""
+    imported = 0
+    for path in sorted(glob.glob(pattern)):
+        by_day = {}
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                try:
+                    timestamp = datetime.fromisoformat(row["timestamp"]).timestamp()
+                except (KeyError, TypeError, ValueError):
+                    log_error(f"Skipping unreadable row in {path}: {row}")
+                    continue
+                by_day.setdefault(day_of(timestamp), []).append((timestamp, row))
+        for day, rows in by_day.items():
+            columns = {"timestamp": np.array([t for t, _ in rows], dtype=TIMESTAMP_DTYPE)}
+            for channel, csv_column in CSV_COLUMNS.items():
+                columns[channel] = np.array(
+                    [_parse_float(row.get(csv_column) or "nan") for _, row in rows], dtype=CHANNEL_DTYPE
+                )
+            store.append_columns(day, columns)
+            imported += len(rows)
+        print(f"📥 Imported {path}")
+    store.seal_before(date.today())
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sensor history store maintenance")
+    parser.add_argument("command", choices=("migrate", "seal"))
+    parser.add_argument("--root", default=HISTORY_DIR, help="History store directory")
+    parser.add_argument("--logs", default=os.path.join(LOG_DIR, "sensor_log_*.csv"), help="CSV files to import")
+    args = parser.parse_args()
+
+    store = HistoryStore(args.root)
+    if args.command == "migrate":
+        count = migrate_csv_logs(store, args.logs)
+        print(f"✅ Imported {count} readings into {args.root}")
+    else:
+        store.seal_before(date.today())
+
+
+if __name__ == "__main__":
+    main()
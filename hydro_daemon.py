@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import signal
+
+import metrics
+import web_api
+from control_link import DEFAULT_SOCKET_PATH, ControlServer
+from rigs import RIGS_FILE, RigConfig, RigRegistry, build_controller, load_rigs
+
+# -------------------- Headless Controller --------------------
+#
+# Runs the controllers without a display: serial polling, state tracking and
+# CSV logging keep going whether or not a GUI is attached. Front ends
+# (hydroponics_gui.py or anything else) connect over the control socket.
+# One daemon drives every rig listed in rigs.txt (see rigs.py).
+
+
+async def serve(rigs, socket_path, api=None):
+    """Run every rig, the control socket and the web API (if given) until rigs.stop()."""
+    server = await ControlServer(rigs, socket_path).start()
+    if api:
+        await api.start()
+    try:
+        await rigs.run()
+    finally:
+        if api:
+            await api.close()
+        await server.close()
+
+
+async def run_daemon(rigs, socket_path, api=None):
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, rigs.stop)
+    await serve(rigs, socket_path, api)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless hydroponics controller")
+    parser.add_argument("--port", help="Serial port of the Arduino (default: first port found; ignored with rigs)")
+    parser.add_argument("--rigs", default=RIGS_FILE, help="File listing the rigs to drive (see rigs.py)")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="Unix socket front ends attach to")
+    parser.add_argument("--simulate", action="store_true",
+                        help="Run against a simulated Arduino (simulator.py), keeping its data under sim/")
+    parser.add_argument("--sim-drop", type=float, default=0.0, help="Simulation: fraction of lines losing bytes")
+    parser.add_argument("--sim-corrupt", type=float, default=0.0, help="Simulation: fraction of corrupted lines")
+    parser.add_argument("--sim-latency", type=float, default=0.0, help="Simulation: extra reply latency in seconds")
+    parser.add_argument("--binary", action="store_true", help="Negotiate CRC-checked binary data frames")
+    parser.add_argument("--push", action="store_true", help="Have the Arduino push changes instead of polling it")
+    parser.add_argument("--metrics-port", type=int, nargs="?", const=metrics.DEFAULT_PORT,
+                        help=f"Serve Prometheus metrics on localhost (default port {metrics.DEFAULT_PORT})")
+    parser.add_argument("--api-port", type=int, nargs="?", const=web_api.DEFAULT_PORT,
+                        help=f"Serve the REST/WebSocket API (default port {web_api.DEFAULT_PORT}, see web_api.py)")
+    parser.add_argument("--api-host", default="127.0.0.1",
+                        help="Address for the API; any but localhost (e.g. 0.0.0.0) needs HYDRO_API_TOKEN")
+    args = parser.parse_args()
+
+    configs = load_rigs(args.rigs)
+    if args.port and len(configs) == 1 and configs[0].port is None:
+        configs = [RigConfig(configs[0].rig_id, args.port, configs[0].schedule_path)]
+
+    options = {"binary_frames": args.binary, "push_telemetry": args.push}
+    if args.simulate:
+        from simulator import Faults, SimulatedArduino
+        print("🧪 Running in simulation mode against simulated Arduinos.")
+        faults = Faults(args.sim_latency, drop_rate=args.sim_drop, corrupt_rate=args.sim_corrupt)
+        rigs = RigRegistry({
+            config.rig_id: build_controller(config, SimulatedArduino(faults=faults), simulated=True, **options)
+            for config in configs
+        }, simulated=True)
+    else:
+        rigs = RigRegistry.from_config(configs, **options)
+
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    try:
+        api = web_api.WebApi(rigs, args.api_port, args.api_host) if args.api_port else None
+    except ValueError as e:
+        parser.error(str(e))
+    asyncio.run(run_daemon(rigs, args.socket, api))
+    print("👋 Controller stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,40 @@
+import threading
+import time
 import tkinter as tk
 from helpers import (
+    create_indicator,
     create_switch,
-    update_clock,
-    update_connection_status,
-    connect_to_arduino,
-    send_command_to_arduino,
+    paint_switch,
+    schedule_text,
+    update_indicator,
+    update_relay_states,
 )
+import metrics
+from control_link import ControllerClient
+from startup_profile import StartupProfile
+from tk_bridge import TkBridge
+from view_model import ViewModel
 
 
 class HydroponicsGUI:
-    def __init__(self, root, arduino):
+    def __init__(self, root, controller):
         self.root = root
-        self.arduino = arduino
+        # Either an embedded RigRegistry or a ControllerClient attached to
+        # hydro_daemon.py; the GUI only ever sends commands and paints events
+        self.controller = controller
+        # Rig shown in the main view; every rig's events also feed the overview
+        self.rig = next(iter(getattr(controller, "ids", [])), None)
+        self.rig_events = {}  # rig -> {event key: (event, value)}, newest only, to repaint on a switch
+        self._rig_lock = threading.Lock()
+        self.overview = None
+        self.on_first_frame = None  # Called once, on the Tk thread, when the first frame is painted
+        # Controller events arrive on its loop thread and are painted by the bridge
+        self.bridge = TkBridge(root).start()
+        # Widgets are painted through the view model: only changed options reach Tk, once per batch
+        self.view = ViewModel()
+        self.bridge.add_flush_hook(self.view.flush)
+        metrics.TK_PENDING_UPDATES.bind(self.bridge.pending_count)
+        controller.add_listener(self.on_controller_event)
         self.root.title("Hydroponics System Control")
         self.root.geometry("800x580")  # Set resolution to match Raspberry Pi touchscreen
         # self.root.attributes("-fullscreen", False)  # Enable fullscreen mode
@@ -31,8 +54,22 @@ class HydroponicsGUI:
         connection_label.grid(row=0, column=0, padx=(0, 10))
         self.connection_indicator = tk.Canvas(connection_frame, width=20, height=20, highlightthickness=0)
         self.connection_indicator.grid(row=0, column=1)
-        if self.arduino:
-            update_connection_status(self)
+        create_indicator(self.connection_indicator)
+
+        # Trend charts replace the main view while shown; built on first use (matplotlib is slow to import)
+        self.trends = None
+        self.trends_button = tk.Button(
+            self.top_frame, text="Trends", font=("Helvetica", 14), width=8, command=self.toggle_trends
+        )
+        self.trends_button.pack(side=tk.RIGHT, padx=10)
+
+        # Rig selector and overview; only packed once a second rig reports in
+        self.overview_button = tk.Button(
+            self.top_frame, text="All Rigs", font=("Helvetica", 14), width=8, command=self.toggle_overview
+        )
+        self.rig_var = tk.StringVar(value=self.rig or "")
+        self.rig_menu = tk.OptionMenu(self.top_frame, self.rig_var, "")
+        self.rig_menu.config(font=("Helvetica", 14))
 
         # Main frame to organize layout
         self.main_frame = tk.Frame(self.root)
@@ -112,140 +149,228 @@ class HydroponicsGUI:
         )
         self.reset_button.pack(pady=5, anchor="w")
 
-        # Start clock updates
-        update_clock(self)
-
-        # Load and apply the schedule
-        # load_schedule(self)
-
-        # Ensure all switches are OFF at startup
-        self.initialize_switches()
-        if self.arduino:
-            from datetime import datetime
-            current_time = datetime.now().strftime("%H:%M:%S")
-            send_command_to_arduino(self.arduino, f"SET_TIME:{current_time}\n")
-
-        self.poll_relay_status()
-        self.poll_sensor_data()
-
-    def initialize_switches(self):
-        """Ensure all switches are OFF at startup."""
-        print("Initializing all switches to OFF...")
-        for state_key, info in self.states.items():
-            info["state"] = False
-            info["button"].config(text="OFF", bg="darkgrey")
-            info["light"].delete("all")
-            info["light"].create_oval(2, 2, 18, 18, fill="red")
-            send_command_to_arduino(self.arduino, f"{info['device_code']}:OFF\n")
+        # Switches show the Arduino's real relay state as soon as the controller
+        # reports it (at once from its saved snapshot); nothing is switched here
 
     def reset_all_switches(self):
         """Turn all switches off."""
         print("Resetting all switches to OFF...")
-        self.initialize_switches()
+        for state_key, info in self.states.items():
+            info["state"] = False
+            paint_switch(self.view, info, False)
+            self.controller.send(f"{info['device_code']}:OFF", rig=self.rig)
+        self.view.flush()
 
     def reset_to_arduino_schedule(self):
-        reset_to_arduino_schedule(self.arduino)
+        print("🔄 Resetting to Arduino schedule...")
+        self.controller.send("RESET_SCHEDULE", rig=self.rig)
 
     def update_relay_states(self, message):
-        """
-        Update relay and sensor states from Arduino message and update float sensor water level labels.
-        Expects message format: ...;float_top;float_bottom;...
-        """
-        if message.startswith("RELAYS:"):
-            parts = message[len("RELAYS:"):].strip().split(",")
-            if len(parts) != 7:
-                return
-            relay_keys = ["lights_top", "lights_bottom", "pump_top", "pump_bottom", "sensor_pump_top", "sensor_pump_bottom", "drain_actuator"]
-            for i, key in enumerate(relay_keys):
-                if key in self.states:
-                    state = parts[i] == "1"
-                    self.states[key]["state"] = state
-                    self.states[key]["button"].config(
-                        text="ON" if state else "OFF",
-                        bg="darkgreen" if state else "darkgrey"
-                    )
-                    self.states[key]["light"].delete("all")
-                    self.states[key]["light"].create_oval(2, 2, 18, 18, fill="green" if state else "red")
+        """Update relay and sensor widgets from a STATE, RELAYS or SENSORS message."""
+        frame = update_relay_states(self, message)
+        if frame and self.trends:
+            self.trends.add_frame(time.time(), frame)
+        if frame and self.on_first_frame:
+            self.on_first_frame()
+            self.on_first_frame = None
+
+    def show_panel(self, panel):
+        """Fill the main area with the controls (panel None), the trend charts or the rig overview."""
+        for other in (self.trends, self.overview):
+            if other is not None and other is not panel and other.visible:
+                other.hide()
+        if panel is None:
+            self.main_frame.pack(fill=tk.BOTH, expand=True)
+        else:
+            self.main_frame.pack_forget()
+            if not panel.visible:
+                panel.show(fill=tk.BOTH, expand=True)
+        self.trends_button.config(text="Controls" if panel is not None and panel is self.trends else "Trends")
+        self.overview_button.config(text="Controls" if panel is not None and panel is self.overview else "All Rigs")
+
+    def toggle_trends(self):
+        if self.trends is None:
+            from trends import TrendsPanel
+            from history_store import HistoryStore
+            from rigs import rig_history_dir, rig_log_dir
+            self.trends = TrendsPanel(self.root)
+            rig = self.rig or "main"
+            simulated = self.controller.simulated
+            self.trends.seed_from_history(HistoryStore(rig_history_dir(rig, simulated)), rig_log_dir(rig, simulated))
+        self.show_panel(None if self.trends.visible else self.trends)
+
+    def toggle_overview(self):
+        if self.overview is None:
+            return  # No second rig has reported yet
+        self.show_panel(None if self.overview.visible else self.overview)
+
+    # ---- rigs ----
+
+    def update_rig_list(self):
+        """Offer every rig seen so far in the selector (Tk thread)."""
+        with self._rig_lock:
+            rigs = list(self.rig_events)
+        menu = self.rig_menu["menu"]
+        menu.delete(0, "end")
+        for rig in rigs:
+            menu.add_command(label=rig, command=lambda rig=rig: self.select_rig(rig))
+        self.rig_var.set(self.rig or "")
+        if len(rigs) > 1 and not self.rig_menu.winfo_manager():
+            self.overview_button.pack(side=tk.RIGHT, padx=10)
+            self.rig_menu.pack(side=tk.RIGHT, padx=10)
+
+    def update_overview(self, rig, event, value):
+        if self.overview is None:
+            from rig_overview import RigOverview
+            self.overview = RigOverview(self.root, self.view, on_select=self.show_rig)
+        self.overview.update(rig, event, value)
+
+    def show_rig(self, rig):
+        self.select_rig(rig)
+        self.show_panel(None)
+
+    def select_rig(self, rig):
+        """Point the main view at another rig and repaint it from that rig's newest events (Tk thread)."""
+        self.rig_var.set(rig)
+        if rig == self.rig:
             return
+        self.rig = rig
+        with self._rig_lock:
+            events = list(self.rig_events.get(rig, {}).values())
+        for event, value in events:
+            self.paint_event(event, value)
+        if self.trends is not None:
+            # Its buffers hold the old rig's readings: rebuild it for the new one
+            showing = self.trends.visible
+            if showing:
+                self.show_panel(None)
+            self.trends.frame.destroy()
+            self.trends = None
+            if showing:
+                self.toggle_trends()
+
+    def update_schedule(self, status):
+        """Show what schedule.txt says each device should be doing."""
+        for info in self.states.values():
+            device_status = status.get(info["device_code"])
+            if device_status is None:
+                continue
+            info["schedule"] = device_status["description"]
+            self.view.set(info["description_label"], text=schedule_text(device_status))
 
-        if message.startswith("SENSORS:"):
-            parts = message[len("SENSORS:"):].strip().split(",")
-            if len(parts) != 6:
-                return
-            temp, humid, water_temp1, water_temp2, float_top, float_bottom = parts
-            self.temperature_label.config(text=f"Temperature: {temp} °C", fg="black" if temp != "-1" else "red")
-            self.humidity_label.config(text=f"Humidity: {humid} %", fg="black" if humid != "-1" else "red")
-            self.water_temp1_label.config(text=f"Water Temp 1: {water_temp1} °C")
-            self.water_temp2_label.config(text=f"Water Temp 2: {water_temp2} °C")
-            self.water_level_top_label.config(
-                text=f"Water Level (Top): {'HIGH' if float_top == '1' else 'LOW'}",
-                fg="black" if float_top == '1' else "red"
-            )
-            self.water_level_bottom_label.config(
-                text=f"Water Level (Bottom): {'HIGH' if float_bottom == '1' else 'LOW'}",
-                fg="black" if float_bottom == '1' else "red"
+    def toggle_switch(self, state_key):
+        info = self.states[state_key]
+        current_state = info["state"]
+        new_state = not current_state
+        info["state"] = new_state
+        paint_switch(self.view, info, new_state)
+        self.view.flush()  # Touch feedback should not wait for the next bridge batch
+        self.controller.send(f"{info['device_code']}:{'ON' if new_state else 'OFF'}", rig=self.rig)
+
+    def on_controller_event(self, rig, event, value):
+        """Runs on the controller loop: hand the update to the Tk thread."""
+        key = f"frame:{value.split(':', 1)[0]}" if event == "frame" else event
+        with self._rig_lock:
+            new_rig = rig not in self.rig_events
+            self.rig_events.setdefault(rig, {})[key] = (event, value)
+            several = len(self.rig_events) > 1
+        if new_rig:
+            self.bridge.post("rigs", self.update_rig_list)
+        if several:
+            self.bridge.post(f"overview:{rig}:{key}", self.update_overview, rig, event, value)
+        if self.rig is None:
+            self.rig = rig
+        if rig == self.rig:
+            self.paint_event(event, value)
+
+    def paint_event(self, event, value):
+        """Queue the repaint for one event of the rig on screen."""
+        if event == "frame":
+            # Each frame type is a full snapshot, so only the newest one per type needs painting
+            kind = value.split(":", 1)[0]
+            if kind in ("STATE", "RELAYS", "SENSORS"):
+                self.bridge.post(kind, self.update_relay_states, value)
+        elif event == "connection":
+            self.bridge.post(
+                "connection", update_indicator, self.view, self.connection_indicator, "green" if value else "red"
             )
-            return
+        elif event == "clock":
+            self.bridge.post("clock", self.view.set, self.clock_label, text=value)
+        elif event == "schedule":
+            self.bridge.post("schedule", self.update_schedule, value)
 
-        # Example message: ...;...;...;...;...;float_top;float_bottom;...
-        if not message.startswith("STATE:"):
-            return
-        parts = message[len("STATE:"):].strip().split(",")
-        if len(parts) != 17:
-            return
-        float_top = parts[7]
-        float_bottom = parts[8]
-        self.water_level_top_label.config(
-            text=f"Water Level (Top): {'HIGH' if float_top == '1' else 'LOW'}",
-            fg="black" if float_top == '1' else "red"
-        )
-        self.water_level_bottom_label.config(
-            text=f"Water Level (Bottom): {'HIGH' if float_bottom == '1' else 'LOW'}",
-            fg="black" if float_bottom == '1' else "red"
-        )
 
-    def poll_relay_status(self):
-        if self.arduino:
-            try:
-                send_command_to_arduino(self.arduino, "GET_RELAYS\n")
-            except Exception as e:
-                print(f"Failed to request relay status: {e}")
-        self.root.after(1000, self.poll_relay_status)
+def show_skeleton(root):
+    """Paint a placeholder at once, before the controller and widgets are ready."""
+    skeleton = tk.Label(root, text="🌱 Starting hydroponics monitor...", font=("Helvetica", 20), fg="gray")
+    skeleton.pack(expand=True)
+    root.update()
+    return skeleton
+
 
-    def poll_sensor_data(self):
-        if self.arduino:
-            try:
-                send_command_to_arduino(self.arduino, "GET_SENSORS\n")
-            except Exception as e:
-                print(f"Failed to request sensor data: {e}")
-        self.root.after(60000, self.poll_sensor_data)
+def embedded_controller(simulate):
+    # Only loaded without a daemon: brings in asyncio, numpy (history store) and pyserial
+    from rigs import RigRegistry, build_controller, load_rigs
+    configs = load_rigs()
+    if simulate:
+        from simulator import SimulatedArduino
+        print("🧪 Running in simulation mode against simulated Arduinos.")
+        return RigRegistry(
+            {config.rig_id: build_controller(config, SimulatedArduino(), simulated=True) for config in configs},
+            simulated=True,
+        )
+    # The controllers find their Arduinos in the background, so the window opens at once
+    return RigRegistry.from_config(configs)
 
 
 def main():
     import sys
     simulate = "--simulate" in sys.argv
-
-    if simulate:
-        print("🧪 Running in simulation mode. No Arduino connection will be attempted.")
-        arduino = None
-    else:
-        import serial.tools.list_ports
-        ports = list(serial.tools.list_ports.comports())
-        if ports:
-            port = ports[0].device
-            print(f"Connecting to Arduino on port: {port}")
-            arduino = connect_to_arduino(port, 9600)
-        else:
-            print("No serial ports found. Cannot connect to Arduino.")
-            arduino = None
+    profile = StartupProfile("--profile-startup" in sys.argv)
 
     root = tk.Tk()
     root.geometry("800x580")  # Match Raspberry Pi touchscreen resolution
-    app = HydroponicsGUI(root, arduino)
+    skeleton = show_skeleton(root)
+    profile.mark("window + skeleton")
+
+    # Prefer a running hydro_daemon.py; fall back to an embedded controller
+    controller = None
+    if not simulate and "--standalone" not in sys.argv:
+        controller = ControllerClient.try_connect()
+        if controller:
+            print("🔗 Attached to the hydroponics controller daemon.")
+    if controller is None:
+        controller = embedded_controller(simulate)
+    embedded = not isinstance(controller, ControllerClient)
+    profile.mark("build controller" if embedded else "attach to daemon")
+
+    if "--metrics" in sys.argv:
+        # Next to the daemon's own endpoint when attached to it; serial metrics live over there
+        metrics.serve(metrics.DEFAULT_PORT if embedded else metrics.DEFAULT_PORT + 1)
+
+    skeleton.destroy()
+    app = HydroponicsGUI(root, controller)
+    root.update_idletasks()
+    profile.mark("build widgets")
+    controller.start_in_thread()
+    profile.mark("start controller")
+    if "--api" in sys.argv and embedded:
+        # Attached to the daemon, the daemon's --api-port serves it instead
+        import asyncio
+        from web_api import WebApi
+        asyncio.run_coroutine_threadsafe(WebApi(controller).start(), controller.loop)
+
+    if profile.enabled:
+        def first_frame():
+            profile.mark("first frame painted")
+            profile.report()
+
+        app.on_first_frame = first_frame
+        root.after(30000, profile.report)  # No Arduino answering: report what there is
 
     def on_closing():
-        if arduino:
-            arduino.close()
+        app.bridge.stop()
+        controller.stop()
         root.destroy()
 
     root.protocol("WM_DELETE_WINDOW", on_closing)
@@ -254,15 +379,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-    def toggle_switch(self, state_key):
-        info = self.states[state_key]
-        current_state = info["state"]
-        new_state = not current_state
-        info["state"] = new_state
-        info["button"].config(
-            text="ON" if new_state else "OFF",
-            bg="darkgreen" if new_state else "darkgrey"
-        )
-        info["light"].delete("all")
-        info["light"].create_oval(2, 2, 18, 18, fill="green" if new_state else "red")
-        send_command_to_arduino(self.arduino, f"{info['device_code']}:{'ON' if new_state else 'OFF'}\n")
\ No newline at end of file
@@ -0,0 +1,191 @@
+import bisect
+import threading
+
+# -------------------- Metrics --------------------
+#
+# Counters, gauges and histograms for the hot paths (serial bytes, frames,
+# parse time, log flushes, Tk callbacks, reconnects), served as Prometheus
+# text on http://127.0.0.1:<port>/metrics by serve().
+#
+# Metrics are off unless serve() (or enable()) is called. Hot paths guard
+# their instrumentation with `if metrics.enabled:`, so when it is off they
+# pay one attribute lookup per frame and never call perf_counter(). Queue
+# depths are gauges bound to a function and only read when scraped.
+#
+# Counters and histograms take a lock per update: with several rigs, each
+# rig's reactor reader/writer and log writer threads update the same
+# metrics, and `+=` on a shared value is not atomic. The lock is uncontended
+# almost always, and hot paths only reach it when metrics are enabled. A
+# scrape may still see a histogram mid-update, which Prometheus tolerates.
+#
+# http.server is only imported by serve(), so importing this module to
+# count things stays cheap on the GUI's startup path.
+
+DEFAULT_PORT = 9108
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+enabled = False
+_registry = []
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label  # Optional label name, e.g. "kind"
+        self.values = {None: 0} if label is None else {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, label=None):
+        with self._lock:
+            self.values[label] = self.values.get(label, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self.values.items())  # A new label can appear while we render
+        for value, count in values:
+            yield self.name, () if value is None else ((self.label, value),), count
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.fns = []
+        _registry.append(self)
+
+    def set(self, value):
+        self.value = value
+
+    def bind(self, fn):
+        """Read the gauge from fn() at scrape time; with several rigs bound, their values add up."""
+        self.fns.append(fn)
+
+    def samples(self):
+        if not self.fns:
+            yield self.name, (), self.value
+            return
+        total = 0
+        for fn in self.fns:
+            try:
+                total += fn()
+            except Exception:
+                pass  # The thing it measures has gone away (e.g. no serial port right now)
+        yield self.name, (), total
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[slot] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            yield f"{self.name}_bucket", (("le", "+Inf" if bound == float("inf") else repr(bound)),), cumulative
+        yield f"{self.name}_sum", (), self.sum
+        yield f"{self.name}_count", (), self.count
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ---- the metrics themselves ----
+
+SERIAL_BYTES_IN = Counter("hydro_serial_bytes_in_total", "Bytes read from the Arduino")
+SERIAL_BYTES_OUT = Counter("hydro_serial_bytes_out_total", "Bytes written to the Arduino")
+FRAMES = Counter("hydro_frames_total", "Data frames decoded, by kind", label="kind")
+FRAMES_REJECTED = Counter("hydro_frames_rejected_total", "Corrupted or malformed frames dropped")
+PARSE_SECONDS = Histogram(
+    "hydro_frame_parse_seconds", "Time to decode one frame",
+    (5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3),
+)
+LOG_FLUSH_SECONDS = Histogram(
+    "hydro_log_flush_seconds", "Time to write one batch of sensor log rows",
+    (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+TK_CALLBACK_SECONDS = Histogram(
+    "hydro_tk_callback_seconds", "Time spent in one UI update on the Tk thread",
+    (1e-4, 5e-4, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5),
+)
+RECONNECTS = Counter("hydro_reconnects_total", "Times the Arduino link was re-established")
+SERIAL_WRITE_QUEUE = Gauge("hydro_serial_write_queue", "Commands waiting for the serial writer")
+PENDING_REQUESTS = Gauge("hydro_pending_requests", "Requests waiting for a reply from the Arduino")
+LOG_BUFFER_ROWS = Gauge("hydro_log_buffer_rows", "Sensor log rows waiting to be written")
+LOG_ROWS_DROPPED = Gauge("hydro_log_rows_dropped", "Sensor log rows lost because the buffer was full")
+TK_PENDING_UPDATES = Gauge("hydro_tk_pending_updates", "UI updates waiting for the Tk thread")
+
+
+# ---- endpoint ----
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def _handler_class():
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # One line per scrape would flood the controller log
+
+    return Handler
+
+
+def serve(port=DEFAULT_PORT, host="127.0.0.1"):
+    """Turn metrics on and serve them over HTTP from a daemon thread; returns the server."""
+    from http.server import ThreadingHTTPServer
+    enable()
+    server = ThreadingHTTPServer((host, port), _handler_class())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"📈 Metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,88 @@
+import tkinter as tk
+
+from frames import AIR_OK, HAS_FLOATS, HAS_RELAYS, FrameError, decode_frame, format_value
+from helpers import INDICATOR_TAG, create_indicator, log_error
+
+# -------------------- Rig Overview --------------------
+#
+# One row per rig with its link state, air and water readings, water levels
+# and which lights and pumps are on, so every rack can be watched at once.
+# Rows are added as rigs report in. Cells are painted through the GUI's
+# ViewModel, so an unchanged reading costs no Tk call. Clicking a row's
+# name switches the main view to that rig.
+
+COLUMNS = ("Rig", "Link", "Air", "Humidity", "Water 1", "Water 2", "Levels", "Lights", "Pumps")
+RELAY_PAIRS = (("Lights", "lights_top", "lights_bottom"), ("Pumps", "pump_top", "pump_bottom"))
+
+
+def _pair_text(frame, top, bottom):
+    return f"{'●' if frame.relay_on(top) else '○'} {'●' if frame.relay_on(bottom) else '○'}"
+
+
+class RigOverview:
+    def __init__(self, parent, view, on_select=None):
+        self.view = view
+        self.on_select = on_select
+        self.visible = False
+        self.frame = tk.Frame(parent, padx=10, pady=10)
+        for column, title in enumerate(COLUMNS):
+            tk.Label(self.frame, text=title, font=("Helvetica", 14, "bold")).grid(row=0, column=column, padx=6, sticky="w")
+        self.rows = {}  # rig -> {column: widget}
+
+    def _row(self, rig):
+        row = self.rows.get(rig)
+        if row is None:
+            index = len(self.rows) + 1
+            row = {}
+            for column, title in enumerate(COLUMNS):
+                if title == "Link":
+                    widget = tk.Canvas(self.frame, width=20, height=20, highlightthickness=0)
+                    create_indicator(widget)
+                elif title == "Rig":
+                    widget = tk.Button(self.frame, text=rig, font=("Helvetica", 14), relief="flat",
+                                       command=lambda rig=rig: self.on_select and self.on_select(rig))
+                else:
+                    widget = tk.Label(self.frame, text="--", font=("Helvetica", 14))
+                widget.grid(row=index, column=column, padx=6, pady=2, sticky="w")
+                row[title] = widget
+            self.rows[rig] = row
+        return row
+
+    def update(self, rig, event, value):
+        """Paint one controller event for rig (Tk thread); frames are merged by field group."""
+        row = self._row(rig)
+        view = self.view
+        if event == "connection":
+            view.set_item(row["Link"], INDICATOR_TAG, fill="green" if value else "red")
+            return
+        if event != "frame":
+            return
+        try:
+            frame = decode_frame(value)
+        except FrameError as e:
+            log_error(f"Overview: {e}: {value}")
+            return
+        if frame is None:
+            return
+        if frame.valid & HAS_RELAYS:
+            for title, top, bottom in RELAY_PAIRS:
+                view.set(row[title], text=_pair_text(frame, top, bottom))
+        if frame.valid & HAS_FLOATS:
+            air_color = "black" if frame.valid & AIR_OK else "red"
+            view.set(row["Air"], text=f"{format_value(frame.air_temp)} °C", fg=air_color)
+            view.set(row["Humidity"], text=f"{format_value(frame.humidity)} %", fg=air_color)
+            view.set(row["Water 1"], text=f"{format_value(frame.water_temp1)} °C")
+            view.set(row["Water 2"], text=f"{format_value(frame.water_temp2)} °C")
+            low = not (frame.float_top and frame.float_bottom)
+            levels = f"{'HIGH' if frame.float_top else 'LOW'} / {'HIGH' if frame.float_bottom else 'LOW'}"
+            view.set(row["Levels"], text=levels, fg="red" if low else "black")
+
+    # ---- showing ----
+
+    def show(self, **pack_options):
+        self.frame.pack(**pack_options)
+        self.visible = True
+
+    def hide(self):
+        self.visible = False
+        self.frame.pack_forget()
@@ -0,0 +1,205 @@
+import asyncio
+import os
+import re
+import threading
+from collections import namedtuple
+
+from alerts import ALERT_LOG_FILE, AlertEngine
+from connection_manager import ConnectionManager
+from controller import HydroController
+from helpers import LOG_DIR, log_error
+from history_store import HISTORY_DIR, HistoryStore
+from schedule_engine import SCHEDULE_FILE, ScheduleEngine
+from sensor_log import SensorLogWriter
+from state_snapshot import StateSnapshot, state_path
+
+# -------------------- Rig Registry --------------------
+#
+# One process can drive several racks, each with its own Arduino. rigs.txt
+# names them, one per line:
+#
+#   # rig id   serial port                                     [schedule file]
+#   rack1      /dev/serial/by-id/usb-Arduino_Uno_7543-if00
+#   rack2      /dev/serial/by-id/usb-1a86_USB_Serial-if00-port0  schedule_rack2.txt
+#
+# (/dev/serial/by-id names survive reboots and replugging; ttyACM numbers
+# do not.) Each rig gets its own HydroController: serial reactor, polling,
+# state, schedule and reconnects. Its logs and state snapshot go to
+# logs/<rig>/ and its history to history/<rig>/. All rigs share one
+# asyncio loop, and each rig's frame rate is capped (HydroController
+# max_frame_rate), so one noisy rig cannot starve the others.
+#
+# Without rigs.txt there is one rig, DEFAULT_RIG. Its port is found by
+# discovery and it logs to logs/ and history/ as before.
+#
+# Simulated rigs (--simulate) keep the same layout under sim/: readings,
+# history, state snapshot and alert log never mix with the real rack's.
+#
+# Listeners get (rig, event, value). send() and request() take the rig to
+# talk to and default to the first one.
+
+RIGS_FILE = "rigs.txt"
+DEFAULT_RIG = "main"
+RIG_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")  # Used as a directory name
+SIMULATION_DIR = "sim"  # Data root of simulated rigs
+
+RigConfig = namedtuple("RigConfig", "rig_id port schedule_path")
+
+
+class RigError(ValueError):
+    pass
+
+
+def parse_rigs(lines):
+    """Parse rigs.txt lines into RigConfig tuples."""
+    rigs = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split()
+        if len(parts) not in (2, 3):
+            raise RigError(f"Line {number}: expected RIG_ID PORT [SCHEDULE_FILE]")
+        rig_id = parts[0]
+        if not RIG_ID_PATTERN.match(rig_id):
+            raise RigError(f"Line {number}: rig id {rig_id!r} may only use letters, digits, _ and -")
+        if any(rig.rig_id == rig_id for rig in rigs):
+            raise RigError(f"Line {number}: rig {rig_id!r} is listed twice")
+        rigs.append(RigConfig(rig_id, parts[1], parts[2] if len(parts) == 3 else SCHEDULE_FILE))
+    return rigs
+
+
+def load_rigs(path=RIGS_FILE):
+    """Rigs from rigs.txt, or the single discovered DEFAULT_RIG if there is no such file."""
+    try:
+        with open(path) as f:
+            rigs = parse_rigs(f)
+    except FileNotFoundError:
+        return [RigConfig(DEFAULT_RIG, None, SCHEDULE_FILE)]
+    if not rigs:
+        raise RigError(f"{path} lists no rigs")
+    print(f"🗂 {len(rigs)} rigs in {path}: {', '.join(rig.rig_id for rig in rigs)}")
+    return rigs
+
+
+def rig_log_dir(rig_id, simulated=False):
+    root = os.path.join(SIMULATION_DIR, LOG_DIR) if simulated else LOG_DIR
+    return root if rig_id == DEFAULT_RIG else os.path.join(root, rig_id)
+
+
+def rig_history_dir(rig_id, simulated=False):
+    root = os.path.join(SIMULATION_DIR, HISTORY_DIR) if simulated else HISTORY_DIR
+    return root if rig_id == DEFAULT_RIG else os.path.join(root, rig_id)
+
+
+def build_controller(config, arduino=None, simulated=False, **options):
+    """A HydroController for one rig, with its own log partition and schedule."""
+    log_dir = rig_log_dir(config.rig_id, simulated)
+    os.makedirs(log_dir, exist_ok=True)
+    history = HistoryStore(rig_history_dir(config.rig_id, simulated))
+    if simulated:
+        # Simulated alerts are logged under sim/ and never reach webhooks or plugins
+        alerts = AlertEngine.from_config(config.rig_id, alert_log=os.path.join(SIMULATION_DIR, ALERT_LOG_FILE),
+                                         notify=False)
+    else:
+        alerts = AlertEngine.from_config(config.rig_id)
+    return HydroController(
+        arduino,
+        log_writer=SensorLogWriter(directory=log_dir, history=history),
+        schedule=ScheduleEngine(config.schedule_path),
+        connection=None if arduino else ConnectionManager(port=config.port),
+        state=StateSnapshot(state_path(log_dir)),
+        alerts=alerts,
+        **options,
+    )
+
+
+class RigRegistry:
+    def __init__(self, controllers, simulated=False):
+        """controllers: {rig id: HydroController}, in display order."""
+        if not controllers:
+            raise RigError("No rigs to run")
+        self.rigs = dict(controllers)
+        self.simulated = simulated  # Their data lives under SIMULATION_DIR
+        self.default_rig = next(iter(self.rigs))
+        self.loop = None
+        self._listeners = []
+        self._stopped = None
+        self._ready = threading.Event()
+        self._thread = None
+        for rig_id, controller in self.rigs.items():
+            controller.add_listener(lambda event, value, rig_id=rig_id: self._emit(rig_id, event, value))
+
+    @classmethod
+    def from_config(cls, configs, **options):
+        return cls({config.rig_id: build_controller(config, **options) for config in configs})
+
+    @property
+    def ids(self):
+        return list(self.rigs)
+
+    def controller(self, rig_id=None):
+        try:
+            return self.rigs[rig_id or self.default_rig]
+        except KeyError:
+            raise RigError(f"Unknown rig: {rig_id}") from None
+
+    # ---- listeners ----
+
+    def add_listener(self, callback):
+        """Call callback(rig, event, value) on the controller loop for every event of every rig."""
+        self._listeners.append(callback)
+        return callback
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def snapshot(self):
+        """(rig, event, value) for every rig, so a new front end can paint all of them at once."""
+        return [(rig_id, event, value) for rig_id, controller in self.rigs.items()
+                for event, value in controller.snapshot()]
+
+    def _emit(self, rig_id, event, value):
+        for callback in list(self._listeners):
+            try:
+                callback(rig_id, event, value)
+            except Exception as e:
+                log_error(f"Rig listener failed on {rig_id}/{event}: {e}")
+
+    # ---- commands ----
+
+    def send(self, command, rig=None):
+        """Fire-and-forget command to one rig; safe to call from any thread."""
+        self.controller(rig).send(command)
+
+    async def request(self, command, timeout=None, rig=None):
+        return await self.controller(rig).request(command, timeout)
+
+    # ---- lifecycle ----
+
+    def start_in_thread(self):
+        """Run every rig on one loop in a daemon thread (for use next to a GUI)."""
+        self._thread = threading.Thread(target=asyncio.run, args=(self.run(),), name="rigs", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+        return self
+
+    def stop(self):
+        """Stop every rig from any thread and wait for the loop to finish."""
+        if self.loop and self._stopped:
+            self.loop.call_soon_threadsafe(self._stopped.set)
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=10)
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        runs = [asyncio.create_task(controller.run()) for controller in self.rigs.values()]
+        self._ready.set()
+        try:
+            await self._stopped.wait()
+        finally:
+            for controller in self.rigs.values():
+                controller.stop()
+            await asyncio.gather(*runs, return_exceptions=True)
@@ -6,11 +6,14 @@ CODE_DIR="$(cd "$(dirname "$0")" && pwd)"  # Use current script's directory
 # Pull latest changes from Git
 echo "Updating local repository..."
 git -C "$CODE_DIR" stash push -m "Auto-stash before pull" >/dev/null 2>&1
-git -C "$CODE_DIR" pull
+timeout 20 git -C "$CODE_DIR" pull || echo "Could not update (offline?); starting with the current code."
 git -C "$CODE_DIR" stash pop >/dev/null 2>&1 || true
 VENV_DIR="$CODE_DIR/venv"                  # Path to the virtual environment
 REQUIREMENTS_FILE="$CODE_DIR/requirements.txt"
+REQUIREMENTS_STAMP="$VENV_DIR/.requirements.sha256"  # Hash of the last requirements installed
 SCRIPT_NAME="hydroponics_gui.py"           # Main Python script name
+DAEMON_NAME="hydro_daemon.py"              # Headless controller (serial, logging)
+DAEMON_LOG="$CODE_DIR/logs/controller.log"
 
 echo "==== Hydro Monitor Script ===="
 
@@ -30,25 +33,51 @@ fi
 echo "Activating virtual environment..."
 source "$VENV_DIR/bin/activate"
 
+# Install required packages, but only when requirements.txt (or the Python
+# version) changed since the last successful install: pip resolving every
+# package on each launch costs many seconds on the Pi
+if [ -f "$REQUIREMENTS_FILE" ]; then
+    REQUIREMENTS_HASH="$( (cat "$REQUIREMENTS_FILE"; python --version) | sha256sum | cut -d' ' -f1)"
+    if [ "$(cat "$REQUIREMENTS_STAMP" 2>/dev/null)" == "$REQUIREMENTS_HASH" ]; then
+        echo "Packages are up to date with requirements.txt."
+    else
+        echo "Installing required packages from requirements.txt..."
+        pip install --upgrade pip
+        pip install -r "$REQUIREMENTS_FILE" && echo "$REQUIREMENTS_HASH" > "$REQUIREMENTS_STAMP"
+    fi
+else
+    echo "No requirements.txt file found in $CODE_DIR. Skipping package installation."
+fi
+
+# Start the headless controller unless one is already running. It keeps
+# polling and logging even if the GUI is closed or crashes.
+mkdir -p "$CODE_DIR/logs"
+if pgrep -f "$CODE_DIR/$DAEMON_NAME" >/dev/null 2>&1; then
+    echo "Controller already running."
+else
+    echo "Starting the headless controller: $DAEMON_NAME..."
+    (cd "$CODE_DIR" && nohup python "$CODE_DIR/$DAEMON_NAME" >>"$DAEMON_LOG" 2>&1 &)
+    sleep 1
+fi
+
+# Pass --headless to run only the controller (no display needed)
+if [ "$1" == "--headless" ]; then
+    echo "Headless mode: controller log is $DAEMON_LOG"
+    deactivate
+    exit 0
+fi
+
 # Enable screen blanking after 10 minutes of inactivity
 export DISPLAY=:0
 xset s 600
 xset +dpms
 xset dpms 0 0 600
 
-# Install required packages
-if [ -f "$REQUIREMENTS_FILE" ]; then
-    echo "Installing required packages from requirements.txt..."
-    pip install --upgrade pip
-    pip install -r "$REQUIREMENTS_FILE"
-else
-    echo "No requirements.txt file found in $CODE_DIR. Skipping package installation."
-fi
-
-# Run the Python script
+# Run the GUI; it attaches to the controller over its local socket
 if [ -f "$CODE_DIR/$SCRIPT_NAME" ]; then
     echo "Running the main script: $SCRIPT_NAME..."
-    python "$CODE_DIR/$SCRIPT_NAME"
+    # Extra arguments reach the GUI, e.g. --profile-startup
+    (cd "$CODE_DIR" && python "$CODE_DIR/$SCRIPT_NAME" "$@")
 else
     echo "Error: $SCRIPT_NAME not found in $CODE_DIR."
     deactivate
@@ -0,0 +1,104 @@
+import argparse
+import struct
+
+from frames import crc16
+from schedule_engine import DEVICE_CODES, SCHEDULE_FILE, ScheduleEngine
+
+# -------------------- Schedule Compiler --------------------
+#
+# Turns the schedule engine's per-device timelines into the compact table
+# the sketch runs on its own (see runSchedule and handleScheduleBegin /
+# handleSchedulePart / handleScheduleEnd in the .ino), so editing
+# schedule.txt no longer needs a reflash:
+#
+#   version (1) | count (1) | count x [device (1), on minute (2), off minute (2)] | CRC-16 (2)
+#
+# Integers are little-endian, minutes count from midnight (0-1440) and the
+# CRC is frames.crc16 over everything before it. A full table is far
+# longer than the Uno's 64-byte serial receive buffer, so it goes over the
+# link in parts, each acknowledged before the next is sent:
+#
+#   SCHED_BEGIN:<length>       -> SCHED_READY:<length>
+#   SCHED_PART:<n>:<hex>       -> SCHED_PART_OK:<n>      (PART_BYTES bytes each)
+#   SCHED_END:<crc>            -> SCHED_OK:<crc>
+#
+# Any step can be answered with SCHED_ERR:<reason>; the host then starts
+# over from SCHED_BEGIN. On SCHED_END the sketch checks the CRC, stores the
+# table in EEPROM and echoes the CRC, which the host compares with its own
+# before trusting the upload. The sketch has minute resolution, so on-times
+# are rounded down and off-times up to the minute.
+
+SCHEDULE_VERSION = 1
+MAX_ENTRIES = 32  # Must match MAX_SCHEDULE_ENTRIES in the sketch
+PART_BYTES = 16  # Must match SCHEDULE_PART_BYTES; "SCHED_PART:10:" + 32 hex digits + newline is 47 bytes
+DEVICE_INDEX = {device: index for index, device in enumerate(DEVICE_CODES)}  # LT=0, LB=1, PT=2, PB=3
+
+_HEADER = struct.Struct("<BB")
+_ENTRY = struct.Struct("<BHH")
+_CRC = struct.Struct("<H")
+
+
+class ScheduleUploadError(Exception):
+    pass
+
+
+def compile_schedule(engine):
+    """Return the binary schedule table for the engine's current timelines."""
+    entries = []
+    for device, timeline in engine.timelines.items():
+        for start, end in zip(timeline.starts, timeline.ends):
+            entries.append((DEVICE_INDEX[device], int(start // 60), int(-(-end // 60))))
+    if len(entries) > MAX_ENTRIES:
+        raise ValueError(f"Schedule has {len(entries)} on-intervals; the Arduino holds at most {MAX_ENTRIES}")
+    body = _HEADER.pack(SCHEDULE_VERSION, len(entries)) + b"".join(_ENTRY.pack(*entry) for entry in entries)
+    return body + _CRC.pack(crc16(body))
+
+
+def table_crc(table):
+    (crc,) = _CRC.unpack_from(table, len(table) - _CRC.size)
+    return crc
+
+
+def upload_steps(table):
+    """[(command, expected reply)] that upload table, one receive-buffer-sized line at a time."""
+    steps = [(f"SCHED_BEGIN:{len(table)}", f"SCHED_READY:{len(table)}")]
+    for part, offset in enumerate(range(0, len(table), PART_BYTES)):
+        steps.append((f"SCHED_PART:{part}:{table[offset:offset + PART_BYTES].hex().upper()}",
+                      f"SCHED_PART_OK:{part}"))
+    crc = f"{table_crc(table):04X}"
+    steps.append((f"SCHED_END:{crc}", f"SCHED_OK:{crc}"))
+    return steps
+
+
+def check_reply(reply, expected):
+    """Raise ScheduleUploadError unless the sketch acknowledged a step as expected."""
+    if reply.strip() != expected:
+        raise ScheduleUploadError(f"Arduino answered {reply.strip()!r}, expected {expected!r}")
+
+
+def describe(table):
+    """Human-readable listing of a compiled table."""
+    names = list(DEVICE_CODES)
+    _, count = _HEADER.unpack_from(table)
+    lines = []
+    for index in range(count):
+        device, on, off = _ENTRY.unpack_from(table, _HEADER.size + index * _ENTRY.size)
+        lines.append(f"{names[device]} {on // 60:02d}:{on % 60:02d}-{off // 60:02d}:{off % 60:02d}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile schedule.txt into the Arduino's schedule table")
+    parser.add_argument("path", nargs="?", default=SCHEDULE_FILE)
+    args = parser.parse_args()
+
+    table = compile_schedule(ScheduleEngine(args.path))
+    for line in describe(table):
+        print(line)
+    print(f"{len(table)} bytes, CRC {table_crc(table):04X}")
+    for command, _ in upload_steps(table):
+        print(command)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import heapq
+import os
+import time
+from bisect import bisect_right
+from collections import namedtuple
+
+from helpers import log_error
+
+# -------------------- Schedule Engine --------------------
+#
+# Reads schedule.txt (DEVICE HH:MM DURATION DESCRIPTION, see the file's
+# header) into one timeline per device: the day's on-intervals, merged and
+# sorted, plus the seconds of the day at which the device actually changes
+# state. "Is PT on at 16:05?" is then a single bisect.
+#
+# The engine keeps one pending edge per device in a heap ordered by time,
+# so the controller sleeps until the earliest edge instead of checking every
+# second, and firing an edge only re-arms that one device. The file is
+# re-read when its mtime changes; the controller checks that at most every
+# reload_interval seconds.
+
+SCHEDULE_FILE = "schedule.txt"
+SECONDS_PER_DAY = 24 * 60 * 60
+
+DEVICE_CODES = {
+    "LT": "lights_top",
+    "LB": "lights_bottom",
+    "PT": "pump_top",
+    "PB": "pump_bottom",
+}
+
+ScheduleEntry = namedtuple("ScheduleEntry", "device start duration description")
+
+
+class ScheduleError(ValueError):
+    pass
+
+
+def parse_schedule(lines):
+    """Parse schedule lines into ScheduleEntry tuples (start in seconds after midnight)."""
+    entries = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split(None, 3)
+        if len(parts) < 3:
+            raise ScheduleError(f"Line {number}: expected DEVICE HH:MM DURATION [DESCRIPTION]")
+        device, start_text, duration_text = parts[:3]
+        if device not in DEVICE_CODES:
+            raise ScheduleError(f"Line {number}: unknown device {device!r}")
+        try:
+            hours, minutes = (int(field) for field in start_text.split(":"))
+            duration = int(duration_text)
+        except ValueError:
+            raise ScheduleError(f"Line {number}: bad start time or duration") from None
+        if not (0 <= hours < 24 and 0 <= minutes < 60):
+            raise ScheduleError(f"Line {number}: start time {start_text} out of range")
+        if not 0 < duration <= SECONDS_PER_DAY:
+            raise ScheduleError(f"Line {number}: duration must be 1-{SECONDS_PER_DAY} seconds")
+        description = parts[3] if len(parts) > 3 else ""
+        entries.append(ScheduleEntry(device, hours * 3600 + minutes * 60, duration, description))
+    return entries
+
+
+def seconds_of_day(timestamp):
+    t = time.localtime(timestamp)
+    return t.tm_hour * 3600 + t.tm_min * 60 + t.tm_sec + timestamp % 1
+
+
+class DeviceTimeline:
+    """Merged daily on-intervals for one device."""
+
+    def __init__(self, entries):
+        intervals = []
+        for entry in entries:
+            end = entry.start + entry.duration
+            if end > SECONDS_PER_DAY:
+                # Runs past midnight: split into tonight and tomorrow morning
+                intervals.append((entry.start, SECONDS_PER_DAY, entry.description))
+                intervals.append((0, end - SECONDS_PER_DAY, entry.description))
+            else:
+                intervals.append((entry.start, end, entry.description))
+        intervals.sort()
+
+        self.starts, self.ends, self.descriptions = [], [], []
+        for start, end, description in intervals:
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+                self.descriptions.append(description)
+
+        # Only keep edges where the state really flips (e.g. not 24:00 -> 00:00 of a wrapped interval)
+        candidates = sorted({edge % SECONDS_PER_DAY for edge in self.starts + self.ends})
+        self.edges = [edge for edge in candidates if self.is_on(edge) != self.is_on((edge - 1) % SECONDS_PER_DAY)]
+
+    def _interval_at(self, second):
+        index = bisect_right(self.starts, second) - 1
+        if index >= 0 and second < self.ends[index]:
+            return index
+        return None
+
+    def is_on(self, second):
+        return self._interval_at(second) is not None
+
+    def description_at(self, second):
+        index = self._interval_at(second)
+        return self.descriptions[index] if index is not None else ""
+
+    def seconds_until_change(self, second):
+        """Seconds from `second` (of the day) to the next state change, or None if it never changes."""
+        if not self.edges:
+            return None
+        index = bisect_right(self.edges, second)
+        if index < len(self.edges):
+            return self.edges[index] - second
+        return self.edges[0] + SECONDS_PER_DAY - second
+
+
+class ScheduleEngine:
+    def __init__(self, path=SCHEDULE_FILE, reload_interval=30.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.timelines = {}
+        self._mtime = None
+        self._heap = []  # (deadline, device code), one pending edge per device
+        self.load()
+
+    # ---- loading ----
+
+    def load(self):
+        """(Re)read the schedule file; on errors the previous schedule stays in force."""
+        try:
+            self._mtime = os.path.getmtime(self.path)
+            with open(self.path) as f:
+                entries = parse_schedule(f)
+        except FileNotFoundError:
+            print(f"ℹ No schedule file at {self.path}; following the Arduino's built-in schedule.")
+            self._mtime = None
+            return False
+        except (OSError, ScheduleError) as e:
+            log_error(f"Could not load schedule {self.path}: {e}")
+            print(f"⚠ Schedule not loaded: {e}")
+            return False
+        by_device = {}
+        for entry in entries:
+            by_device.setdefault(entry.device, []).append(entry)
+        self.timelines = {device: DeviceTimeline(by_device.get(device, ())) for device in DEVICE_CODES}
+        self._arm(time.time())
+        print(f"📅 Loaded {len(entries)} schedule entries from {self.path}")
+        return True
+
+    def reload_if_changed(self):
+        """Reload when the file's mtime changed; returns True if a new schedule was loaded."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        return self.load()
+
+    def _arm(self, now):
+        self._heap = []
+        second = seconds_of_day(now)
+        for device, timeline in self.timelines.items():
+            delay = timeline.seconds_until_change(second)
+            if delay is not None:
+                self._heap.append((now + delay, device))
+        heapq.heapify(self._heap)
+
+    # ---- queries ----
+
+    def desired_state(self, device, now=None):
+        timeline = self.timelines.get(device)
+        return bool(timeline) and timeline.is_on(seconds_of_day(time.time() if now is None else now))
+
+    def status(self, now=None):
+        """{device code: {"on", "next", "description"}} for every scheduled device."""
+        now = time.time() if now is None else now
+        second = seconds_of_day(now)
+        result = {}
+        for device, timeline in self.timelines.items():
+            delay = timeline.seconds_until_change(second)
+            result[device] = {
+                "on": timeline.is_on(second),
+                "next": None if delay is None else now + delay,
+                "description": timeline.description_at(second),
+            }
+        return result
+
+    def next_deadline(self):
+        """Epoch time of the earliest pending edge, or None."""
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now=None):
+        """Return [(device, on)] for every edge at or before now and re-arm those devices."""
+        now = time.time() if now is None else now
+        fired = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, device = heapq.heappop(self._heap)
+            timeline = self.timelines[device]
+            # Evaluate just after the edge so a slightly early wakeup still sees the new state
+            second = seconds_of_day(deadline) + 0.5
+            fired.append((device, timeline.is_on(second)))
+            delay = timeline.seconds_until_change(second)
+            if delay is not None:
+                heapq.heappush(self._heap, (deadline + 0.5 + delay, device))
+        return fired
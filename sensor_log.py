@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+from collections import deque
+from itertools import islice
+from datetime import date, datetime
+
+import metrics
+from frames import format_value
+from helpers import LOG_DIR, log_error
+
+# -------------------- Sensor Log Writer --------------------
+#
+# STATE readings are appended to an in-memory ring buffer and written to the
+# CSV by a background thread in batches, so the controller loop never does
+# file I/O and the SD card sees one write per batch instead of an
+# open/append/close per frame. The writer keeps the file open and tracks its
+# size itself, so rotation needs no stat() per frame.
+#
+# The CSV file is chosen per row from the row's own date, so a controller
+# running past midnight starts the next day's file on time. Past 5 MB a file
+# is rotated to a numbered sibling (sensor_log_2026-10-17_1.csv, _2, ...).
+# If the rename fails the writer keeps appending to the big file and only
+# tries again after ROTATE_RETRY_INTERVAL, so error_log.txt gets one line per
+# attempt rather than one per batch.
+# If a HistoryStore is attached, each batch is also appended to it.
+#
+# fsync policy:
+#   "always"   - fsync after every batch (safest, most SD wear)
+#   "interval" - fsync at most every fsync_interval seconds (default)
+#   "never"    - leave it to the OS
+
+SENSOR_LOG_HEADER = "timestamp,dht_temp,dht_humidity,water_temp1,water_temp2,ph_top,ec_top,ph_bottom,ec_bottom,float_top,float_bottom\n"
+MAX_LOG_BYTES = 5 * 1024 * 1024  # Rotate past 5 MB
+ROTATE_RETRY_INTERVAL = 600.0  # Seconds to wait after a failed rotation
+
+
+def format_log_row(timestamp, frame):
+    values = ",".join(format_value(v) for v in (
+        frame.air_temp, frame.humidity, frame.water_temp1, frame.water_temp2,
+        frame.ph_top, frame.ec_top, frame.ph_bottom, frame.ec_bottom,
+    ))
+    return f"{timestamp},{values},{int(frame.float_top)},{int(frame.float_bottom)}\n"
+
+
+def sensor_log_path(directory, day):
+    return os.path.join(directory, f"sensor_log_{day.isoformat()}.csv")
+
+
+class SensorLogWriter:
+    def __init__(self, directory=LOG_DIR, flush_lines=60, flush_interval=60.0,
+                 fsync="interval", fsync_interval=600.0, max_bytes=MAX_LOG_BYTES, capacity=10000,
+                 history=None):
+        if fsync not in ("always", "interval", "never"):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.directory = directory
+        self.history = history
+        self.path = None
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.dropped = 0  # Rows lost because the buffer filled before the disk caught up
+
+        self._buffer = deque(maxlen=capacity)
+        self._wakeup = threading.Condition()
+        self._file = None
+        self._day = None
+        self._size = 0
+        self._rotate_retry_at = 0.0
+        self._last_fsync = time.monotonic()
+        self._running = False
+        self._thread = None
+
+    # ---- producer side ----
+
+    def append(self, frame, timestamp=None):
+        """Queue one decoded STATE frame; never blocks on disk."""
+        with self._wakeup:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append((timestamp or datetime.now(), frame))
+            if len(self._buffer) >= self.flush_lines:
+                self._wakeup.notify()
+
+    def pending_rows(self):
+        return len(self._buffer)
+
+    # ---- lifecycle ----
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="sensor-log", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Flush everything still buffered, fsync and close the file."""
+        with self._wakeup:
+            self._running = False
+            self._wakeup.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.flush(force_fsync=True)
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    # ---- writer side ----
+
+    def _run(self):
+        if self.history:
+            # Segments left open by a previous run that ended before midnight
+            self.history.seal_before(date.today())
+        while True:
+            with self._wakeup:
+                if self._running and len(self._buffer) < self.flush_lines:
+                    self._wakeup.wait(self.flush_interval)
+                if not self._running:
+                    return
+            try:
+                self.flush()
+            except OSError as e:
+                log_error(f"Sensor log write failed: {e}")
+                time.sleep(1)
+
+    def flush(self, force_fsync=False):
+        with self._wakeup:
+            rows = list(self._buffer)
+            self._buffer.clear()
+        if not rows:
+            return
+        started = time.perf_counter() if metrics.enabled else 0.0
+        unwritten = deque(rows)
+        try:
+            self._write_csv(unwritten)
+        except OSError:
+            # Keep the rows not written for the next attempt; requeueing the rest would duplicate them
+            with self._wakeup:
+                self._buffer.extendleft(reversed(unwritten))
+            self._append_history(rows[:len(rows) - len(unwritten)])
+            raise
+        self._append_history(rows)
+        now = time.monotonic()
+        if self._file and (force_fsync or self.fsync == "always" or (
+                self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval)):
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+        if metrics.enabled:
+            metrics.LOG_FLUSH_SECONDS.observe(time.perf_counter() - started)
+
+    def _append_history(self, rows):
+        if self.history and rows:
+            try:
+                self.history.append_batch([t.timestamp() for t, _ in rows], [frame for _, frame in rows])
+            except Exception as e:
+                log_error(f"History store append failed: {e}")
+
+    def _write_csv(self, rows):
+        """Write and pop rows (a deque) from the left; on OSError, rows holds what was not written."""
+        # A batch can straddle midnight: each run of same-day rows goes to that day's file
+        while rows:
+            day = rows[0][0].date()
+            count = 1
+            while count < len(rows) and rows[count][0].date() == day:
+                count += 1
+            if day != self._day or self._file is None:
+                self._open(day)
+            data = "".join(format_log_row(t, frame) for t, frame in islice(rows, count))
+            if self._size + len(data) > self.max_bytes and time.monotonic() >= self._rotate_retry_at:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+            for _ in range(count):
+                rows.popleft()
+
+    def _open(self, day):
+        if self._file:
+            if self.fsync != "never":
+                os.fsync(self._file.fileno())
+            self._file.close()
+        self._day = day
+        self.path = sensor_log_path(self.directory, day)
+        self._file = open(self.path, "a")
+        self._size = self._file.tell()
+        if self._size == 0:
+            self._file.write(SENSOR_LOG_HEADER)
+            self._file.flush()
+            self._size = len(SENSOR_LOG_HEADER)
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None  # Reopened by the next write if even the reopen below fails
+        part = 1
+        while os.path.exists(self.path.replace(".csv", f"_{part}.csv")):
+            part += 1
+        try:
+            os.rename(self.path, self.path.replace(".csv", f"_{part}.csv"))
+        except OSError as e:
+            # Keep appending to the oversized file and back off before trying again
+            self._rotate_retry_at = time.monotonic() + ROTATE_RETRY_INTERVAL
+            log_error(f"Sensor log rotation failed, still writing to {self.path}: {e}")
+        self._open(self._day)
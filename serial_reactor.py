@@ -0,0 +1,383 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import metrics
+from frames import (
+    BINARY_OVERHEAD,
+    BINARY_PAYLOAD_SIZES,
+    BINARY_SYNC,
+    MAX_BINARY_PAYLOAD,
+    FrameError,
+    decode_binary,
+    frame_to_line,
+)
+from helpers import log_error
+
+# -------------------- Serial Reactor --------------------
+#
+# The reactor is the only thing allowed to touch the serial.Serial handle.
+# Commands are queued and written by a writer thread, a reader thread splits
+# the incoming byte stream into newline-terminated frames and hands each one
+# to the subscribers registered for its prefix. Subscribers are called from
+# the reader thread, so GUI code must hand frames over to the Tk thread
+# instead of touching widgets directly.
+#
+# request() adds request/response correlation on top of the frame stream:
+# each command is matched to its reply by prefix, so several requests can be
+# in flight at once and each gets its own timeout.
+
+# Reply prefix the sketch answers each command with
+REPLY_PREFIXES = {
+    "PING": "PING_OK",
+    "GET_RELAYS": "RELAYS:",
+    "GET_SENSORS": "SENSORS:",
+    "SET_TIME": "SET_TIME OK",
+    "SYNC_TIME": "SYNC_TIME OK",
+    "GET_TIME": "TIME:",
+    "RESET_SCHEDULE": "Schedule reset",
+    "LT": "Lights Top overridden",
+    "LB": "Lights Bottom overridden",
+    "PT": "Pump Top overridden",
+    "PB": "Pump Bottom overridden",
+    "PROTO": "PROTO_OK",
+    "SUB": "SUB_OK",
+    "SCHED_BEGIN": "SCHED_",  # SCHED_READY / SCHED_PART_OK / SCHED_OK, or SCHED_ERR:<reason>
+    "SCHED_PART": "SCHED_",
+    "SCHED_END": "SCHED_",
+    "SCHED_CLEAR": "SCHED_",
+}
+
+# Seconds to wait for each reply. The sketch handles one command per loop and
+# reads every sensor after each one, so pipelined requests queue up behind
+# roughly a second of work each.
+COMMAND_TIMEOUTS = {
+    "PING": 2.0,
+    "GET_RELAYS": 3.0,
+    "GET_SENSORS": 5.0,
+    "SCHED_END": 5.0,  # EEPROM writes take ~3 ms per byte
+}
+DEFAULT_TIMEOUT = 3.0
+
+UNKNOWN_COMMAND_PREFIX = "Unknown command: "
+BINARY_SYNC_BYTE = bytes((BINARY_SYNC,))
+
+
+def command_name(command):
+    """Return the command keyword, e.g. 'SET_TIME' for 'SET_TIME:12:00:00'."""
+    return command.strip().split(":", 1)[0]
+
+
+def _settle(future, result=None, error=None):
+    """Complete a request future, unless whoever awaited it has already cancelled it."""
+    if not future.set_running_or_notify_cancel():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class RequestTimeout(Exception):
+    pass
+
+
+class CommandRejected(Exception):
+    pass
+
+
+class SerialReactor:
+    def __init__(self, arduino, read_timeout=0.05, max_frame_length=512):
+        self.arduino = arduino
+        self.read_timeout = read_timeout
+        self.max_frame_length = max_frame_length
+        self.last_frame_time = 0.0
+        self.connected = arduino is not None
+        self.rejected_frames = 0
+
+        self._write_queue = queue.Queue()
+        self._subscribers = []
+        self._disconnect_callbacks = []
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+        self._resync = False
+        self._pending = {}  # reply prefix -> deque of (deadline, command, future)
+        self._next_deadline = None
+        self._running = False
+        self._threads = []
+
+    # ---- lifecycle ----
+
+    def start(self):
+        """Start the reader and writer threads. Returns self for chaining."""
+        if self._running or not self.arduino:
+            return self
+        self.arduino.timeout = self.read_timeout
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._read_loop, name="serial-reader", daemon=True),
+            threading.Thread(target=self._write_loop, name="serial-writer", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def close(self):
+        """Stop the I/O threads and close the port."""
+        self._running = False
+        self._write_queue.put(None)  # Wake the writer
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=1)
+        self._threads = []
+        if self.arduino:
+            try:
+                self.arduino.close()
+            except Exception as e:
+                log_error(f"Error closing serial port: {e}")
+        self.connected = False
+
+    @property
+    def is_open(self):
+        return self.connected and bool(self.arduino) and self.arduino.is_open
+
+    # ---- subscriptions ----
+
+    def subscribe(self, callback, prefix=None):
+        """Call callback(frame) for every frame starting with prefix (all frames if None)."""
+        with self._lock:
+            self._subscribers = self._subscribers + [(prefix, callback)]
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [(p, cb) for p, cb in self._subscribers if cb is not callback]
+
+    def on_disconnect(self, callback):
+        """Call callback() once if the port fails."""
+        with self._lock:
+            self._disconnect_callbacks.append(callback)
+        return callback
+
+    # ---- requests ----
+
+    def request(self, command, timeout=None):
+        """Send a command and return a Future resolved with its reply frame.
+
+        Replies are matched by prefix in FIFO order, so it is safe to issue
+        several requests before waiting on any of them.
+        """
+        command = command.strip()
+        name = command_name(command)
+        prefix = REPLY_PREFIXES.get(name)
+        future = Future()
+        if prefix is None:
+            future.set_exception(ValueError(f"No known reply for command: {command}"))
+            return future
+        if not self.is_open:
+            future.set_exception(ConnectionError("Arduino is not connected"))
+            return future
+        if timeout is None:
+            timeout = COMMAND_TIMEOUTS.get(name, DEFAULT_TIMEOUT)
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._pending.setdefault(prefix, deque()).append((deadline, command, future))
+            if self._next_deadline is None or deadline < self._next_deadline:
+                self._next_deadline = deadline
+        self.send(command)
+        return future
+
+    def queued_count(self):
+        """Writes waiting for the writer thread."""
+        return self._write_queue.qsize()
+
+    def pending_count(self):
+        with self._lock:
+            return sum(len(waiting) for waiting in self._pending.values())
+
+    def _resolve(self, frame):
+        """Hand a reply frame to the oldest request waiting for it."""
+        if frame.startswith(UNKNOWN_COMMAND_PREFIX):
+            rejected = frame[len(UNKNOWN_COMMAND_PREFIX):]
+            prefix = REPLY_PREFIXES.get(command_name(rejected))
+            with self._lock:
+                waiting = self._pending.get(prefix)
+                entry = waiting.popleft() if waiting else None
+            if entry:
+                _settle(entry[2], error=CommandRejected(frame))
+            return
+        for prefix in REPLY_PREFIXES.values():
+            if frame.startswith(prefix):
+                with self._lock:
+                    waiting = self._pending.get(prefix)
+                    entry = waiting.popleft() if waiting else None
+                if entry:
+                    _settle(entry[2], frame)
+                return
+
+    def _expire_requests(self, now):
+        with self._lock:
+            if self._next_deadline is None or now < self._next_deadline:
+                return
+            expired = []
+            next_deadline = None
+            for waiting in self._pending.values():
+                while waiting and waiting[0][0] <= now:
+                    expired.append(waiting.popleft())
+                if waiting and (next_deadline is None or waiting[0][0] < next_deadline):
+                    next_deadline = waiting[0][0]
+            self._next_deadline = next_deadline
+        for _, command, future in expired:
+            _settle(future, error=RequestTimeout(f"No reply to {command}"))
+
+    def _fail_pending(self, error):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._next_deadline = None
+        for waiting in pending.values():
+            for _, _, future in waiting:
+                _settle(future, error=error)
+
+    # ---- writing ----
+
+    def write(self, data):
+        """Queue raw bytes for the writer thread (same call shape as serial.Serial.write)."""
+        if isinstance(data, str):
+            data = data.encode()
+        self._write_queue.put(data)
+        return len(data)
+
+    def send(self, command):
+        """Queue a text command, adding the trailing newline if missing."""
+        if not command.endswith("\n"):
+            command += "\n"
+        return self.write(command)
+
+    def _write_loop(self):
+        while self._running:
+            data = self._write_queue.get()
+            if data is None or not self._running:
+                continue
+            try:
+                self.arduino.write(data)
+            except Exception as e:
+                self._handle_failure(f"Error writing to Arduino: {e}")
+                return
+            if metrics.enabled:
+                metrics.SERIAL_BYTES_OUT.inc(len(data))
+
+    # ---- reading ----
+
+    def _read_loop(self):
+        while self._running:
+            try:
+                chunk = self.arduino.read(max(1, self.arduino.in_waiting))
+            except Exception as e:
+                self._handle_failure(f"Error reading from Arduino: {e}")
+                return
+            if chunk:
+                if metrics.enabled:
+                    metrics.SERIAL_BYTES_IN.inc(len(chunk))
+                self.feed(chunk)
+            if self._next_deadline is not None:
+                self._expire_requests(time.monotonic())
+
+    def feed(self, chunk):
+        """Split raw bytes into frames and dispatch every complete one.
+
+        Text lines and binary frames (see frames.py) may be interleaved;
+        binary frames are checked and rendered back to their text form so
+        subscribers see one format either way.
+        """
+        buffer = self._buffer
+        buffer += chunk
+        while buffer:
+            if buffer[0] == BINARY_SYNC:
+                if len(buffer) < 2:
+                    break
+                length = buffer[1]
+                # A header no frame could have is a stray sync byte; waiting for its
+                # "payload" would hold back every line behind it
+                if length > MAX_BINARY_PAYLOAD:
+                    self._reject_binary(f"{length}-byte payload is longer than any frame")
+                    continue
+                if len(buffer) > 2 and BINARY_PAYLOAD_SIZES.get(buffer[2]) != length:
+                    self._reject_binary(f"no frame of type {buffer[2]:#x} has a {length}-byte payload")
+                    continue
+                total = BINARY_OVERHEAD + length
+                if len(buffer) < total:
+                    break
+                try:
+                    frame = decode_binary(bytes(buffer[:total]))
+                except FrameError as e:
+                    self._reject_binary(e)
+                    continue
+                del buffer[:total]
+                self._resync = False
+                self._dispatch(frame_to_line(frame))
+                continue
+
+            end = buffer.find(b"\n")
+            sync = buffer.find(BINARY_SYNC_BYTE)
+            if sync > 0 and (end < 0 or sync < end):
+                # A binary frame starts before this line ends: the bytes before it are noise
+                del buffer[:sync]
+                self._resync = False
+                continue
+            if end < 0:
+                break
+            raw = bytes(buffer[:end])
+            del buffer[:end + 1]
+            frame = raw.decode("ascii", "replace").strip()
+            if self._resync or not raw.isascii() or not frame.isprintable():
+                # Remains of a corrupted frame; the sketch only prints printable ASCII text
+                self._resync = False
+                self.rejected_frames += 1
+                if metrics.enabled:
+                    metrics.FRAMES_REJECTED.inc()
+                continue
+            if frame:
+                self._dispatch(frame)
+        if len(buffer) > self.max_frame_length:
+            # No newline for far too long: the stream is garbage, resync on the next one
+            log_error(f"Discarding {len(buffer)} unframed bytes from Arduino")
+            buffer.clear()
+
+    def _reject_binary(self, reason):
+        # Drop the sync byte and whatever follows up to the next frame or line
+        self.rejected_frames += 1
+        if metrics.enabled:
+            metrics.FRAMES_REJECTED.inc()
+        log_error(f"Rejected binary frame from Arduino: {reason}")
+        del self._buffer[:1]
+        self._resync = True
+
+    def _dispatch(self, frame):
+        self.last_frame_time = time.time()
+        if self._pending:
+            self._resolve(frame)
+        for prefix, callback in self._subscribers:
+            if prefix is None or frame.startswith(prefix):
+                try:
+                    callback(frame)
+                except Exception as e:
+                    log_error(f"Serial subscriber failed on '{frame}': {e}")
+
+    def _handle_failure(self, message):
+        if not self._running:
+            return
+        self._running = False
+        self.connected = False
+        log_error(message)
+        print(f"⚠ {message}")
+        self._write_queue.put(None)
+        self._fail_pending(ConnectionError(message))
+        with self._lock:
+            callbacks, self._disconnect_callbacks = self._disconnect_callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                log_error(f"Disconnect callback failed: {e}")
@@ -0,0 +1,730 @@
+import argparse
+import math
+import os
+import random
+import struct
+import threading
+import time
+from collections import deque
+
+from frames import (
+    BINARY_RELAYS,
+    BINARY_SENSORS,
+    BINARY_STATE,
+    BINARY_SYNC,
+    SUB_AIR,
+    SUB_ALL,
+    SUB_FLOATS,
+    SUB_RELAYS,
+    SUB_WATER,
+    crc16,
+)
+from schedule_compiler import MAX_ENTRIES, PART_BYTES, SCHEDULE_VERSION
+
+# -------------------- Arduino Simulator --------------------
+#
+# A pure-Python stand-in for the Arduino running
+# FullSensorMonitoringAndRelayControl.ino, with the interface of
+# serial.Serial (read, write, in_waiting, timeout, is_open, close), so the
+# SerialReactor, the controller and everything behind them run unchanged
+# without hardware. A thread plays the sketch's loop():
+#
+#   - the clock ticks every second (optionally drifting) and the built-in
+#     or uploaded schedule drives lights and pumps, with 10-minute overrides;
+#   - every command in the protocol is answered the way the sketch does,
+#     including the STATE frame that follows each one (except schedule
+#     upload parts) and the ~0.75 s the sketch spends reading sensors for it;
+#   - STATE every 10 s, or DELTA lines and heartbeats after SUB;
+#   - PROTO:BIN switches data frames to binary, schedule uploads arrive in
+#     acknowledged parts and are CRC-checked, and the sketch's 64-byte
+#     receive buffer overflows while it is busy, just like the real one.
+#
+# Sensor readings follow configurable Waveforms (a sine plus noise). The
+# link itself is modelled too: replies are paced at the baud rate and
+# delayed by latency and jitter, and Faults drops or corrupts a fraction
+# of lines in either direction.
+#
+# The same object can be served on a pty (--pty), so tools that open a
+# real port (hydro_daemon.py --port, connection_manager) can be exercised
+# too. Run without --pty, this module load-tests the host's serial stack.
+
+RELAY_ORDER = ("LT", "LB", "PT", "PB", "ST", "SB", "DR")  # Bit order of the relay frames
+OVERRIDE_NAMES = {"LT": "Lights Top", "LB": "Lights Bottom", "PT": "Pump Top", "PB": "Pump Bottom"}
+OVERRIDE_MS = 600000
+RX_BUFFER = 64  # Bytes the Arduino's serial receive buffer holds
+READ_STRING_TIMEOUT = 1.0  # Serial.readStringUntil gives up on a partial line after this long
+PH_EC = (-1, 100, -2, 200)  # lastMeasuredPh/Ec defaults; the sketch no longer measures them
+
+_TABLE_ENTRY = struct.Struct("<BHH")
+
+
+class Waveform:
+    """mean + amplitude * sin(2π t / period + phase) + Gaussian noise."""
+
+    def __init__(self, mean, amplitude=0.0, period=86400.0, noise=0.0, phase=0.0):
+        self.mean = mean
+        self.amplitude = amplitude
+        self.period = period
+        self.noise = noise
+        self.phase = phase
+
+    def sample(self, t, rng):
+        value = self.mean + self.amplitude * math.sin(2 * math.pi * t / self.period + self.phase)
+        return value + rng.gauss(0.0, self.noise) if self.noise else value
+
+
+def default_waveforms(period=86400.0):
+    # Warmest and driest mid-afternoon, water lagging the air
+    return {
+        "air_temp": Waveform(22.0, 3.0, period, noise=0.3, phase=-math.pi / 2),
+        "humidity": Waveform(60.0, 10.0, period, noise=1.0, phase=math.pi / 2),
+        "water_temp1": Waveform(19.5, 0.8, period, noise=0.05, phase=-2.0),
+        "water_temp2": Waveform(20.0, 0.8, period, noise=0.05, phase=-2.0),
+    }
+
+
+class Faults:
+    """Link impairments. Rates are per line (per write from the host)."""
+
+    def __init__(self, latency=0.0, jitter=0.0, drop_rate=0.0, corrupt_rate=0.0,
+                 sensor_failure_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate            # Lose a run of bytes from the line
+        self.corrupt_rate = corrupt_rate      # Flip one bit in the line
+        self.sensor_failure_rate = sensor_failure_rate  # DHT read returns NaN (-1 on the wire)
+
+    def apply(self, data, rng, stats):
+        """Return data as it arrives at the other end."""
+        if self.drop_rate and rng.random() < self.drop_rate:
+            start = rng.randrange(len(data))
+            data = data[:start] + data[start + rng.randint(1, 8):]
+            stats["dropped"] += 1
+        if data and self.corrupt_rate and rng.random() < self.corrupt_rate:
+            index = rng.randrange(len(data))
+            data = data[:index] + bytes((data[index] ^ 1 << rng.randrange(8),)) + data[index + 1:]
+            stats["corrupted"] += 1
+        return data
+
+    def delay(self, rng):
+        return self.latency + (rng.uniform(0.0, self.jitter) if self.jitter else 0.0)
+
+
+class SimulatedArduino:
+    def __init__(self, port="sim://arduino", baudrate=9600, timeout=None, waveforms=None, faults=None,
+                 sensor_delay=0.75, boot_delay=2.0, drift_ppm=0.0, float_flip_rate=0.0, seed=None,
+                 start_open=True):
+        self.port = port
+        self.baudrate = baudrate  # Replies are paced at this rate; 0 delivers them instantly
+        self.timeout = timeout
+        self.dtr = True
+        self.waveforms = waveforms or default_waveforms()
+        self.faults = faults or Faults()
+        self.sensor_delay = sensor_delay  # DS18B20 conversion + DHT read per STATE/SENSORS frame
+        self.boot_delay = boot_delay      # setup()'s delay(2000) after a reset
+        self.drift_ppm = drift_ppm        # Crystal error of the simulated millis()
+        self.float_flip_rate = float_flip_rate  # Chance per second that a float switch flips
+        self.rng = random.Random(seed)
+        self.stats = dict.fromkeys(("commands", "lines", "bytes", "dropped", "corrupted", "overflowed"), 0)
+
+        self._cond = threading.Condition()
+        self._input = bytearray()
+        self._input_since = None
+        self._output = deque()  # (delivery time, bytes) in delivery order
+        self._received = bytearray()
+        self._wire_free = 0.0
+        self._busy = False
+        self._thread = None
+        self._running = False
+        self._booted = False
+        self._reset_sketch()
+        if start_open:
+            self.open()
+
+    # ---- serial.Serial interface ----
+
+    @property
+    def is_open(self):
+        return self._running
+
+    def open(self):
+        if self._running:
+            return
+        # Opening with DTR high resets the board; a board that never ran boots either way
+        if self.dtr or not self._booted:
+            self._reset_sketch()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="simulated-arduino", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    @property
+    def in_waiting(self):
+        with self._cond:
+            self._collect(time.monotonic())
+            return len(self._received)
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if not self._running:
+                    raise OSError("Simulated Arduino is closed")
+                now = time.monotonic()
+                self._collect(now)
+                if self._received:
+                    data = bytes(self._received[:size])
+                    del self._received[:size]
+                    return data
+                if deadline is not None and now >= deadline:
+                    return b""
+                wait = deadline - now if deadline is not None else None
+                if self._output:
+                    pending = self._output[0][0] - now
+                    wait = pending if wait is None else min(wait, pending)
+                self._cond.wait(wait)
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        with self._cond:
+            if not self._running:
+                raise OSError("Simulated Arduino is closed")
+            arrived = self.faults.apply(data, self.rng, self.stats)
+            if self._busy and RX_BUFFER:
+                room = max(0, RX_BUFFER - len(self._input))
+                if len(arrived) > room:
+                    self.stats["overflowed"] += len(arrived) - room
+                    arrived = arrived[:room]
+            self._input += arrived
+            self._cond.notify_all()
+        return len(data)
+
+    def reset_input_buffer(self):
+        with self._cond:
+            self._collect(time.monotonic())
+            self._received.clear()
+
+    def flush(self):
+        pass
+
+    # ---- link model ----
+
+    def _collect(self, now):
+        while self._output and self._output[0][0] <= now:
+            self._received += self._output.popleft()[1]
+
+    def _send(self, data):
+        """Put bytes on the wire towards the host (Serial.print)."""
+        if isinstance(data, str):
+            data = data.encode()
+        with self._cond:
+            self.stats["lines"] += 1
+            self.stats["bytes"] += len(data)
+            data = self.faults.apply(data, self.rng, self.stats)
+            if not data:
+                return
+            now = time.monotonic()
+            start = max(now + self.faults.delay(self.rng), self._wire_free)
+            # 10 bits per byte on the wire (start, 8 data, stop)
+            self._wire_free = start + (len(data) * 10 / self.baudrate if self.baudrate else 0.0)
+            self._output.append((self._wire_free, data))
+            self._cond.notify_all()
+
+    def _println(self, text):
+        self._send(text + "\r\n")
+
+    def _pause(self, seconds):
+        """Block the sketch (delay() / slow sensor reads); returns False once closed."""
+        if seconds <= 0:
+            return self._running
+        deadline = time.monotonic() + seconds
+        with self._cond:
+            self._busy = True
+            while self._running and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            self._busy = False
+        return self._running
+
+    # ---- sketch state ----
+
+    def _reset_sketch(self):
+        self._boot_time = time.monotonic()
+        self._booted = False
+        self.hours = self.minutes = self.seconds = 0
+        self.relays = dict.fromkeys(RELAY_ORDER, 0)
+        self.float_top = self.float_bottom = 1
+        self.override_active = False
+        self.override_end = 0
+        self.binary_mode = False
+        self.schedule_table = None  # EEPROM survives a reset in the real board; keep it simple
+        self._upload = None  # Schedule table being received part by part
+        self._upload_received = 0
+        self.sub_mask = 0
+        self.sub_deadbands = (5, 20, 20)
+        self.sub_heartbeat = 60000
+        self._last_millis = 0
+        self._last_state = 0
+        self._last_full_state = 0
+        self._last_sub_sample = 0
+        self._sent = (0, 0, 0, 0, 0, 0)
+
+    def millis(self):
+        return int((time.monotonic() - self._boot_time) * 1000 * (1 + self.drift_ppm / 1e6))
+
+    def relay_bits(self):
+        return sum(self.relays[name] << bit for bit, name in enumerate(RELAY_ORDER))
+
+    def _read_air(self):
+        if self.rng.random() < self.faults.sensor_failure_rate:
+            return -1, -1
+        now = time.time()
+        return int(self.waveforms["air_temp"].sample(now, self.rng)), int(self.waveforms["humidity"].sample(now, self.rng))
+
+    def _read_water(self):
+        now = time.time()
+        # DS18B20 resolution is 1/16 °C; Serial.print(float) shows two decimals
+        return tuple(round(self.waveforms[name].sample(now, self.rng) * 16) / 16 for name in ("water_temp1", "water_temp2"))
+
+    # ---- loop() ----
+
+    def _run(self):
+        if not self._booted:
+            if not self._pause(self.boot_delay):
+                return
+            self._booted = True
+            self._println("Arduino is ready. Default time: 00:00. Running schedule.")
+        while self._running:
+            now = self.millis()
+            while now - self._last_millis >= 1000:
+                self._last_millis += 1000
+                self._tick()
+            if self.sub_mask:
+                self._push_telemetry(now)
+            elif now - self._last_state >= 10000:
+                self._last_state = now
+                self._send_state()
+            if self.override_active and self.millis() >= self.override_end:
+                self.override_active = False
+                self._println("Override expired. Resuming schedule.")
+                self._run_schedule()
+            command = self._next_command()
+            if command is not None:
+                self.stats["commands"] += 1
+                self._handle_command(command)
+                if not command.startswith(("SCHED_BEGIN", "SCHED_PART")):
+                    self._send_state()
+            else:
+                with self._cond:
+                    if self._running and not self._input:
+                        self._cond.wait(0.02)
+
+    def _next_command(self):
+        with self._cond:
+            end = self._input.find(b"\n")
+            if end < 0:
+                if not self._input:
+                    self._input_since = None
+                    return None
+                # readStringUntil returns a partial line once its timeout passes
+                if self._input_since is None:
+                    self._input_since = time.monotonic()
+                if time.monotonic() - self._input_since < READ_STRING_TIMEOUT:
+                    return None
+                end = len(self._input)
+            raw = bytes(self._input[:end])
+            del self._input[:end + 1]
+            self._input_since = None
+        return raw.decode("latin-1").strip()
+
+    def _tick(self):
+        self.seconds += 1
+        if self.seconds >= 60:
+            self.seconds = 0
+            self.minutes += 1
+            if self.minutes >= 60:
+                self.minutes = 0
+                self.hours = (self.hours + 1) % 24
+        if self.float_flip_rate and self.rng.random() < self.float_flip_rate:
+            if self.rng.random() < 0.5:
+                self.float_top ^= 1
+            else:
+                self.float_bottom ^= 1
+        if not self.override_active:
+            self._run_schedule()
+
+    def _run_schedule(self):
+        if self.override_active:
+            return
+        if self.schedule_table is not None:
+            minute = self.hours * 60 + self.minutes
+            on = [False] * 4
+            for device, on_minute, off_minute in self.schedule_table:
+                if on_minute <= minute < off_minute:
+                    on[device] = True
+            for device, state in zip(("LT", "LB", "PT", "PB"), on):
+                self.relays[device] = int(state)
+            return
+        lights = 7 <= self.hours < 19
+        pumps = lights and self.minutes < 2 and self.hours in (7, 9, 11, 13, 15, 17)
+        self.relays["LT"] = self.relays["LB"] = int(lights)
+        self.relays["PT"] = self.relays["PB"] = int(pumps)
+
+    # ---- frames ----
+
+    def _send_binary(self, frame_type, payload):
+        body = bytes((frame_type,)) + payload
+        self._send(bytes((BINARY_SYNC, len(payload))) + body + struct.pack("<H", crc16(body)))
+
+    def _send_state(self):
+        if not self._pause(self.sensor_delay):
+            return
+        water1, water2 = self._read_water()
+        temp, humid = self._read_air()
+        floats = self.float_top | self.float_bottom << 1
+        self._sent = (self.relay_bits(), floats, temp * 10, humid * 10, round(water1 * 100), round(water2 * 100))
+        self._last_full_state = self.millis()
+        if self.binary_mode:
+            self._send_binary(BINARY_STATE, struct.pack("<BBhhhhhhhh", *self._sent, *PH_EC))
+            return
+        relays = ",".join(str(self.relays[name]) for name in RELAY_ORDER)
+        ph_ec = ",".join(map(str, PH_EC))
+        self._println(f"STATE:{relays},{self.float_top},{self.float_bottom},{temp},{humid},"
+                      f"{water1:.2f},{water2:.2f},{ph_ec}")
+
+    def _send_relays(self):
+        if self.binary_mode:
+            self._send_binary(BINARY_RELAYS, bytes((self.relay_bits(),)))
+            return
+        self._println("RELAYS:" + ",".join(str(self.relays[name]) for name in RELAY_ORDER))
+
+    def _send_sensors(self):
+        if not self._pause(self.sensor_delay):
+            return
+        water1, water2 = self._read_water()
+        temp, humid = self._read_air()
+        if self.binary_mode:
+            floats = self.float_top | self.float_bottom << 1
+            payload = struct.pack("<Bhhhh", floats, temp * 10, humid * 10, round(water1 * 100), round(water2 * 100))
+            self._send_binary(BINARY_SENSORS, payload)
+            return
+        self._println(f"SENSORS:{temp},{humid},{water1:.2f},{water2:.2f},{self.float_top},{self.float_bottom}")
+
+    def _push_telemetry(self, now):
+        if now - self._last_full_state >= self.sub_heartbeat:
+            self._send_state()
+            return
+        relays, floats, temp, humid, water1, water2 = self._sent
+        delta = []
+        if self.sub_mask & SUB_RELAYS and self.relay_bits() != relays:
+            relays = self.relay_bits()
+            delta.append(f"R={relays}")
+        current_floats = self.float_top | self.float_bottom << 1
+        if self.sub_mask & SUB_FLOATS and current_floats != floats:
+            floats = current_floats
+            delta.append(f"F={floats}")
+        if self.sub_mask & (SUB_AIR | SUB_WATER) and now - self._last_sub_sample >= 5000:
+            self._last_sub_sample = now
+            air_deadband, humid_deadband, water_deadband = self.sub_deadbands
+            if self.sub_mask & SUB_AIR:
+                new_temp, new_humid = self._read_air()
+                if abs(new_temp * 10 - temp) >= air_deadband:
+                    temp = new_temp * 10
+                    delta.append(f"T={new_temp}")
+                if abs(new_humid * 10 - humid) >= humid_deadband:
+                    humid = new_humid * 10
+                    delta.append(f"H={new_humid}")
+            if self.sub_mask & SUB_WATER:
+                if not self._pause(self.sensor_delay):
+                    return
+                new_water1, new_water2 = self._read_water()
+                if abs(round(new_water1 * 100) - water1) >= water_deadband:
+                    water1 = round(new_water1 * 100)
+                    delta.append(f"W1={new_water1:.2f}")
+                if abs(round(new_water2 * 100) - water2) >= water_deadband:
+                    water2 = round(new_water2 * 100)
+                    delta.append(f"W2={new_water2:.2f}")
+        self._sent = (relays, floats, temp, humid, water1, water2)
+        if delta:
+            self._println("DELTA:" + ",".join(delta))
+
+    # ---- commands ----
+
+    def _handle_command(self, command):
+        if command == "PING":
+            self._println("PING_OK")
+        elif command.startswith("SET_TIME:"):
+            self._set_time(command[9:], resume_schedule=True)
+            self._println("SET_TIME OK")
+            self._send_state()
+        elif command.startswith("SYNC_TIME:"):
+            self._set_time(command[10:], resume_schedule=False)
+            self._println("SYNC_TIME OK")
+        elif command == "GET_TIME":
+            # Count seconds the loop has not caught up with yet, as the sketch does
+            now = self.millis()
+            while now - self._last_millis >= 1000:
+                self._last_millis += 1000
+                self._tick()
+            millis = now - self._last_millis
+            self._println(f"TIME:{self.hours:02d}:{self.minutes:02d}:{self.seconds:02d}.{millis:03d}")
+        elif command == "RESET_SCHEDULE":
+            self._println("Schedule reset. Resuming automatic control.")
+            self.override_active = False
+            self._run_schedule()
+            self._send_state()
+        elif command[:3] in ("LT:", "LB:", "PT:", "PB:"):
+            self._override(command[:2], command[3:])
+        elif command.startswith("SCHED_BEGIN:"):
+            self._begin_upload(command[12:])
+        elif command.startswith("SCHED_PART:"):
+            self._upload_part(command[11:])
+        elif command.startswith("SCHED_END:"):
+            self._end_upload(command[10:])
+        elif command == "SCHED_CLEAR":
+            self.schedule_table = None
+            self._println("SCHED_OK:BUILTIN")
+            self._run_schedule()
+        elif command.startswith("SUB:"):
+            self._subscribe(command[4:])
+        elif command == "PROTO:BIN":
+            self._println("PROTO_OK:BIN")
+            self.binary_mode = True
+        elif command == "PROTO:TEXT":
+            self.binary_mode = False
+            self._println("PROTO_OK:TEXT")
+        elif command == "GET_RELAYS":
+            self._send_relays()
+        elif command == "GET_SENSORS":
+            self._send_sensors()
+        else:
+            self._println("Unknown command: " + command)
+
+    def _set_time(self, text, resume_schedule):
+        clock, _, fraction = text.partition(".")
+        parts = clock.split(":")
+        if len(parts) != 3 or not parts[0]:
+            self._println("Invalid time format!")
+            return
+        self.hours, self.minutes, self.seconds = (_to_int(part) for part in parts)
+        self._last_millis = self.millis() - _to_int(fraction)
+        self._println(f"Time set to: {self.hours}:{self.minutes}:{self.seconds}")
+        if resume_schedule:
+            self.override_active = False
+        self._run_schedule()
+
+    def _override(self, device, state):
+        name = OVERRIDE_NAMES[device]
+        if state in ("ON", "OFF"):
+            self.relays[device] = int(state == "ON")
+            self.override_active = True
+            self.override_end = self.millis() + OVERRIDE_MS
+            self._println(f"{name} overridden to {state}.")
+        else:
+            self._println(f"Invalid state for {name}: {state}")
+        self._send_state()
+
+    def _begin_upload(self, text):
+        length = _to_int(text)
+        if not 4 <= length <= 4 + MAX_ENTRIES * _TABLE_ENTRY.size:
+            self._upload = None
+            self._println("SCHED_ERR:LENGTH")
+            return
+        self._upload = bytearray(length)
+        self._upload_received = 0
+        self._println(f"SCHED_READY:{length}")
+
+    def _upload_part(self, text):
+        number, _, text = text.partition(":")
+        if self._upload is None or not number:
+            self._println("SCHED_ERR:SEQUENCE")
+            return
+        part = _to_int(number)
+        offset = part * PART_BYTES
+        if (offset < 0 or len(text) % 2 or not 0 < len(text) // 2 <= PART_BYTES
+                or offset + len(text) // 2 > len(self._upload)):
+            self._println("SCHED_ERR:LENGTH")
+            return
+        if offset > self._upload_received:
+            self._println("SCHED_ERR:SEQUENCE")  # A part went missing
+            return
+        try:
+            data = bytes.fromhex(text)
+        except ValueError:
+            self._println("SCHED_ERR:HEX")
+            return
+        self._upload[offset:offset + len(data)] = data
+        self._upload_received = max(self._upload_received, offset + len(data))
+        self._println(f"SCHED_PART_OK:{part}")
+
+    def _end_upload(self, crc):
+        table, self._upload = self._upload, None
+        if table is None or self._upload_received != len(table):
+            self._println("SCHED_ERR:SEQUENCE")
+            return
+        version, count = table[0], table[1]
+        if (version != SCHEDULE_VERSION or count > MAX_ENTRIES
+                or len(table) != 4 + count * _TABLE_ENTRY.size
+                or crc16(table[:-2]) != struct.unpack_from("<H", table, len(table) - 2)[0]
+                or crc.upper() != f"{table[-1]:02X}{table[-2]:02X}"):
+            self._println("SCHED_ERR:CRC")
+            return
+        self.schedule_table = [
+            (device & 0x03, on, off)
+            for device, on, off in (_TABLE_ENTRY.unpack_from(table, 2 + i * _TABLE_ENTRY.size) for i in range(count))
+        ]
+        self._println(f"SCHED_OK:{table[-1]:02X}{table[-2]:02X}")
+        self._run_schedule()
+
+    def _subscribe(self, args):
+        if args == "OFF":
+            self.sub_mask = 0
+            self._println("SUB_OK:OFF")
+            return
+        values = args.split(",")
+        if len(values) != 5:
+            self._println("Invalid subscription: " + args)
+            return
+        mask, air, humid, water, heartbeat = (_to_int(value) for value in values)
+        self.sub_mask = mask & SUB_ALL
+        self.sub_deadbands = (air, humid, water)
+        self.sub_heartbeat = max(heartbeat, 5) * 1000
+        self._println("SUB_OK")
+
+
+def _to_int(text):
+    """Arduino String.toInt(): leading digits, 0 if there are none."""
+    digits = ""
+    for char in text.strip():
+        if not char.isdigit() and not (char == "-" and not digits):
+            break
+        digits += char
+    try:
+        return int(digits)
+    except ValueError:
+        return 0
+
+
+# -------------------- Harnesses --------------------
+
+
+def serve_pty(arduino):
+    """Expose a SimulatedArduino on a pseudo-terminal; returns the path to open."""
+    import tty
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    path = os.ttyname(slave)
+    arduino.timeout = 0.05
+
+    def to_host():
+        while arduino.is_open:
+            try:
+                data = arduino.read(max(1, arduino.in_waiting))
+            except OSError:
+                return
+            if data:
+                os.write(master, data)
+
+    def from_host():
+        while arduino.is_open:
+            try:
+                data = os.read(master, 1024)
+            except OSError:
+                return
+            arduino.write(data)
+
+    for target in (to_host, from_host):
+        threading.Thread(target=target, daemon=True).start()
+    return path
+
+
+def load_test(arduino, requests, inflight, commands):
+    """Drive a SerialReactor on the simulator; returns (latencies, failures by type, reactor)."""
+    from concurrent.futures import wait
+    from serial_reactor import SerialReactor
+
+    reactor = SerialReactor(arduino).start()
+    latencies = []
+    failures = {}
+    sent = {}
+    pending = set()
+
+    def finished(future):
+        try:
+            future.result()
+            latencies.append(time.perf_counter() - sent.pop(future))
+        except Exception as e:
+            sent.pop(future, None)
+            failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+
+    for index in range(requests):
+        while len(pending) >= inflight:
+            done, pending = wait(pending, return_when="FIRST_COMPLETED")
+        future = reactor.request(commands[index % len(commands)])
+        sent[future] = time.perf_counter()
+        future.add_done_callback(finished)
+        pending.add(future)
+    wait(pending)
+    reactor.close()
+    return latencies, failures, reactor
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated Arduino: load-test the serial stack or serve a pty")
+    parser.add_argument("--pty", action="store_true", help="Serve the simulator on a pseudo-terminal until Ctrl-C")
+    parser.add_argument("--requests", type=int, default=200, help="Requests to send in the load test")
+    parser.add_argument("--inflight", type=int, default=1, help="Requests kept in flight at once")
+    parser.add_argument("--commands", default="PING,GET_RELAYS,GET_SENSORS", help="Comma-separated commands to cycle")
+    parser.add_argument("--fast", action="store_true", help="No sensor delay, no baud-rate pacing")
+    parser.add_argument("--binary", action="store_true", help="Switch the simulator to binary data frames first")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--drop", type=float, default=0.0, help="Fraction of lines losing bytes")
+    parser.add_argument("--corrupt", type=float, default=0.0, help="Fraction of lines with a flipped bit")
+    parser.add_argument("--sensor-failures", type=float, default=0.0, help="Fraction of failed DHT reads")
+    parser.add_argument("--drift", type=float, default=0.0, help="Clock error in ppm")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    faults = Faults(args.latency, args.jitter, args.drop, args.corrupt, args.sensor_failures)
+    arduino = SimulatedArduino(
+        baudrate=0 if args.fast else 9600, faults=faults, sensor_delay=0.0 if args.fast else 0.75,
+        boot_delay=0.0, drift_ppm=args.drift, seed=args.seed,
+    )
+    arduino.binary_mode = args.binary
+
+    if args.pty:
+        print(f"🧪 Simulated Arduino on {serve_pty(arduino)} (Ctrl-C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            arduino.close()
+        return
+
+    started = time.perf_counter()
+    latencies, failures, reactor = load_test(arduino, args.requests, args.inflight, args.commands.split(","))
+    elapsed = time.perf_counter() - started
+    print(f"{args.requests} requests in {elapsed:.2f} s ({args.requests / elapsed:.1f}/s)")
+    if latencies:
+        print("latency  p50 {:.1f} ms  p95 {:.1f} ms  p99 {:.1f} ms  max {:.1f} ms".format(
+            *(percentile(latencies, f) * 1000 for f in (0.5, 0.95, 0.99)), max(latencies) * 1000))
+    print(f"failed   {sum(failures.values())} {failures or ''}")
+    print(f"rejected frames {reactor.rejected_frames}")
+    print("simulator " + ", ".join(f"{key} {value}" for key, value in arduino.stats.items()))
+
+
+if __name__ == "__main__":
+    main()
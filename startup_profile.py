@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+
+# -------------------- Startup Profile --------------------
+#
+#   python hydroponics_gui.py --profile-startup
+#
+# Shows where launch time goes on the Pi. It reports:
+#   - the interpreter start plus top-level imports, up to main();
+#   - each startup phase the GUI marks (window, controller, widgets,
+#     first frame painted);
+#   - the slowest imports of the GUI module, measured in a child
+#     process with `python -X importtime` so they do not slow the
+#     launch being profiled;
+#   - which heavy packages the launch actually loaded.
+
+HEAVY_MODULES = ("numpy", "pandas", "matplotlib", "serial", "asyncio", "http.server")
+
+
+def process_age():
+    """Seconds since the OS started this process (Linux only; None elsewhere)."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])  # Field 22: starttime
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 0.0)
+
+
+def import_times(module):
+    """[(name, self µs, cumulative µs, depth)] from `python -X importtime -c "import module"`."""
+    import subprocess
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # Two spaces of indent per level
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def direct_imports(rows, module):
+    """The rows imported directly by module; -X importtime lists them just before it."""
+    names = [row[0] for row in rows]
+    if module not in names:
+        return []
+    end = len(names) - 1 - names[::-1].index(module)
+    children = []
+    for row in reversed(rows[:end]):
+        if row[3] == 0:
+            break  # The previous top-level import (e.g. site)
+        if row[3] == 1:
+            children.append(row)
+    return children
+
+
+class StartupProfile:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.before_main = process_age() if enabled else None
+        self.phases = []  # (name, seconds since the previous mark)
+        self.reported = False
+        self._last = time.perf_counter()
+
+    def mark(self, name):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def report(self, module="hydroponics_gui", top=10):
+        """Print the breakdown once; later calls do nothing."""
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        print("⏱ Startup profile")
+        total = 0.0
+        if self.before_main is not None:
+            total = self.before_main
+            print(f"  {'interpreter + imports':<28}{total * 1000:>8.0f} ms")
+        for name, seconds in self.phases:
+            total += seconds
+            print(f"  {name:<28}{seconds * 1000:>8.0f} ms")
+        print(f"  {'total':<28}{total * 1000:>8.0f} ms")
+
+        loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+        print(f"  heavy modules loaded: {', '.join(loaded) or 'none'}")
+
+        rows = direct_imports(import_times(module), module)
+        if rows:
+            print(f"  slowest imports of {module} (cumulative, fresh process):")
+            for name, _, cumulative_us, _ in sorted(rows, key=lambda row: -row[2])[:top]:
+                print(f"    {name:<26}{cumulative_us / 1000:>8.1f} ms")
@@ -0,0 +1,55 @@
+import json
+import os
+import time
+
+from helpers import LOG_DIR, log_error
+
+# -------------------- State Snapshot --------------------
+#
+# The controller's last known state: the newest STATE/RELAYS/SENSORS
+# frames and the manual overrides it sent with their expiry times. It is
+# kept in logs/state.json (logs/<rig>/state.json with several rigs; under
+# sim/ for simulated rigs) so a restarted controller shows real readings
+# at once and knows which overrides should still be in force.
+#
+# A snapshot is written to a temporary file next to the real one, synced
+# and renamed over it. A power cut mid-write leaves the old snapshot, not a
+# truncated one.
+
+STATE_FILE = "state.json"
+VERSION = 1
+
+
+def state_path(log_dir=LOG_DIR):
+    return os.path.join(log_dir, STATE_FILE)
+
+
+class StateSnapshot:
+    def __init__(self, path=None):
+        self.path = path or state_path()
+
+    def load(self):
+        """The saved state as a dict, or {} if there is none or it cannot be read."""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log_error(f"Ignoring unreadable state snapshot {self.path}: {e}")
+            return {}
+        if not isinstance(state, dict) or state.get("version") != VERSION:
+            return {}
+        return state
+
+    def save(self, state):
+        """Atomically replace the snapshot with state (a JSON-serialisable dict)."""
+        state = dict(state, version=VERSION, saved=time.time())
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
@@ -0,0 +1,12 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The modules create logs/ and history/ in the working directory when imported
+_workdir = tempfile.mkdtemp(prefix="hydro-tests-")
+os.chdir(_workdir)
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
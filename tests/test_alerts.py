@@ -0,0 +1,43 @@
+from alerts import AlertEngine, parse_alerts
+from frames import decode_frame
+
+STATE = "STATE:0,0,0,0,0,0,0,1,1,20,68,18.75,19.19,-1,100,-2,200"
+
+
+def stale_engine(rule="air_sensor air_temp stale 60"):
+    rules, _ = parse_alerts([rule])
+    engine = AlertEngine(rules, "test")
+    events = []
+    engine.add_listener(events.append)
+    return engine, events
+
+
+def test_stale_rule_raises_exactly_at_its_deadline():
+    engine, events = stale_engine()
+    engine.start(100.0)
+    engine.tick(160.0)  # Used to reschedule itself at 160.0 forever
+    assert [event.state for event in events] == ["raised"]
+    assert engine.next_deadline() is None
+
+
+def test_stale_rule_counts_from_the_last_reading():
+    engine, events = stale_engine()
+    engine.start(100.0)
+    engine.observe(decode_frame(STATE), 130.0)
+    engine.tick(160.0)
+    assert events == []
+    assert engine.next_deadline() == 190.0
+    engine.tick(190.0)
+    assert [event.state for event in events] == ["raised"]
+    engine.observe(decode_frame(STATE), 200.0)
+    assert [event.state for event in events] == ["raised", "cleared"]
+    assert engine.next_deadline() == 260.0
+
+
+def test_debounced_stale_rule_raises_after_its_delay():
+    engine, events = stale_engine("air_sensor air_temp stale 60 for=30")
+    engine.start(100.0)
+    engine.tick(160.0)
+    assert events == [] and engine.next_deadline() == 190.0
+    engine.tick(190.0)
+    assert [event.state for event in events] == ["raised"]
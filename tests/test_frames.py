@@ -0,0 +1,99 @@
+import math
+
+import pytest
+
+from frames import (
+    AIR_OK,
+    HAS_FLOATS,
+    HAS_PH_EC,
+    HAS_RELAYS,
+    RELAY_NAMES,
+    WATER1_OK,
+    WATER2_OK,
+    FrameError,
+    apply_delta,
+    decode_frame,
+    frame_to_line,
+)
+
+STATE = "STATE:1,0,1,0,0,0,1,1,0,21.5,60,18.75,19.19,612,1450,598,1380"
+ALL_OK = HAS_RELAYS | HAS_FLOATS | AIR_OK | WATER1_OK | WATER2_OK | HAS_PH_EC
+
+
+def test_state_line():
+    frame = decode_frame(STATE)
+    assert frame.kind == "STATE"
+    assert frame.relays == 0b1000101  # Bit 0 = first relay
+    assert (frame.float_top, frame.float_bottom) == (True, False)
+    assert (frame.air_temp, frame.humidity, frame.water_temp1, frame.water_temp2) == (21.5, 60.0, 18.75, 19.19)
+    assert (frame.ph_top, frame.ec_top, frame.ph_bottom, frame.ec_bottom) == (612, 1450, 598, 1380)
+    assert frame.valid == ALL_OK
+    assert frame_to_line(frame) == STATE
+
+
+def test_relay_bitmask():
+    frame = decode_frame("RELAYS:0,1,0,0,0,0,1")
+    assert frame.kind == "RELAYS" and frame.valid == HAS_RELAYS
+    assert [name for name in RELAY_NAMES if frame.relay_on(name)] == ["lights_bottom", "drain"]
+    assert decode_frame("RELAYS:1,1,1,1,1,1,1").relays == 0x7F
+    assert decode_frame("RELAYS:0,0,0,0,0,0,0\r").relays == 0
+
+
+def test_sensors_line():
+    frame = decode_frame("SENSORS:22.1,55.5,18.5,18.6,0,1")
+    assert frame.kind == "SENSORS" and frame.relays == 0
+    assert (frame.float_top, frame.float_bottom) == (False, True)
+    assert frame.valid == HAS_FLOATS | AIR_OK | WATER1_OK | WATER2_OK
+    assert not frame.has(HAS_RELAYS)
+
+
+def test_failed_sensors_clear_their_flags():
+    # The sketch sends -1 for a failed DHT or DS18B20; a failed float read prints "nan"
+    frame = decode_frame("SENSORS:-1,55.5,-1,18.6,1,1")
+    assert frame.valid == HAS_FLOATS | WATER2_OK
+    frame = decode_frame("STATE:0,0,0,0,0,0,0,1,1,21.5,nan,18.75,nan,-1,100,-2,200")
+    assert math.isnan(frame.humidity)
+    assert frame.valid == HAS_RELAYS | HAS_FLOATS | WATER1_OK | HAS_PH_EC
+
+
+@pytest.mark.parametrize("line", [
+    "STATE:1,0,1,0,0,0,1,1,0,21.5,60,18.75,19.19,612,1450,598",  # Truncated
+    "STATE:1,0,1,0,0,0,1,1,0,21.5,6x,18.75,19.19,612,1450,598,1380",
+    "STATE:1,0,2,0,0,0,1,1,0,21.5,60,18.75,19.19,612,1450,598,1380",
+    "RELAYS:1,0,1",
+    "RELAYS:1,0,1,0,0,0,10",
+    "SENSORS:22.1,55.5,18.5",
+    "SENSORS:22.1,,18.5,18.6,0,1",
+])
+def test_corrupted_lines_raise(line):
+    with pytest.raises(FrameError):
+        decode_frame(line)
+
+
+def test_non_data_lines_are_not_frames():
+    assert decode_frame("PING_OK") is None
+    assert decode_frame("Time set to: 12:0:0") is None
+
+
+def test_delta_merges_into_state():
+    base = decode_frame(STATE)
+    frame = apply_delta(base, "DELTA:R=3,F=2,T=23,W2=20.5")
+    assert frame is not base and base.air_temp == 21.5  # The base is left alone
+    assert frame.relays == 3
+    assert (frame.float_top, frame.float_bottom) == (False, True)
+    assert (frame.air_temp, frame.humidity, frame.water_temp1, frame.water_temp2) == (23.0, 60.0, 18.75, 20.5)
+    assert frame.ec_bottom == 1380
+    assert frame_to_line(frame) == "STATE:1,1,0,0,0,0,0,0,1,23,60,18.75,20.5,612,1450,598,1380"
+
+
+def test_delta_updates_flags():
+    frame = apply_delta(decode_frame(STATE), "DELTA:W1=-1")
+    assert frame.valid == ALL_OK & ~WATER1_OK
+    assert apply_delta(frame, "DELTA:W1=18.5").valid == ALL_OK
+    assert frame_to_line(apply_delta(frame, "DELTA:")) == frame_to_line(frame)
+
+
+@pytest.mark.parametrize("line", ["DELTA:X=1", "DELTA:T=warm", "DELTA:R=1.5"])
+def test_bad_delta_raises(line):
+    with pytest.raises(FrameError):
+        apply_delta(decode_frame(STATE), line)
@@ -0,0 +1,46 @@
+import os
+from datetime import datetime
+
+import numpy as np
+
+from history import CsvTimeIndex, downsample
+from sensor_log import SENSOR_LOG_HEADER
+
+NAN = float("nan")
+
+
+def test_downsample_min_mean_max_per_bucket():
+    buckets = downsample(np.array([0.0, 10, 20, 60, 70]), np.array([1.0, 2, 6, 4, 8]), 0, 180, 60)
+    assert list(buckets.count) == [3, 2, 0]
+    assert list(buckets.min[:2]) == [1, 4] and list(buckets.max[:2]) == [6, 8]
+    assert list(buckets.mean[:2]) == [3, 6]
+    assert np.isnan(buckets.mean[2])
+
+
+def test_downsample_mean_skips_failed_readings():
+    timestamps = np.array([0.0, 10, 20, 60, 70])
+    buckets = downsample(timestamps, np.array([6.0, NAN, 7, NAN, NAN]), 0, 120, 60)
+    assert buckets.mean[0] == 6.5
+    assert (buckets.min[0], buckets.max[0]) == (6, 7)
+    assert np.isnan(buckets.mean[1]) and np.isnan(buckets.min[1])  # Nothing valid to average
+
+
+def write_log(path, *timestamps):
+    with open(path, "w") as f:
+        f.write(SENSOR_LOG_HEADER)
+        for timestamp in timestamps:
+            f.write(f"{timestamp},21.0,60.0,18.5,18.5,6.1,1.4,6.0,1.4,1,1\n")
+
+
+def test_index_starts_over_when_the_file_is_replaced_by_a_larger_one(tmp_path):
+    path = str(tmp_path / "sensor_log_2026-10-17.csv")
+    write_log(path, "2026-10-17T12:00:00")
+    index = CsvTimeIndex(path)
+    index.refresh()
+    # Rotated and already past the old size before the next refresh
+    os.rename(path, path.replace(".csv", "_1.csv"))
+    write_log(path, "2026-10-17T13:00:00", "2026-10-17T13:00:01")
+    index.refresh()
+    assert index.times == [datetime(2026, 10, 17, 13, 0).timestamp()]
+    times, _ = index.read("air_temp", 0, 2e9)
+    assert len(times) == 2
@@ -0,0 +1,48 @@
+import time
+
+from alerts import AlertEngine
+from controller import HydroController
+from history_store import HistoryStore
+from schedule_compiler import MAX_ENTRIES, compile_schedule, upload_steps
+from schedule_engine import ScheduleEngine
+from sensor_log import SensorLogWriter
+from simulator import RX_BUFFER, SimulatedArduino
+from state_snapshot import StateSnapshot
+
+
+def full_schedule(tmp_path):
+    """A schedule.txt with MAX_ENTRIES pump runs: the largest table the sketch takes."""
+    path = tmp_path / "schedule.txt"
+    path.write_text("".join(f"PT {minute // 60:02d}:{minute % 60:02d} 600 run {minute}\n"
+                            for minute in range(0, MAX_ENTRIES * 45, 45)))
+    return ScheduleEngine(str(path))
+
+
+def test_parts_fit_the_receive_buffer(tmp_path):
+    table = compile_schedule(full_schedule(tmp_path))
+    steps = upload_steps(table)
+    assert all(len(command) + 1 <= 48 < RX_BUFFER for command, _ in steps)
+    assert b"".join(bytes.fromhex(command.split(":")[2]) for command, _ in steps[1:-1]) == table
+
+
+def test_controller_uploads_full_schedule_to_simulator(tmp_path):
+    arduino = SimulatedArduino(boot_delay=0.1, seed=1)
+    controller = HydroController(
+        arduino,
+        relay_interval=0.2,  # Keep polls coming while the upload runs
+        log_writer=SensorLogWriter(directory=str(tmp_path), history=HistoryStore(str(tmp_path / "history"))),
+        schedule=full_schedule(tmp_path),
+        state=StateSnapshot(str(tmp_path / "state.json")),
+        alerts=AlertEngine([], "test"),
+    )
+    controller.start_in_thread()
+    try:
+        deadline = time.monotonic() + 20
+        while arduino.schedule_table is None and time.monotonic() < deadline:
+            time.sleep(0.1)
+    finally:
+        controller.stop()
+        arduino.close()
+    assert arduino.schedule_table is not None and len(arduino.schedule_table) == MAX_ENTRIES
+    assert arduino.schedule_table[1] == (2, 45, 55)  # PT 00:45 for 10 minutes
+    assert arduino.stats["overflowed"] == 0
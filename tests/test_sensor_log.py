@@ -0,0 +1,44 @@
+import os
+from datetime import datetime, timedelta
+
+import sensor_log
+from frames import decode_frame
+from sensor_log import SensorLogWriter
+
+STATE = decode_frame("STATE:1,0,1,0,0,0,1,1,0,21.5,60,18.75,19.19,612,1450,598,1380")
+
+
+def write_batches(writer, count, start=datetime(2026, 10, 17, 12, 0)):
+    for n in range(count):
+        writer.append(STATE, start + timedelta(seconds=n))
+        writer.flush()
+
+
+def test_rotates_past_max_bytes(tmp_path):
+    writer = SensorLogWriter(str(tmp_path), max_bytes=500)
+    write_batches(writer, 20)
+    writer.close()
+    names = sorted(os.listdir(tmp_path))
+    assert "sensor_log_2026-10-17.csv" in names and "sensor_log_2026-10-17_1.csv" in names
+    assert all(os.path.getsize(tmp_path / name) <= 500 for name in names)
+
+
+def test_failed_rotation_backs_off(tmp_path, monkeypatch):
+    errors = []
+
+    def failing_rename(src, dst):
+        raise PermissionError("file in use")
+
+    monkeypatch.setattr(sensor_log, "log_error", errors.append)
+    monkeypatch.setattr(os, "rename", failing_rename)
+    writer = SensorLogWriter(str(tmp_path), max_bytes=500)
+    write_batches(writer, 50)
+    assert len(errors) == 1  # Not one per batch
+    assert os.listdir(tmp_path) == ["sensor_log_2026-10-17.csv"]
+    lines = (tmp_path / "sensor_log_2026-10-17.csv").read_text().splitlines()
+    assert len(lines) == 51  # Nothing lost while the file could not be rotated
+
+    writer._rotate_retry_at = 0.0  # Retry interval over
+    write_batches(writer, 1, datetime(2026, 10, 17, 13, 0))
+    assert len(errors) == 2
+    writer.close()
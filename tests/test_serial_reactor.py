@@ -0,0 +1,172 @@
+import queue
+import struct
+import time
+
+import pytest
+
+from frames import BINARY_SYNC, crc16, decode_frame, encode_binary
+from serial_reactor import CommandRejected, RequestTimeout, SerialReactor
+
+STATE = "STATE:1,0,1,0,0,0,0,1,1,20,68,18.75,19.19,-1,100,-2,200"
+RELAYS = "RELAYS:0,1,0,0,0,0,1"
+
+
+def feed_reactor():
+    reactor = SerialReactor(None)
+    frames = []
+    reactor.subscribe(frames.append)
+    return reactor, frames
+
+
+def binary(line):
+    return encode_binary(decode_frame(line))
+
+
+# ---- feed() ----
+
+def test_good_binary_frame():
+    reactor, frames = feed_reactor()
+    reactor.feed(binary(STATE) + binary(RELAYS))
+    assert frames == [STATE, RELAYS]
+    assert reactor.rejected_frames == 0
+
+
+def test_bad_crc_is_rejected_and_the_next_line_gets_through():
+    reactor, frames = feed_reactor()
+    frame = bytearray(binary(STATE))
+    frame[5] ^= 0xFF
+    reactor.feed(bytes(frame) + b"\nPING_OK\n")
+    assert frames == ["PING_OK"]
+    assert reactor.rejected_frames >= 1
+
+
+def test_impossible_length_does_not_hold_back_later_lines():
+    reactor, frames = feed_reactor()
+    reactor.feed(bytes((BINARY_SYNC, 0xF0)) + b"\n" + RELAYS.encode() + b"\n")
+    assert frames == [RELAYS]
+
+
+def test_wrong_type_for_length_is_rejected_at_once():
+    reactor, frames = feed_reactor()
+    # A RELAYS frame has a 1-byte payload; claim 10 and nothing else arrives yet
+    reactor.feed(bytes((BINARY_SYNC, 10, 0x02)))
+    reactor.feed(b"x\nPING_OK\n")
+    assert frames == ["PING_OK"]
+    # Right length, CRC over the wrong type: still not a frame
+    body = bytes((0x03,)) + b"\x01"
+    reactor.feed(bytes((BINARY_SYNC, 1)) + body + struct.pack("<H", crc16(body)) + b"\nPING_OK\n")
+    assert frames == ["PING_OK", "PING_OK"]
+
+
+def test_stray_sync_byte_inside_a_text_line():
+    reactor, frames = feed_reactor()
+    reactor.feed(b"PING_\xa5OK\n" + RELAYS.encode() + b"\n")
+    # The damaged line is dropped; the next one is not held back
+    assert frames == [RELAYS]
+
+
+def test_text_and_binary_interleaved_across_chunks():
+    reactor, frames = feed_reactor()
+    stream = b"PING_OK\r\n" + binary(STATE) + RELAYS.encode() + b"\r\n" + binary(RELAYS) + b"SYNC_TIME OK\r\n"
+    for index in range(len(stream)):
+        reactor.feed(stream[index:index + 1])
+    assert frames == ["PING_OK", STATE, RELAYS, RELAYS, "SYNC_TIME OK"]
+    assert reactor.rejected_frames == 0
+
+
+# ---- request() ----
+
+class FakePort:
+    """Just enough of serial.Serial: the test plays the sketch with reply()."""
+
+    def __init__(self):
+        self.is_open = True
+        self.timeout = None
+        self.in_waiting = 0
+        self.written = queue.Queue()
+        self._incoming = queue.Queue()
+
+    def read(self, size):
+        try:
+            return self._incoming.get(timeout=self.timeout)
+        except queue.Empty:
+            return b""
+
+    def write(self, data):
+        self.written.put(data.decode().strip())
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+
+    def reply(self, *lines):
+        self._incoming.put("".join(f"{line}\r\n" for line in lines).encode())
+
+    def commands(self, count):
+        return [self.written.get(timeout=1) for _ in range(count)]
+
+
+@pytest.fixture
+def link():
+    port = FakePort()
+    reactor = SerialReactor(port).start()
+    yield port, reactor
+    reactor.close()
+
+
+def test_replies_match_requests_in_order(link):
+    port, reactor = link
+    first, ping, second = reactor.request("GET_RELAYS"), reactor.request("PING"), reactor.request("GET_RELAYS")
+    assert port.commands(3) == ["GET_RELAYS", "PING", "GET_RELAYS"]
+    port.reply("RELAYS:1,0,0,0,0,0,0", "STATE:ignored", "PING_OK", "RELAYS:0,1,0,0,0,0,0")
+    assert first.result(1) == "RELAYS:1,0,0,0,0,0,0"
+    assert ping.result(1) == "PING_OK"
+    assert second.result(1) == "RELAYS:0,1,0,0,0,0,0"
+    assert reactor.pending_count() == 0
+
+
+def test_commands_sharing_a_reply_prefix_resolve_in_order(link):
+    port, reactor = link
+    begin, part = reactor.request("SCHED_BEGIN:74"), reactor.request("SCHED_PART:0:00")
+    port.reply("SCHED_READY:74", "SCHED_PART_OK:0")
+    assert (begin.result(1), part.result(1)) == ("SCHED_READY:74", "SCHED_PART_OK:0")
+
+
+def test_unknown_command_rejects_only_its_request(link):
+    port, reactor = link
+    relays, sync = reactor.request("GET_RELAYS"), reactor.request("SYNC_TIME:12:00:00.000")
+    port.reply("Unknown command: SYNC_TIME:12:00:00.000", "RELAYS:0,0,0,0,0,0,0")
+    with pytest.raises(CommandRejected):
+        sync.result(1)
+    assert relays.result(1) == "RELAYS:0,0,0,0,0,0,0"
+
+
+def test_unanswered_request_times_out(link):
+    port, reactor = link
+    started = time.monotonic()
+    slow, ping = reactor.request("GET_SENSORS", timeout=0.2), reactor.request("PING", timeout=5)
+    with pytest.raises(RequestTimeout):
+        slow.result(2)
+    assert time.monotonic() - started < 1.0
+    assert not ping.done()  # Its own deadline has not passed
+    port.reply("SENSORS:20,60,18,18,1,1")  # Too late: nobody is waiting for it any more
+    port.reply("PING_OK")
+    assert ping.result(1) == "PING_OK"
+
+
+def test_cancelled_request_does_not_stop_the_reader(link):
+    port, reactor = link
+    reactor.request("PING", timeout=0.05).cancel()
+    time.sleep(0.2)  # Expires while cancelled
+    ping = reactor.request("PING")
+    port.reply("PING_OK")
+    assert ping.result(1) == "PING_OK"
+
+
+def test_requests_that_cannot_be_sent_fail_at_once(link):
+    port, reactor = link
+    with pytest.raises(ValueError):
+        reactor.request("NO_SUCH_COMMAND").result(0)
+    reactor.close()
+    with pytest.raises(ConnectionError):
+        reactor.request("PING").result(0)
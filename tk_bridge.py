@@ -0,0 +1,72 @@
+import threading
+import time
+
+import metrics
+
+# -------------------- Tk Bridge --------------------
+#
+# Tkinter is not thread-safe, so nothing outside the Tk thread may touch a
+# widget. Background code posts UI updates here instead; a single after()
+# loop on the Tk thread drains them in one batch. Updates are keyed, and a
+# newer update replaces an older one with the same key that has not been
+# painted yet, so a burst of frames costs one repaint. Flush hooks run once
+# after every non-empty batch (see view_model.ViewModel).
+
+
+class TkBridge:
+    def __init__(self, root, interval_ms=50, idle_interval_ms=250):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.idle_interval_ms = idle_interval_ms
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._after_id = None
+        self._flush_hooks = []
+
+    def post(self, key, callback, *args, **kwargs):
+        """Queue callback(*args, **kwargs) for the Tk thread, replacing any pending update for key."""
+        with self._lock:
+            self._pending[key] = (callback, args, kwargs)
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def add_flush_hook(self, callback):
+        """Call callback() on the Tk thread after each batch of updates has been applied."""
+        self._flush_hooks.append(callback)
+        return callback
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval_ms, self._drain)
+        return self
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _drain(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        timed = metrics.enabled
+        for callback, args, kwargs in batch.values():
+            started = time.perf_counter() if timed else 0.0
+            try:
+                callback(*args, **kwargs)
+            except Exception as e:
+                print(f"⚠ UI update failed: {e}")
+            if timed:
+                metrics.TK_CALLBACK_SECONDS.observe(time.perf_counter() - started)
+        if batch:
+            for hook in self._flush_hooks:
+                started = time.perf_counter() if timed else 0.0
+                try:
+                    hook()
+                except Exception as e:
+                    print(f"⚠ UI flush failed: {e}")
+                if timed:
+                    metrics.TK_CALLBACK_SECONDS.observe(time.perf_counter() - started)
+        # Poll slowly while nothing is happening to keep wakeups down on the Pi
+        delay = self.interval_ms if batch else self.idle_interval_ms
+        self._after_id = self.root.after(delay, self._drain)
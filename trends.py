@@ -0,0 +1,184 @@
+import time
+import tkinter as tk
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+from frames import AIR_OK, HAS_FLOATS, HAS_PH_EC, WATER1_OK, WATER2_OK
+from helpers import LOG_DIR, log_error
+
+# -------------------- Trend Charts --------------------
+#
+# Rolling plots of the sensor channels, embedded in the Tk window. Samples
+# go into fixed-size ring buffers; a refresh only moves the line artists and
+# blits them over a cached background of axes, grid and labels. The full
+# figure is redrawn only when a value leaves the current y-range, the panel
+# is resized, or the time axis needs relabelling. Nothing is drawn while
+# the panel is hidden.
+
+# (title, [(channel, label, validity flag)], initial y-range)
+PLOTS = (
+    ("Temperature (°C)", [("air_temp", "Air", AIR_OK), ("water_temp1", "Water 1", WATER1_OK),
+                          ("water_temp2", "Water 2", WATER2_OK)], (15, 30)),
+    ("Humidity (%)", [("humidity", "Air", AIR_OK)], (30, 80)),
+    ("pH", [("ph_top", "Top", HAS_PH_EC), ("ph_bottom", "Bottom", HAS_PH_EC)], (5, 7)),
+    ("EC", [("ec_top", "Top", HAS_PH_EC), ("ec_bottom", "Bottom", HAS_PH_EC)], (0.5, 3)),
+)
+
+
+class RingBuffer:
+    """Fixed-capacity (time, value) history with a zero-copy ordered view.
+
+    Every sample is written twice, at i and i + capacity, so the newest
+    `capacity` samples are always one contiguous slice.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = np.full(2 * capacity, np.nan)
+        self.values = np.full(2 * capacity, np.nan)
+        self.index = 0
+        self.count = 0
+
+    def append(self, timestamp, value):
+        i = self.index
+        self.times[i] = self.times[i + self.capacity] = timestamp
+        self.values[i] = self.values[i + self.capacity] = value
+        self.index = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def view(self):
+        start = self.index + self.capacity - self.count
+        end = self.index + self.capacity
+        return self.times[start:end], self.values[start:end]
+
+
+class TrendsPanel:
+    def __init__(self, parent, window_seconds=3600, capacity=3600, refresh_ms=1000):
+        self.parent = parent
+        self.window_seconds = window_seconds
+        self.refresh_ms = refresh_ms
+        self.visible = False
+        self.buffers = {channel: RingBuffer(capacity) for _, lines, _ in PLOTS for channel, _, _ in lines}
+
+        self.frame = tk.Frame(parent)
+        self.figure = Figure(figsize=(7.8, 4.6), dpi=100)
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self.frame)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+        self.axes = []
+        self.lines = {}
+        for position, (title, lines, y_range) in enumerate(PLOTS, start=1):
+            ax = self.figure.add_subplot(2, 2, position)
+            ax.set_title(title, fontsize=9)
+            ax.set_xlim(-window_seconds / 60, 0)
+            ax.set_ylim(*y_range)
+            ax.tick_params(labelsize=7)
+            ax.grid(True, alpha=0.3)
+            for channel, label, _ in lines:
+                (line,) = ax.plot([], [], label=label, animated=True, linewidth=1.2)
+                self.lines[channel] = (ax, line)
+            if len(lines) > 1:
+                ax.legend(fontsize=7, loc="upper left")
+            self.axes.append(ax)
+        self.axes[2].set_xlabel("minutes ago", fontsize=8)
+        self.axes[3].set_xlabel("minutes ago", fontsize=8)
+        self.figure.tight_layout()
+
+        self._background = None
+        self._dirty = False
+        self._after_id = None
+        self._last_blit = 0
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    # ---- data ----
+
+    def add_frame(self, timestamp, frame):
+        """Record every valid reading in a decoded frame."""
+        if not frame.valid & HAS_FLOATS:
+            return
+        for _, lines, _ in PLOTS:
+            for channel, _, flag in lines:
+                if frame.valid & flag == flag:
+                    self.buffers[channel].append(timestamp, getattr(frame, channel))
+                    self._dirty = True
+
+    def seed_from_history(self, store=None, log_dir=LOG_DIR):
+        """Fill the buffers from the history store so the charts are not empty on open."""
+        try:
+            import history
+            end = time.time()
+            start = end - self.window_seconds
+            for channel, buffer in self.buffers.items():
+                resolution = max(self.window_seconds // buffer.capacity, 1)
+                buckets = history.query(channel, start, end, resolution, store, log_dir)
+                for timestamp, value in zip(buckets.time, buckets.mean):
+                    if not np.isnan(value):
+                        buffer.append(timestamp, value)
+            self._dirty = True
+        except Exception as e:
+            log_error(f"Could not load trend history: {e}")
+
+    # ---- showing ----
+
+    def show(self, **pack_options):
+        self.frame.pack(**pack_options)
+        self.visible = True
+        self.canvas.draw()  # Full draw; _on_draw caches the background
+        self._schedule()
+
+    def hide(self):
+        self.visible = False
+        self.frame.pack_forget()
+        if self._after_id is not None:
+            self.frame.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _schedule(self):
+        self._after_id = self.frame.after(self.refresh_ms, self._tick)
+
+    def _tick(self):
+        if not self.visible:
+            return
+        self.refresh()
+        self._schedule()
+
+    # ---- drawing ----
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_lines(time.time())
+
+    def refresh(self):
+        """Move the lines to the current time and blit them; full redraw only if a value left its axes."""
+        if self._background is None:
+            return
+        now = time.time()
+        needs_full_draw = False
+        for channel, (ax, line) in self.lines.items():
+            times, values = self.buffers[channel].view()
+            if not len(values):
+                continue
+            low, high = ax.get_ylim()
+            v_min, v_max = np.nanmin(values), np.nanmax(values)
+            if v_min < low or v_max > high:
+                margin = max((v_max - v_min) * 0.1, 0.5)
+                ax.set_ylim(min(low, v_min - margin), max(high, v_max + margin))
+                needs_full_draw = True
+        if needs_full_draw:
+            self.canvas.draw()  # _on_draw re-caches the background and draws the lines
+            return
+        if not self._dirty and now - self._last_blit < 60:
+            return  # Nothing new; the "minutes ago" axis only shifts visibly once a minute
+        self.canvas.restore_region(self._background)
+        self._draw_lines(now)
+        self.canvas.blit(self.figure.bbox)
+
+    def _draw_lines(self, now):
+        for channel, (ax, line) in self.lines.items():
+            times, values = self.buffers[channel].view()
+            line.set_data((times - now) / 60, values)
+            ax.draw_artist(line)
+        self._dirty = False
+        self._last_blit = now
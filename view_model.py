@@ -0,0 +1,49 @@
+# -------------------- View Model --------------------
+#
+# Frames arrive every second, but most of them change nothing on screen.
+# Instead of configuring widgets directly, paint code records the options it
+# wants with set() / set_item(). flush() then compares them with what was
+# last rendered and only calls config()/itemconfig() for options whose value
+# actually changed. Canvas items (the status dots) are created once and
+# recoloured in place instead of being deleted and redrawn.
+#
+# TkBridge calls flush() once after each drained batch, so several frames
+# painted in the same interval cost at most one round of Tk calls.
+
+
+class ViewModel:
+    def __init__(self):
+        self._rendered = {}  # widget or (canvas, item) -> {option: value}
+        self._pending = {}
+        self.pushed = 0   # option changes sent to Tk
+        self.skipped = 0  # option updates dropped because nothing changed
+
+    def set(self, widget, **options):
+        """Request widget options; applied (if changed) on the next flush."""
+        self._pending.setdefault(widget, {}).update(options)
+
+    def set_item(self, canvas, item, **options):
+        """Request options for a canvas item (id or tag); applied on the next flush."""
+        self._pending.setdefault((canvas, item), {}).update(options)
+
+    def forget(self, widget):
+        """Drop cached state, e.g. after the widget was destroyed or changed behind our back."""
+        self._rendered.pop(widget, None)
+        for key in [key for key in self._rendered if isinstance(key, tuple) and key[0] is widget]:
+            del self._rendered[key]
+
+    def flush(self):
+        pending, self._pending = self._pending, {}
+        for target, options in pending.items():
+            rendered = self._rendered.setdefault(target, {})
+            changed = {name: value for name, value in options.items() if rendered.get(name) != value}
+            self.skipped += len(options) - len(changed)
+            if not changed:
+                continue
+            if isinstance(target, tuple):
+                canvas, item = target
+                canvas.itemconfig(item, **changed)
+            else:
+                target.config(**changed)
+            rendered.update(changed)
+            self.pushed += len(changed)
@@ -0,0 +1,439 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import ipaddress
+import json
+import math
+import os
+import struct
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from control_link import MAX_CLIENT_BUFFER
+from frames import AIR_OK, HAS_FLOATS, HAS_PH_EC, RELAY_NAMES, WATER1_OK, WATER2_OK, FrameError, decode_frame
+from helpers import TelemetryState, log_error
+from history_store import CHANNELS, HistoryStore
+from rigs import rig_history_dir, rig_log_dir
+
+# -------------------- Web API --------------------
+#
+# A small HTTP + WebSocket API for dashboards and phones on the local
+# network, served from the controller loop with the standard library only:
+#
+#   GET  /api/rigs                         rig ids and link state
+#   GET  /api/state?rig=rack1              relays, sensors, clock, schedule, active alerts
+#   GET  /api/history?channel=air_temp&rig=rack1&start=<epoch>&end=<epoch>&resolution=<s>
+#   POST /api/relays/LT   {"on": true}     manual override of LT/LB/PT/PB
+#   POST /api/schedule/reset               back to the schedule
+#   GET  /api/ws                           WebSocket: every controller event as
+#                                          {"rig", "event", "value"} JSON
+#
+# Nothing here talks to the Arduino to answer a read. Controller events
+# keep a per-rig state that is encoded to JSON at most once per change, so
+# any number of clients polling /api/state cost no serial traffic and
+# almost no CPU. Each event is framed once for the WebSocket and the same
+# bytes are written to every socket; clients that stop reading are dropped,
+# as on the control socket.
+#
+# The API binds to localhost unless told otherwise, and refuses any other
+# address unless HYDRO_API_TOKEN is set. With a token, relay and schedule
+# changes (POSTs and WebSocket commands) need "Authorization: Bearer <token>"
+# or ?token=<token>.
+#
+# A web page on another site must not be able to drive the relays through
+# a browser on the LAN, so POSTs and WebSocket upgrades whose Origin header
+# names another site are refused with 403. Requests without an Origin
+# (curl, scripts, apps) and pages served from this same host:port pass;
+# other dashboards can be listed in HYDRO_API_ORIGINS (comma-separated,
+# e.g. "http://grafana.local:3000"). Only reads answer any origin with
+# Access-Control-Allow-Origin: *.
+
+DEFAULT_PORT = 8080
+API_TOKEN = os.environ.get("HYDRO_API_TOKEN")
+ALLOWED_ORIGINS = tuple(origin.strip().rstrip("/") for origin in os.environ.get("HYDRO_API_ORIGINS", "").split(",")
+                        if origin.strip())
+
+SWITCH_CODES = ("LT", "LB", "PT", "PB")
+MAX_BODY = 64 * 1024
+MAX_HISTORY_POINTS = 2000
+DEFAULT_HISTORY_SECONDS = 24 * 3600
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+WS_TEXT, WS_CLOSE, WS_PING, WS_PONG = 0x1, 0x8, 0x9, 0xA
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+               404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _reading(frame, name, flag):
+    return getattr(frame, name) if frame.valid & flag else None
+
+
+def frame_state(frame):
+    """JSON-ready relays and sensors of a full STATE frame; None for readings the sketch reported as failed."""
+    if frame is None:
+        return {"relays": None, "sensors": None}
+    return {
+        "relays": {name: frame.relay_on(name) for name in RELAY_NAMES},
+        "sensors": {
+            "air_temp": _reading(frame, "air_temp", AIR_OK),
+            "humidity": _reading(frame, "humidity", AIR_OK),
+            "water_temp1": _reading(frame, "water_temp1", WATER1_OK),
+            "water_temp2": _reading(frame, "water_temp2", WATER2_OK),
+            "float_top": _reading(frame, "float_top", HAS_FLOATS),
+            "float_bottom": _reading(frame, "float_bottom", HAS_FLOATS),
+            "ph_top": _reading(frame, "ph_top", HAS_PH_EC),
+            "ec_top": _reading(frame, "ec_top", HAS_PH_EC),
+            "ph_bottom": _reading(frame, "ph_bottom", HAS_PH_EC),
+            "ec_bottom": _reading(frame, "ec_bottom", HAS_PH_EC),
+        },
+    }
+
+
+def ws_frame(payload, opcode=WS_TEXT):
+    """One unmasked server-to-client WebSocket frame."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def read_ws_frame(reader):
+    """(opcode, payload) of the next client frame; client frames are always masked."""
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    if length > MAX_BODY:
+        raise ApiError(413, "WebSocket message too large")
+    mask = await reader.readexactly(4) if second & 0x80 else b"\0\0\0\0"
+    data = await reader.readexactly(length)
+    payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(data))
+    return first & 0x0F, payload
+
+
+class RigView:
+    """What the API knows about one rig, rebuilt from its controller events."""
+
+    def __init__(self, rig):
+        self.rig = rig
+        self.telemetry = TelemetryState()
+        self.connected = False
+        self.clock = None
+        self.schedule = None
+        self.updated = None
+        self.alerts = {}  # rule -> raised alert (alerts.AlertEvent as a dict)
+        self._body = None  # Encoded /api/state response, until the next change
+
+    def update(self, event, value):
+        if event == "frame":
+            try:
+                decoded = decode_frame(value)
+            except FrameError:
+                return
+            if decoded is None:
+                return
+            self.telemetry.update(decoded)
+            self.updated = time.time()
+        elif event == "connection":
+            self.connected = bool(value)
+        elif event == "clock":
+            self.clock = value
+        elif event == "schedule":
+            self.schedule = value
+        elif event == "alert":
+            if value["state"] == "raised":
+                self.alerts[value["rule"]] = value
+            else:
+                self.alerts.pop(value["rule"], None)
+        else:
+            return
+        self._body = None
+
+    def body(self):
+        if self._body is None:
+            state = {"rig": self.rig, "connected": self.connected, "clock": self.clock,
+                     "schedule": self.schedule, "updated": self.updated, "alerts": list(self.alerts.values())}
+            state.update(frame_state(self.telemetry.frame))
+            self._body = json.dumps(state).encode()
+        return self._body
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # A host name, or "" for every interface
+
+
+class WebApi:
+    def __init__(self, rigs, port=DEFAULT_PORT, host="127.0.0.1", token=API_TOKEN, origins=ALLOWED_ORIGINS):
+        if not token and not is_loopback(host):
+            raise ValueError(f"Refusing to serve the API on {host or 'every interface'} without HYDRO_API_TOKEN; "
+                             "anyone on the network could switch the relays")
+        self.rigs = rigs  # rigs.RigRegistry
+        self.port = port
+        self.host = host
+        self.token = token
+        self.origins = origins
+        self.server = None
+        self.views = {}
+        self.stores = {}  # rig -> HistoryStore, kept so its segment cache survives between queries
+        self.sockets = set()
+
+    async def start(self):
+        for rig, event, value in self.rigs.snapshot():
+            self._view(rig).update(event, value)
+        self.rigs.add_listener(self._on_event)
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        print(f"🌐 Web API on http://{self.host}:{self.port}/api/state")
+        return self
+
+    async def close(self):
+        self.rigs.remove_listener(self._on_event)
+        for writer in list(self.sockets):
+            writer.close()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def _view(self, rig):
+        view = self.views.get(rig)
+        if view is None:
+            view = self.views[rig] = RigView(rig)
+        return view
+
+    def _store(self, rig):
+        store = self.stores.get(rig)
+        if store is None:
+            store = self.stores[rig] = HistoryStore(rig_history_dir(rig, self.rigs.simulated))
+        return store
+
+    # ---- fan-out ----
+
+    def _on_event(self, rig, event, value):
+        # Runs on the controller loop, like the rest of the API
+        self._view(rig).update(event, value)
+        if self.sockets:
+            frame = ws_frame(json.dumps({"rig": rig, "event": event, "value": value}).encode())
+            for writer in list(self.sockets):
+                self._write(writer, frame)
+
+    def _write(self, writer, data):
+        if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            log_error("Dropping WebSocket client that stopped reading")
+            self.sockets.discard(writer)
+            writer.close()
+            return
+        writer.write(data)
+
+    # ---- HTTP ----
+
+    async def _handle_client(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            request_line, *header_lines = head.decode("latin-1").split("\r\n")
+            method, target, _ = request_line.split(" ", 2)
+            headers = {}
+            for line in header_lines:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+            url = urlsplit(target)
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            if url.path == "/api/ws" and headers.get("upgrade", "").lower() == "websocket":
+                await self._websocket(reader, writer, headers, query)
+                return
+            length = int(headers.get("content-length") or 0)
+            if length > MAX_BODY:
+                raise ApiError(413, "Body too large")
+            body = await reader.readexactly(length) if length else b""
+            writes = url.path.startswith("/api/relays/") or url.path == "/api/schedule/reset"
+            try:
+                if writes:
+                    self._check_origin(headers)
+                status, payload = 200, await self._route(method, url.path, query, headers, body)
+            except ApiError as e:
+                status, payload = e.status, json.dumps({"error": str(e)}).encode()
+            # Reads are for anyone; write responses only for the allowed origin that sent them
+            self._respond(writer, status, payload, headers.get("origin") if writes else "*")
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass  # Client went away or sent something that is not HTTP
+        except Exception as e:
+            log_error(f"Web API request failed: {e}")
+        finally:
+            writer.close()
+
+    def _respond(self, writer, status, payload, allow_origin=None):
+        cors = ""
+        if allow_origin == "*":
+            cors = "Access-Control-Allow-Origin: *\r\n"
+        elif allow_origin and self._origin_allowed(allow_origin, None):
+            cors = (f"Access-Control-Allow-Origin: {allow_origin}\r\nVary: Origin\r\n"
+                    "Access-Control-Allow-Methods: POST\r\n"
+                    "Access-Control-Allow-Headers: Authorization, Content-Type\r\n")
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"{cors}"
+            "Cache-Control: no-store\r\n"
+            "Connection: close\r\n\r\n".encode() + payload
+        )
+
+    def _origin_allowed(self, origin, host):
+        origin = origin.rstrip("/")
+        if origin in self.origins:
+            return True
+        # A page served by this very server (same host:port) is not foreign
+        return host is not None and urlsplit(origin).netloc.lower() == host.lower()
+
+    def _check_origin(self, headers):
+        """Refuse requests a browser sends on behalf of a page from another site."""
+        origin = headers.get("origin")
+        if origin is not None and not self._origin_allowed(origin, headers.get("host")):
+            raise ApiError(403, f"Origin {origin} may not change relays or the schedule")
+
+    def _check_token(self, headers, query):
+        if self.token is None:
+            return
+        supplied = query.get("token") or headers.get("authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(supplied.encode(), self.token.encode()):
+            raise ApiError(401, "Missing or wrong API token")
+
+    def _rig(self, query):
+        rig = query.get("rig") or self.rigs.ids[0]
+        if rig not in self.rigs.ids:
+            raise ApiError(404, f"Unknown rig: {rig}")
+        return rig
+
+    async def _route(self, method, path, query, headers, body):
+        if path == "/api/rigs":
+            return json.dumps([{"rig": rig, "connected": self._view(rig).connected} for rig in self.rigs.ids]).encode()
+        if path == "/api/state":
+            return self._view(self._rig(query)).body()
+        if path == "/api/history":
+            return await self._history(query)
+        if path.startswith("/api/relays/") or path == "/api/schedule/reset":
+            if method == "OPTIONS":
+                return b""  # CORS preflight from an allowed origin; _respond adds the headers
+            if method != "POST":
+                raise ApiError(405, "Use POST")
+            self._check_token(headers, query)
+            rig = self._rig(query)
+            if path == "/api/schedule/reset":
+                self.rigs.send("RESET_SCHEDULE", rig=rig)
+                return b'{"ok":true}'
+            return self._override(path[len("/api/relays/"):], body, rig)
+        raise ApiError(404, f"No such endpoint: {path}")
+
+    def _override(self, code, body, rig):
+        code = code.upper()
+        if code not in SWITCH_CODES:
+            raise ApiError(404, f"Unknown relay {code}; use one of {', '.join(SWITCH_CODES)}")
+        try:
+            on = json.loads(body or b"{}")["on"]
+        except (ValueError, KeyError, TypeError):
+            raise ApiError(400, 'Body must be {"on": true} or {"on": false}') from None
+        if not isinstance(on, bool):
+            raise ApiError(400, '"on" must be true or false')
+        self.rigs.send(f"{code}:{'ON' if on else 'OFF'}", rig=rig)
+        return b'{"ok":true}'
+
+    async def _history(self, query):
+        import history
+        channel = query.get("channel")
+        if channel not in CHANNELS:
+            raise ApiError(400, f"channel must be one of {', '.join(CHANNELS)}")
+        rig = self._rig(query)
+        try:
+            end = float(query.get("end") or time.time())
+            start = float(query.get("start") or end - DEFAULT_HISTORY_SECONDS)
+            resolution = float(query.get("resolution") or 0)
+        except ValueError:
+            raise ApiError(400, "start, end and resolution are epoch seconds") from None
+        if end <= start:
+            raise ApiError(400, "end must be after start")
+        # Never more points than a chart can use, however fine a resolution was asked for
+        resolution = max(resolution, math.ceil((end - start) / MAX_HISTORY_POINTS), 1)
+        buckets = await asyncio.get_running_loop().run_in_executor(
+            None, history.query, channel, start, end, resolution,
+            self._store(rig), rig_log_dir(rig, self.rigs.simulated),
+        )
+        points = [
+            [float(t), None if math.isnan(low) else float(low), None if math.isnan(mean) else float(mean),
+             None if math.isnan(high) else float(high)]
+            for t, low, mean, high in zip(buckets.time, buckets.min, buckets.mean, buckets.max)
+        ]
+        return json.dumps({"rig": rig, "channel": channel, "resolution": resolution,
+                           "columns": ["time", "min", "mean", "max"], "points": points}).encode()
+
+    # ---- WebSocket ----
+
+    async def _websocket(self, reader, writer, headers, query):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            self._respond(writer, 400, b'{"error":"Missing Sec-WebSocket-Key"}')
+            return
+        try:
+            # Browsers let any page open a WebSocket to any host; only the Origin tells them apart
+            self._check_origin(headers)
+        except ApiError as e:
+            self._respond(writer, e.status, json.dumps({"error": str(e)}).encode())
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+        for rig, event, value in self.rigs.snapshot():
+            writer.write(ws_frame(json.dumps({"rig": rig, "event": event, "value": value}).encode()))
+        self.sockets.add(writer)
+        try:
+            while True:
+                opcode, payload = await read_ws_frame(reader)
+                if opcode == WS_CLOSE:
+                    writer.write(ws_frame(payload[:2], WS_CLOSE))
+                    break
+                if opcode == WS_PING:
+                    writer.write(ws_frame(payload, WS_PONG))
+                elif opcode == WS_TEXT:
+                    self._ws_command(writer, payload, headers, query)
+        except ApiError as e:
+            log_error(f"WebSocket client dropped: {e}")
+        finally:
+            self.sockets.discard(writer)
+
+    def _ws_command(self, writer, payload, headers, query):
+        # Same message as on the control socket: {"command": "LT:ON", "rig": "rack1"}
+        try:
+            message = json.loads(payload)
+            command = message["command"]
+            code, _, state = command.partition(":")
+            if command != "RESET_SCHEDULE" and (code not in SWITCH_CODES or state not in ("ON", "OFF")):
+                raise ApiError(400, f"Unsupported command: {command}")
+            self._check_token(headers, query)
+            self.rigs.send(command, rig=self._rig(message))
+        except ApiError as e:
+            error = str(e)
+        except (ValueError, KeyError, TypeError):
+            error = 'Expected {"command": "LT:ON", "rig": "..."}'
+        else:
+            return
+        self._write(writer, ws_frame(json.dumps({"error": error}).encode()))